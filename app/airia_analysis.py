@@ -10,15 +10,22 @@ Requires:
 
 All functions return None or empty results if Airia is unavailable - no errors thrown.
 """
+import os
 from typing import Dict, List, Optional
-from app.secrets import _PROJECT_ROOT
+from app.secrets import _PROJECT_ROOT, stub_key
+from app import http_client
+from app.http_client import get_breaker
 from pathlib import Path
 
+# Optional: call an HTTP endpoint (e.g. the local stub in app/llm_stub.py) instead of the Airia SDK
+AIRIA_BASE_URL = os.getenv("AIRIA_BASE_URL", "").rstrip("/")
+
 
 def is_airia_available() -> bool:
     """Check if Airia is configured and available."""
     try:
-        from airia import AiriaClient
+        if not AIRIA_BASE_URL:
+            from airia import AiriaClient
         api_key = read_airia_key()
         return api_key is not None and api_key.strip() != ""
     except ImportError:
@@ -42,7 +49,29 @@ def read_airia_key() -> Optional[str]:
                     return key
             except Exception:
                 continue
-    return None
+    return stub_key("AIRIA_BASE_URL")
+
+
+_clients = {}
+
+
+def _get_client(api_key: str):
+    """Reuse one AiriaClient (and its connection pool) per API key."""
+    if api_key not in _clients:
+        from airia import AiriaClient
+        _clients[api_key] = AiriaClient(api_key=api_key)
+    return _clients[api_key]
+
+
+def _execute_pipeline(api_key: str, pipeline_id: str, inputs: Dict) -> Dict:
+    """Run an Airia pipeline through the SDK, or over HTTP when AIRIA_BASE_URL is set."""
+    if AIRIA_BASE_URL:
+        response = http_client.post(f"{AIRIA_BASE_URL}/v1/pipelines/{pipeline_id}/execute",
+                                    json={"inputs": inputs}, headers={"X-API-KEY": api_key},
+                                    service="airia_http", timeout=(3.05, 20), retries=1)
+        response.raise_for_status()
+        return response.json()
+    return _get_client(api_key).pipelines.execute_pipeline(pipeline_id=pipeline_id, inputs=inputs)
 
 
 def get_airia_risk_adjustment(diff_analysis: Dict) -> int:
@@ -96,9 +125,13 @@ def analyze_with_airia(diff: str, file_path: str, intent: str) -> Optional[Dict]
         return None
     
     try:
-        from airia import AiriaClient
+        if not AIRIA_BASE_URL:
+            _get_client(api_key)
         
-        client = AiriaClient(api_key=api_key)
+        breaker = get_breaker("airia")
+        if not breaker.allow():
+            # Airia is degraded - skip AI analysis instead of waiting on it
+            return None
         
         # Build prompt for AI code review
         prompt = f"""Analyze this code change for security risks, quality issues, and potential problems.
@@ -121,14 +154,20 @@ Format as JSON with keys: risks, confidence, recommendations, summary."""
         # Note: This is a placeholder - adjust based on actual Airia API
         try:
             # Option 1: Use Airia's AI Gateway for analysis
-            response = client.pipelines.execute_pipeline(
-                pipeline_id="code-review",  # You'd configure this in Airia
-                inputs={
-                    "diff": diff[:2000],
-                    "file_path": file_path,
-                    "intent": intent
-                }
-            )
+            try:
+                response = _execute_pipeline(
+                    api_key,
+                    "code-review",  # You'd configure this in Airia
+                    {
+                        "diff": diff[:2000],
+                        "file_path": file_path,
+                        "intent": intent
+                    }
+                )
+            except Exception:
+                breaker.record_failure()
+                raise
+            breaker.record_success()
             
             # Parse response (adjust based on actual Airia response format)
             if response and "output" in response:
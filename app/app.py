@@ -8,29 +8,40 @@ Flow: Policy Check → Sandbox (Local/Modal) → Pytest → Risk Scoring → Exp
 
 See docs/ARCHITECTURE.md for detailed architecture overview.
 """
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from app.guards import policy_check
+from typing import Optional
+from app.guards import evaluate_policy
 from app.dryrun_local import dry_run as local_run
-from app.explain import explain_reason
-
-# Import Modal runner with graceful fallback
-try:
-    from app.modal_runner import dry_run_repo as modal_run
-    MODAL_AVAILABLE = True
-except Exception:
-    MODAL_AVAILABLE = False
-    modal_run = None
-from app.history import save_risk_card, get_history, get_risk_card, approve_risk_card
-from app.risk_scoring import calculate_risk_score, get_risk_level
+from app.test_runner import resolve_test_mode
+from app.explain import explain_reason, local_explanation
+from app.explain_jobs import pending_count, resolve_mode, schedule_explanation, wait_for_explanation
+from app.secrets import read_openrouter_key
+
+from app.history import (init_db, save_risk_card, get_history, get_history_summary, get_risk_card, approve_risk_card,
+                         count_history, history_stats, get_sandbox_log)
+from app.risk_scoring import calculate_risk_score
 from app.diff_analysis import analyze_diff
+from app.diff_scanner import scan_diff
 from app.airia_analysis import enhance_diff_analysis
 from app.metrics import record_request, get_metrics
-from app.webhooks import send_webhook
+from app.webhooks import get_subscriptions, send_webhook
+from app.http_client import breaker_states
+from app.explain_cache import get_explanation_cache
+from app.explain_batcher import batching_enabled, get_batcher
+from app.events import get_event_bus, publish_card
+from app.recent_cards import get_recent_cards
+from app.render import EMPTY_PAGE, card_etag, get_render_cache, last_modified
+from app.responses import VIEWS, add_compression, card_action, json_response, propose_payload
+from app.sandbox_scheduler import TRUST_CLIENT_HEADER, SandboxBusy, SandboxCancelled, get_scheduler
+from app.sandbox_logs import close_log, get_log, list_runs, open_log
 import time, os
-import html as html_module
+import gzip
+import json
+import threading
 import uuid
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 
 # Ensure dotenv is loaded at import
@@ -44,14 +55,79 @@ class Action(BaseModel):
     prompt: str
     est_tokens: int = 800
     use_modal: bool = False  # toggle cloud vs local
+    explain_mode: Optional[str] = None  # "sync" or "deferred" (defaults to AEGIS_EXPLAIN_MODE)
+    test_mode: Optional[str] = None  # "fail_fast" or "full" (defaults to AEGIS_TEST_FAIL_FAST)
 
 class ApprovalRequest(BaseModel):
     request_id: str
     approved_by: str = "user"
     comment: str = ""
 
-app = FastAPI(title="Aegis API", version="1.0.0")
-LATEST = None
+# Modal is heavy to import and builds its image/app objects at import time, so it
+# is only loaded by the first request that asks for use_modal
+_modal_run = None
+_modal_stream = None
+_modal_loaded = False
+_modal_lock = threading.Lock()
+
+
+def get_modal_runner():
+    """Modal's remote dry_run_repo function, or None if Modal is unavailable (imported once, on first use)."""
+    global _modal_run, _modal_stream, _modal_loaded
+    with _modal_lock:
+        if not _modal_loaded:
+            try:
+                from app.modal_runner import dry_run_repo, dry_run_repo_stream
+                _modal_run = dry_run_repo
+                _modal_stream = dry_run_repo_stream
+            except Exception as e:
+                print(f"Modal unavailable, using local sandbox: {e}")
+            _modal_loaded = True
+        return _modal_run
+
+
+def _modal_streamed(a: Action, test_mode: str, log) -> dict:
+    """Run the Modal dry run with live output (remote_gen), copying lines into the local log."""
+    for item in _modal_stream.remote_gen(DEMO_REPO, a.file_path, a.new_contents, test_mode):
+        if "result" in item:
+            return item["result"]
+        log.write(item["source"], item["line"])
+        if log.cancelled:
+            # Stop reading; closing the generator ends the remote call
+            return {"ok": False, "diff": "", "stdout": "", "stderr": "Tests cancelled", "limit_hit": "cancelled",
+                    "test_mode": test_mode}
+    raise RuntimeError("Modal stream ended without a result")
+
+
+# Request threads kept for endpoints other than queued/running sandbox proposals
+THREADPOOL_RESERVE = 40
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Startup/shutdown work that used to run at import time."""
+    init_db()
+    # Sync endpoints run on anyio's thread pool, and a queued /propose_action holds
+    # its thread while it waits for a sandbox slot. Size the pool so every running
+    # and queued sandbox can hold one and the other endpoints keep the default 40
+    import anyio.to_thread
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    scheduler = get_scheduler()
+    limiter.total_tokens = max(limiter.total_tokens,
+                               THREADPOOL_RESERVE + scheduler.max_concurrent + scheduler.max_queue)
+    dispatcher = None
+    if get_subscriptions():
+        # Deliver webhook events left in the outbox by a previous run
+        from app.webhook_outbox import get_dispatcher
+        dispatcher = get_dispatcher()
+        dispatcher.start()
+    yield
+    if dispatcher is not None:
+        dispatcher.stop()
+
+
+app = FastAPI(title="Aegis API", version="1.0.0", lifespan=lifespan)
+add_compression(app)
 
 @app.get("/")
 def root():
@@ -66,6 +142,7 @@ def root():
             "riskcard": f"{base_url}/riskcard",
             "riskcard_html": f"{base_url}/riskcard/html",
             "history": f"{base_url}/riskcard/history",
+            "stream": f"{base_url}/riskcard/stream",
             "metrics": f"{base_url}/metrics",
             "docs": f"{base_url}/docs"
         }
@@ -79,201 +156,471 @@ def health():
 @app.get("/riskcard")
 def riskcard():
     """Get the latest risk card."""
-    return LATEST or {"msg": "no actions yet"}
+    return get_recent_cards().latest() or {"msg": "no actions yet"}
 
-@app.get("/riskcard/history")
-def riskcard_history(limit: int = 50):
-    """Get risk card history."""
-    return {"history": get_history(limit)}
+# Largest history page served in one response
+HISTORY_PAGE_MAX = 500
 
-@app.get("/riskcard/html", response_class=HTMLResponse)
-def riskcard_html():
-    """Return an HTML report of the risk card."""
-    if not LATEST:
-        return "<html><body><p>No actions yet</p></body></html>"
-    
-    status = LATEST.get("status", "unknown")
-    checks = LATEST.get("checks", [])
-    explanation = LATEST.get("explanation", "")
-    diff = LATEST.get("diff", "")
-    risk_score = LATEST.get("risk_score", 0)
-    risk_level, risk_color = get_risk_level(risk_score)
-    
-    # Status badge
-    status_color = "green" if status == "allow" else "red"
-    status_text = "ALLOW" if status == "allow" else "BLOCKED"
-    
-    # Build checks table
-    checks_rows = ""
-    for name, ok, msg in checks:
-        badge = f'<span style="background: {"green" if ok else "red"}; color: white; padding: 2px 8px; border-radius: 3px; font-size: 12px;">{"PASS" if ok else "FAIL"}</span>'
-        checks_rows += f"<tr><td>{html_module.escape(str(name))}</td><td>{badge}</td><td>{html_module.escape(str(msg))}</td></tr>"
-    
-    html = f"""<!DOCTYPE html>
-<html>
-<head>
-    <title>Aegis Risk Card</title>
-    <style>
-        body {{ font-family: Arial, sans-serif; margin: 20px; background: #1a1a1a; color: #e0e0e0; }}
-        .status-badge {{ 
-            display: inline-block; 
-            padding: 8px 16px; 
-            border-radius: 4px; 
-            color: white; 
-            font-weight: bold;
-            background: {status_color};
-            margin: 10px 0;
-        }}
-        .risk-score {{
-            display: inline-block;
-            padding: 8px 16px;
-            border-radius: 4px;
-            color: white;
-            font-weight: bold;
-            background: {risk_color};
-            margin: 10px 0;
-        }}
-        table {{ border-collapse: collapse; width: 100%; margin: 20px 0; background: #2a2a2a; }}
-        th, td {{ border: 1px solid #444; padding: 8px; text-align: left; }}
-        th {{ background-color: #333; color: #fff; }}
-        pre {{ background: #2a2a2a; padding: 10px; border-radius: 4px; overflow-x: auto; color: #e0e0e0; border: 1px solid #444; }}
-        .explanation {{ margin: 20px 0; padding: 10px; background: #2a2a2a; border-left: 4px solid #4CAF50; border-radius: 4px; }}
-        h1, h2, h3 {{ color: #fff; }}
-    </style>
-</head>
-<body>
-    <h1>🛡️ Aegis Risk Card</h1>
-    <div class="status-badge">{status_text}</div>
-    <div class="risk-score">Risk Score: {risk_score}/100 ({risk_level})</div>
-    
-    <h2>Checks</h2>
-    <table>
-        <tr><th>Check</th><th>Status</th><th>Message</th></tr>
-        {checks_rows}
-    </table>
-    
-    {f'<div class="explanation"><h3>Explanation</h3><p>{html_module.escape(explanation)}</p></div>' if explanation else ''}
+
+@app.get("/riskcard/history")
+def riskcard_history(limit: int = 50, offset: int = 0, view: str = "full", status: Optional[str] = None,
+                     min_score: Optional[int] = None, max_score: Optional[int] = None,
+                     file: Optional[str] = None, since: Optional[float] = None, until: Optional[float] = None):
+    """
+    Get risk card history, newest first.
     
-    {f'<h2>Unified Diff</h2><pre>{html_module.escape(diff)}</pre>' if diff else ''}
-</body>
-</html>"""
+    Paginate with `limit`/`offset`; filter by `status` (comma-separated),
+    `min_score`/`max_score`, `file` (path prefix) and `since`/`until` (unix
+    timestamps). `view=summary` skips diffs, stdout and other large fields and
+    adds the total match count for pagination.
+    """
+    filters = dict(status=status, min_score=min_score, max_score=max_score, file_path=file, since=since, until=until)
+    limit, offset = max(0, min(limit, HISTORY_PAGE_MAX)), max(0, offset)
+    if view == "summary":
+        return json_response({
+            "history": get_history_summary(limit, offset, **filters),
+            "total": count_history(**filters),
+            "limit": limit,
+            "offset": offset
+        })
+    return json_response({"history": get_history(limit, offset, **filters)})
+
+@app.get("/riskcard/history/stats")
+def riskcard_history_stats(status: Optional[str] = None, min_score: Optional[int] = None,
+                           max_score: Optional[int] = None, file: Optional[str] = None,
+                           since: Optional[float] = None, until: Optional[float] = None):
+    """Aggregates (status/level/day counts, top files) over history, with the same filters as /riskcard/history."""
+    return history_stats(status=status, min_score=min_score, max_score=max_score, file_path=file,
+                         since=since, until=until)
+
+# Seconds between keep-alive messages on idle push feeds
+STREAM_HEARTBEAT = 15.0
+
+
+def _stream_statuses(status: Optional[str]):
+    return [x for x in status.split(",") if x] if status else None
+
+
+@app.get("/riskcard/stream")
+async def riskcard_stream(request: Request, status: Optional[str] = None):
+    """
+    Server-sent events feed of risk card summaries as they are saved.
     
-    return html
+    Events: "risk_card" (new card), "explanation_ready" (deferred explanation
+    backfilled), "approved". `status` filters by card status (e.g. "blocked").
+    """
+    bus = get_event_bus()
+    sub = bus.subscribe(_stream_statuses(status))
+
+    async def events():
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                event = await sub.get(STREAM_HEARTBEAT)
+                if event is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+        finally:
+            bus.unsubscribe(sub)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.websocket("/riskcard/ws")
+async def riskcard_ws(websocket: WebSocket, status: Optional[str] = None):
+    """WebSocket feed of risk card summaries (same events as /riskcard/stream, as JSON messages)."""
+    await websocket.accept()
+    bus = get_event_bus()
+    sub = bus.subscribe(_stream_statuses(status))
+    try:
+        while True:
+            event = await sub.get(STREAM_HEARTBEAT)
+            await websocket.send_json(event or {"event": "keep-alive"})
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        bus.unsubscribe(sub)
+
+def _html_response(request: Request, card: dict) -> Response:
+    """Rendered risk card with ETag/Last-Modified validation (304 when unchanged)."""
+    etag = card_etag(card)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    modified = last_modified(card)
+    if modified:
+        headers["Last-Modified"] = modified
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        if etag in [t.strip() for t in if_none_match.split(",")] or if_none_match.strip() == "*":
+            return Response(status_code=304, headers=headers)
+    elif modified and request.headers.get("if-modified-since") == modified:
+        return Response(status_code=304, headers=headers)
+    _, page = get_render_cache().render(card, etag)
+    return HTMLResponse(page, headers=headers)
+
+@app.get("/riskcard/html", response_class=HTMLResponse)
+def riskcard_html(request: Request):
+    """Return an HTML report of the latest risk card."""
+    latest = get_recent_cards().latest()
+    if not latest:
+        return EMPTY_PAGE
+    return _html_response(request, latest)
 
 @app.get("/riskcard/{request_id}")
-def riskcard_by_id(request_id: str):
-    """Get a specific risk card by request_id."""
+def riskcard_by_id(request_id: str, wait: float = 0):
+    """
+    Get a specific risk card by request_id.
+    
+    With a deferred explanation still pending, `wait` (seconds, max 30) blocks
+    until the LLM explanation has been written back.
+    """
+    if wait > 0:
+        wait_for_explanation(request_id, min(wait, 30.0))
     card = get_risk_card(request_id)
     if not card:
         raise HTTPException(status_code=404, detail="Risk card not found")
     return card
 
+@app.get("/riskcard/{request_id}/html", response_class=HTMLResponse)
+def riskcard_html_by_id(request: Request, request_id: str):
+    """Return an HTML report of a specific risk card (cached, supports conditional GET)."""
+    card = get_risk_card(request_id)
+    if not card:
+        raise HTTPException(status_code=404, detail="Risk card not found")
+    return _html_response(request, card)
+
 @app.post("/riskcard/{request_id}/approve")
 def approve_card(request_id: str, approval: ApprovalRequest):
     """Approve a blocked risk card."""
     success = approve_risk_card(request_id, approval.approved_by)
     if not success:
         raise HTTPException(status_code=404, detail="Risk card not found")
+    card = get_risk_card(request_id)
+    if card:
+        publish_card(card, "approved")
     return {"approved": True, "request_id": request_id, "approved_by": approval.approved_by}
 
+@app.get("/sandbox/runs")
+def sandbox_runs():
+    """Queued, running and recently finished sandbox runs (follow one on /riskcard/{request_id}/log/stream)."""
+    return {"runs": list_runs()}
+
+@app.get("/riskcard/{request_id}/log")
+def riskcard_log(request: Request, request_id: str):
+    """
+    Full sandbox output of a run (the output so far while it is running).
+    
+    The log is stored gzip-compressed and sent as-is to clients that accept
+    gzip, decompressed otherwise.
+    """
+    log = get_log(request_id)
+    if log is not None:
+        data = log.gzip_bytes()
+    else:
+        stored = get_sandbox_log(request_id)
+        if stored is None:
+            raise HTTPException(status_code=404, detail="No sandbox log for this request")
+        data = stored["log"]
+    headers = {"Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+        return Response(data, media_type="text/plain; charset=utf-8", headers=headers)
+    return Response(gzip.decompress(data), media_type="text/plain; charset=utf-8", headers=headers)
+
+@app.get("/riskcard/{request_id}/log/stream")
+async def riskcard_log_stream(request: Request, request_id: str):
+    """
+    Server-sent events of a sandbox run's output while the tests run.
+    
+    Starts with the buffered recent lines (after Last-Event-ID when
+    reconnecting), then follows the run. Events: "line" ({"source", "line"})
+    and a final "end" (log summary), after which the stream closes.
+    """
+    log = get_log(request_id)
+    if log is None:
+        raise HTTPException(status_code=404, detail="No live sandbox run for this request; see /riskcard/{request_id}/log")
+    sub, backlog = log.subscribe()
+    try:
+        last_id = int(request.headers.get("last-event-id") or 0)
+    except ValueError:
+        last_id = 0
+
+    async def events():
+        sent = last_id
+        pending = list(backlog)
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                if pending:
+                    event = pending.pop(0)
+                else:
+                    event = await sub.get(STREAM_HEARTBEAT)
+                    if event is None:
+                        yield ": keep-alive\n\n"
+                        continue
+                if event["id"] <= sent:
+                    continue
+                sent = event["id"]
+                yield f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+                if event["event"] == "end":
+                    break
+        finally:
+            log.unsubscribe(sub)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.post("/riskcard/{request_id}/cancel")
+def cancel_sandbox_run(request_id: str):
+    """Cancel a queued or running sandbox run; its card is saved as blocked."""
+    log = get_log(request_id)
+    if log is None:
+        raise HTTPException(status_code=404, detail="No live sandbox run for this request")
+    if not log.cancel():
+        raise HTTPException(status_code=409, detail="Sandbox run already finished")
+    return {"request_id": request_id, "cancelled": True}
+
+@app.get("/webhooks/events")
+def webhook_events(status: Optional[str] = None, limit: int = 50):
+    """Recent webhook outbox events (filter by status: pending, sending, delivered, dead)."""
+    from app.webhook_outbox import get_events
+    return {"events": get_events(status, min(limit, 500))}
+
 @app.get("/metrics")
 def metrics():
     """Get performance metrics."""
-    return get_metrics()
+    metrics = get_metrics()
+    metrics["circuit_breakers"] = breaker_states()
+    metrics["explanation_cache"] = get_explanation_cache().stats()
+    if batching_enabled():
+        metrics["explanation_batches"] = get_batcher().stats()
+    metrics["pending_explanations"] = pending_count()
+    metrics["stream"] = get_event_bus().stats()
+    metrics["html_cache"] = get_render_cache().stats()
+    metrics["sandbox"] = get_scheduler().stats()
+    runs = list_runs()
+    metrics["sandbox"]["live_logs"] = sum(1 for r in runs if r["status"] in ("queued", "running"))
+    metrics["sandbox"]["log_watchers"] = sum(r["subscribers"] for r in runs)
+    if get_subscriptions():
+        from app.webhook_outbox import outbox_stats
+        metrics["webhook_outbox"] = outbox_stats()
+    return metrics
+
+def _explain(card: dict, mode: str) -> bool:
+    """
+    Fill in the card's explanation for the requested mode.
+    
+    Returns:
+        True if an LLM explanation should be generated in the background
+    """
+    deferred = mode == "deferred" and bool(read_openrouter_key())
+    if deferred:
+        explanation = local_explanation(card)
+    else:
+        explanation = explain_reason(card)
+    # Enhance explanation with Airia insights if available
+    try:
+        from app.airia_analysis import enhance_explanation_with_airia
+        explanation = enhance_explanation_with_airia(explanation, card.get("diff_analysis", {}))
+    except Exception:
+        pass  # Silently ignore if Airia not available
+    card["explanation"] = explanation
+    card["explanation_status"] = "pending" if deferred else "final"
+    return deferred
+
+
+def _on_explanation_ready(card: dict):
+    """Publish a backfilled explanation to the recent cards store, the push feed and webhook subscribers."""
+    get_recent_cards().update(card["request_id"], explanation=card["explanation"],
+                              explanation_status=card["explanation_status"])
+    publish_card(card, "explanation_ready")
+    send_webhook(card, event="explanation_ready")
+
+
+def _client_id(request: Request) -> str:
+    """Client identity for sandbox fair share and quotas: the peer address, or X-Aegis-Client if trusted."""
+    peer = request.client.host if request.client else "anonymous"
+    if TRUST_CLIENT_HEADER:
+        return request.headers.get("x-aegis-client") or peer
+    return peer
+
 
 @app.post("/propose_action")
-def propose(a: Action):
-    """Propose an action and get a risk assessment."""
-    global LATEST
+def propose(a: Action, request: Request, view: str = "full", fields: Optional[str] = None):
+    """
+    Propose an action and get a risk assessment.
+    
+    The card is built privately and only published to the recent cards store
+    once complete, so concurrent readers of /riskcard never see a partial card.
+    
+    `view` trims the response: "full" (default), "card" (dry_run without the
+    diff/stdout already on the card) or "summary"; `fields` keeps only the
+    listed risk card fields.
+    
+    `test_mode` "fail_fast" stops the sandbox tests at the first new failure;
+    "full" runs the whole suite for the complete failure list.
+    
+    Sandbox runs go through admission control: when all sandbox slots and the
+    wait queue are taken the request fails fast with 503 (or 429 when the
+    client is over its quota) and a Retry-After header.
+    
+    While the sandbox runs, its output can be followed on
+    /riskcard/{request_id}/log/stream (running request ids are listed on
+    /sandbox/runs) and the run can be cancelled; the card keeps only the
+    stdout tail plus a "log" summary, the full log is on /riskcard/{request_id}/log.
+    """
+    if view not in VIEWS:
+        raise HTTPException(status_code=400, detail=f"view must be one of {', '.join(VIEWS)}")
+    try:
+        test_mode = resolve_test_mode(a.test_mode)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     start_time = time.time()
     request_id = f"req_{uuid.uuid4().hex[:12]}"
+    explain_mode = resolve_mode(a.explain_mode)
     
     try:
         checks = []
         
         # Policy check - validates file paths, intents, and content structure
-        ok1, msg1 = policy_check(a.dict())
-        checks.append(("policy", ok1, msg1))
+        # All violations are collected in one pass so callers can fix them together
+        violations = evaluate_policy(a.dict())
+        msg1 = "; ".join(v["message"] for v in violations) if violations else "OK"
+        checks.append(("policy", not violations, msg1))
         
         if not all(x[1] for x in checks):
-            LATEST = {
+            card = {
                 "status": "blocked",
                 "checks": checks,
+                "policy_violations": violations,
                 "ts": time.time(),
-                "action": a.dict(),
+                "action": card_action(a.dict()),
                 "request_id": request_id
             }
-            LATEST["risk_score"] = calculate_risk_score(LATEST)
-            LATEST["explanation"] = explain_reason(LATEST)
-            LATEST["diff_analysis"] = analyze_diff("")
+            card["diff_analysis"] = analyze_diff("")
+            card["risk_score"] = calculate_risk_score(card)
+            deferred = _explain(card, explain_mode)
+            # Serialize before any side effect, so a card that cannot be encoded
+            # is never saved or published without a response
+            response = json_response(propose_payload(False, card, request_id, view=view, fields=fields))
             
-            save_risk_card(LATEST, request_id, time.time() - start_time)
-            send_webhook(LATEST)
+            save_risk_card(card, request_id, time.time() - start_time)
+            get_recent_cards().publish(card)
+            publish_card(card)
+            send_webhook(card)
+            if deferred:
+                schedule_explanation(card, _on_explanation_ready)
             record_request("/propose_action", time.time() - start_time, True)
             
-            return {"allowed": False, "risk_card": LATEST, "request_id": request_id}
+            return response
 
         # Sandbox selection - choose Modal cloud or local execution
         # Silently fall back to local if Modal fails (no checks added for demo purposes)
-        res = None
-        if a.use_modal:
-            if MODAL_AVAILABLE and DEMO_REPO:
-                try:
-                    # Try to call remote function - silently fall back on failure
-                    res = modal_run.remote(DEMO_REPO, a.file_path, a.new_contents)
-                except Exception:
-                    # Modal failed - silently fall back to local (no check added)
+        # Output is streamed to /riskcard/{request_id}/log/stream while the tests run
+        client = _client_id(request)
+        log = open_log(request_id, client=client, file_path=a.file_path, intent=a.intent)
+        log_status = "error"
+        cancelled = {"ok": False, "diff": "", "stdout": "", "stderr": "Tests cancelled", "limit_hit": "cancelled"}
+        try:
+            try:
+                with get_scheduler().slot(client, on_cancel=log.on_cancel) as queue_wait:
+                    log.status = "running"
                     res = None
+                    if log.cancelled:
+                        res = cancelled
+                    elif a.use_modal:
+                        modal_run = get_modal_runner() if DEMO_REPO else None
+                        if modal_run is not None:
+                            try:
+                                # Try to call remote function - silently fall back on failure
+                                if _modal_stream is not None:
+                                    res = _modal_streamed(a, test_mode, log)
+                                else:
+                                    res = modal_run.remote(DEMO_REPO, a.file_path, a.new_contents, test_mode)
+                            except Exception:
+                                # Modal failed - silently fall back to local (no check added)
+                                res = None
+                    
+                    # Fallback to local if Modal failed or not requested
+                    if res is None:
+                        res = local_run(a.file_path, a.new_contents, test_mode, log)
+            except SandboxCancelled as e:
+                # Cancelled while queued - the scheduler dropped the waiter, no slot was used
+                queue_wait, res = e.waited, cancelled
+            log_status = "passed" if res["ok"] else "failed"
+        except SandboxBusy:
+            log_status = "rejected"
+            raise
+        finally:
+            log_info = close_log(log, log_status)
         
-        # Fallback to local if Modal failed or not requested
-        if res is None:
-            res = local_run(a.file_path, a.new_contents)
-        
-        checks.append(("dry_run_tests", res["ok"], "pytest passed" if res["ok"] else (res.get("stderr", "")[:200] or "tests failed")))
+        baseline = res.get("baseline")
+        test_results = res.get("test_results")
+        if res["ok"]:
+            test_msg = "pytest passed"
+            if baseline and baseline["preexisting_failures"]:
+                test_msg += f" ({len(baseline['preexisting_failures'])} pre-existing failures ignored)"
+        elif baseline and baseline["new_failures"]:
+            test_msg = "New test failures: " + ", ".join(baseline["new_failures"][:5])
+        elif test_results and (test_results["failed"] or test_results["error"]):
+            failed = [row[0] for row in test_results["tests"] if row[1] in ("failed", "error")]
+            test_msg = "Failed tests: " + ", ".join(failed[:5])
+        else:
+            test_msg = res.get("stderr", "")[:200] or "tests failed"
+        checks.append(("dry_run_tests", res["ok"], test_msg))
         
-        LATEST = {
+        card = {
             "status": "allow" if res["ok"] else "blocked",
             "checks": checks,
             "diff": res.get("diff", ""),
             "stdout": res.get("stdout", ""),
+            "structural_diff": res.get("structural_diff"),
+            "policy_violations": violations,
             "ts": time.time(),
-            "request_id": request_id
+            "action": card_action(a.dict()),
+            "request_id": request_id,
+            "sandbox_queue_wait": round(queue_wait, 3),
+            "sandbox_usage": res.get("usage"),
+            "test_mode": res.get("test_mode", test_mode),
+            "test_results": test_results,
+            "baseline": baseline,
+            "log": log_info
         }
         
         # Risk assessment - calculate score, generate explanation, analyze diff patterns
-        # Basic diff analysis first
-        basic_diff_analysis = analyze_diff(LATEST.get("diff", ""))
+        # Basic diff analysis first - one scan of the diff shared by scoring and explanation
+        basic_diff_analysis = analyze_diff(card.get("diff", ""), scan_diff(card.get("diff", "")))
         # Enhance with Airia AI if available (silently falls back if not)
-        LATEST["diff_analysis"] = enhance_diff_analysis(
+        card["diff_analysis"] = enhance_diff_analysis(
             basic_diff_analysis,
-            LATEST.get("diff", ""),
+            card.get("diff", ""),
             a.file_path,
             a.intent
         )
         # Calculate risk score (includes Airia adjustments if available)
-        LATEST["risk_score"] = calculate_risk_score(LATEST)
-        # Generate explanation
-        explanation = explain_reason(LATEST)
-        # Enhance explanation with Airia insights if available
-        try:
-            from app.airia_analysis import enhance_explanation_with_airia
-            explanation = enhance_explanation_with_airia(explanation, LATEST["diff_analysis"])
-        except Exception:
-            pass  # Silently ignore if Airia not available
-        LATEST["explanation"] = explanation
+        card["risk_score"] = calculate_risk_score(card)
+        # Generate explanation (local now + LLM in the background when deferred)
+        deferred = _explain(card, explain_mode)
+        # Serialized before the side effects (see the policy-blocked branch above)
+        response = json_response(propose_payload(res["ok"], card, request_id, res, view, fields))
         
         execution_time = time.time() - start_time
-        save_risk_card(LATEST, request_id, execution_time)
-        send_webhook(LATEST)
+        save_risk_card(card, request_id, execution_time)
+        get_recent_cards().publish(card)
+        publish_card(card)
+        send_webhook(card)
+        if deferred:
+            schedule_explanation(card, _on_explanation_ready)
         record_request("/propose_action", execution_time, True)
         
-        return {
-            "allowed": res["ok"],
-            "risk_card": LATEST,
-            "dry_run": res,
-            "request_id": request_id
-        }
-        
+        return response
+    
+    except SandboxBusy as e:
+        # Load shedding - nothing was saved, the caller should retry later
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers={"Retry-After": str(e.retry_after)})
+    except HTTPException:
+        raise
     except Exception as e:
         execution_time = time.time() - start_time
         error_msg = str(e)
@@ -0,0 +1,277 @@
+"""
+Baseline test results for Aegis dry runs.
+
+A test that already fails on the unmodified demo/ tree would otherwise block
+every proposal. The baseline suite is run once per snapshot fingerprint (a
+hash of the files under demo/ plus the Python and pytest versions) and its
+per-test outcomes and durations are cached; each dry run is then compared
+test by test against it, so only failures the change introduced count:
+
+- new_failures: fail now, passed (or did not exist) on the baseline
+- preexisting_failures: fail on both - reported, but do not block
+- fixed: failed on the baseline, pass now
+
+The cached durations and how often each test failed in past dry runs also
+order the candidate run - likely-to-fail tests first, then the slowest - and
+balance its shards (app/test_runner.py); with fail-fast the run stops at the
+first new failure.
+
+Configuration (environment variables):
+- AEGIS_BASELINE_CACHE: "0" runs the plain suite without baseline comparison (default on)
+- AEGIS_BASELINE_RETRY_SECONDS: after a baseline run fails, how long dry runs of that
+  snapshot skip the comparison before the baseline is tried again (default 60)
+"""
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from app.test_runner import run_suite
+
+BASELINE_ENABLED = os.getenv("AEGIS_BASELINE_CACHE", "1") != "0"
+BASELINE_RETRY_SECONDS = float(os.getenv("AEGIS_BASELINE_RETRY_SECONDS", "60"))
+
+_SKIP_DIRS = {"__pycache__", ".pytest_cache", ".git", ".tmp"}
+_FAILED = ("failed", "error")
+
+
+def _snapshot_files(src: Path) -> List[Tuple[str, os.stat_result]]:
+    """(relative path, stat) of every file in the snapshot, sorted."""
+    files = []
+    for root, dirs, names in os.walk(src):
+        dirs[:] = sorted(d for d in dirs if d not in _SKIP_DIRS)
+        for name in names:
+            if name.endswith(".pyc"):
+                continue
+            path = os.path.join(root, name)
+            files.append((os.path.relpath(path, src), os.stat(path)))
+    return sorted(files)
+
+
+def _tool_versions() -> str:
+    try:
+        from importlib.metadata import version
+        pytest_version = version("pytest")
+    except Exception:
+        pytest_version = "unknown"
+    return f"python {sys.version.split()[0]}, pytest {pytest_version}"
+
+
+def compare(baseline: Dict[str, Dict], candidate: Dict[str, Dict]) -> Dict:
+    """
+    Per-test comparison of a dry run against the baseline.
+
+    Args:
+        baseline: {nodeid: {"outcome", "duration"}} of the unmodified tree
+        candidate: Same for the modified tree
+
+    Returns:
+        Dictionary with new_failures, preexisting_failures, fixed (lists of
+        node ids) and not_run (baseline tests the candidate did not run, e.g.
+        after fail-fast)
+    """
+    new_failures, preexisting, fixed = [], [], []
+    for nodeid, result in candidate.items():
+        was_failing = baseline.get(nodeid, {}).get("outcome") in _FAILED
+        if result["outcome"] in _FAILED:
+            (preexisting if was_failing else new_failures).append(nodeid)
+        elif was_failing and result["outcome"] == "passed":
+            fixed.append(nodeid)
+    return {
+        "new_failures": new_failures,
+        "preexisting_failures": preexisting,
+        "fixed": fixed,
+        "not_run": sum(1 for nodeid in baseline if nodeid not in candidate),
+    }
+
+
+class BaselineCache:
+    """Baseline reports per snapshot fingerprint (memory + SQLite) and per-test failure history."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._reports: Dict[str, Dict] = {}
+        self._fingerprints: Dict[str, Tuple[str, str]] = {}  # src -> (stat signature, fingerprint)
+        self._inflight: Dict[str, threading.Event] = {}
+        self._failed: Dict[str, float] = {}  # fingerprint -> when its baseline run last failed
+        self._lock = threading.Lock()
+        self.counts = {"hits": 0, "misses": 0, "baseline_runs": 0, "failed_skips": 0}
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS baseline_results (
+                fingerprint TEXT PRIMARY KEY,
+                report TEXT,
+                created_at REAL
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS test_failure_stats (
+                nodeid TEXT PRIMARY KEY,
+                runs INTEGER,
+                failures INTEGER
+            )
+        """)
+        conn.commit()
+        conn.close()
+
+    def fingerprint(self, src: Path) -> str:
+        """
+        Snapshot fingerprint: sha256 over file paths and contents plus tool versions.
+
+        Contents are only re-hashed when a file's size or mtime changed.
+        """
+        files = _snapshot_files(src)
+        signature = hashlib.sha256(repr([(p, s.st_size, s.st_mtime_ns) for p, s in files]).encode()).hexdigest()
+        with self._lock:
+            cached = self._fingerprints.get(str(src))
+            if cached and cached[0] == signature:
+                return cached[1]
+        digest = hashlib.sha256(_tool_versions().encode())
+        for rel, _ in files:
+            digest.update(b"\x00" + rel.encode("utf-8") + b"\x00")
+            with open(os.path.join(src, rel), "rb") as f:
+                digest.update(f.read())
+        fingerprint = digest.hexdigest()
+        with self._lock:
+            self._fingerprints[str(src)] = (signature, fingerprint)
+        return fingerprint
+
+    def _load(self, fingerprint: str) -> Optional[Dict]:
+        with self._lock:
+            if fingerprint in self._reports:
+                return self._reports[fingerprint]
+        conn = sqlite3.connect(self.db_path)
+        row = conn.execute("SELECT report FROM baseline_results WHERE fingerprint = ?", (fingerprint,)).fetchone()
+        conn.close()
+        if row is None:
+            return None
+        report = json.loads(row[0])
+        with self._lock:
+            self._reports[fingerprint] = report
+        return report
+
+    def _store(self, fingerprint: str, report: Dict):
+        with self._lock:
+            self._reports[fingerprint] = report
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("INSERT OR REPLACE INTO baseline_results (fingerprint, report, created_at) VALUES (?, ?, ?)",
+                     (fingerprint, json.dumps(report), time.time()))
+        conn.commit()
+        conn.close()
+
+    def _run_baseline(self, src: Path) -> Optional[Dict]:
+        work = tempfile.mkdtemp()
+        try:
+            subprocess.run(["bash", "-lc", f"cp -R '{src}/.' '{work}/'"], check=True)
+            result = run_suite(work)
+        finally:
+            shutil.rmtree(work, ignore_errors=True)
+        with self._lock:
+            self.counts["baseline_runs"] += 1
+        if result["report"] is None or result["limit_hit"]:
+            print(f"Baseline run produced no usable report (limit: {result['limit_hit']}): {result['stderr'][-200:]}")
+            return None
+        return result["report"]
+
+    def baseline(self, src: Path) -> Tuple[str, Optional[Dict], bool]:
+        """
+        Baseline report for a snapshot, running the suite once if it is not cached.
+
+        Concurrent callers for the same fingerprint wait for a single baseline run.
+        A failed run is remembered for BASELINE_RETRY_SECONDS, so a broken
+        snapshot does not run the whole suite again on every dry run.
+
+        Returns:
+            (fingerprint, report or None if the baseline could not be run, cached)
+        """
+        fingerprint = self.fingerprint(src)
+        while True:
+            report = self._load(fingerprint)
+            if report is not None:
+                with self._lock:
+                    self.counts["hits"] += 1
+                return fingerprint, report, True
+            with self._lock:
+                failed_at = self._failed.get(fingerprint)
+                if failed_at is not None and time.time() - failed_at < BASELINE_RETRY_SECONDS:
+                    self.counts["failed_skips"] += 1
+                    return fingerprint, None, False
+                event = self._inflight.get(fingerprint)
+                if event is None:
+                    event = self._inflight[fingerprint] = threading.Event()
+                    owner = True
+                    self.counts["misses"] += 1
+                else:
+                    owner = False
+            if not owner:
+                event.wait()
+                if self._load(fingerprint) is None:
+                    return fingerprint, None, False  # The owner's run failed; do not retry in a loop
+                continue
+            try:
+                report = self._run_baseline(src)
+                if report is not None:
+                    self._store(fingerprint, report)
+                else:
+                    with self._lock:
+                        self._failed[fingerprint] = time.time()
+                return fingerprint, report, False
+            finally:
+                with self._lock:
+                    del self._inflight[fingerprint]
+                event.set()
+
+    def record_run(self, tests: Dict[str, Dict]):
+        """Count per-test failures of a dry run (used to run likely failures first)."""
+        if not tests:
+            return
+        conn = sqlite3.connect(self.db_path)
+        conn.executemany("""
+            INSERT INTO test_failure_stats (nodeid, runs, failures) VALUES (?, 1, ?)
+            ON CONFLICT (nodeid) DO UPDATE SET runs = runs + 1, failures = failures + excluded.failures
+        """, [(nodeid, int(result["outcome"] in _FAILED)) for nodeid, result in tests.items()])
+        conn.commit()
+        conn.close()
+
+    def test_order(self, baseline: Dict) -> Dict[str, int]:
+        """
+        Rank for each baseline test: highest past failure rate first, then slowest.
+
+        Tests already failing on the baseline go last - they cannot produce a new failure.
+        """
+        tests = baseline.get("tests", {})
+        if not tests:
+            return {}
+        conn = sqlite3.connect(self.db_path)
+        rates = {nodeid: failures / runs for nodeid, runs, failures in
+                 conn.execute("SELECT nodeid, runs, failures FROM test_failure_stats WHERE runs > 0")}
+        conn.close()
+        ranked = sorted(tests, key=lambda nodeid: (tests[nodeid]["outcome"] in _FAILED,
+                                                   -rates.get(nodeid, 0.0), -tests[nodeid]["duration"]))
+        return {nodeid: rank for rank, nodeid in enumerate(ranked)}
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"snapshots": len(self._reports), **self.counts}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_baseline_cache() -> BaselineCache:
+    """Process-wide baseline cache stored alongside the history database."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            from app.history import DB_PATH
+            _cache = BaselineCache(DB_PATH)
+        return _cache
@@ -1,23 +1,29 @@
 """Advanced diff analysis for Aegis."""
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
+from app.diff_scanner import get_scanner
 
 
-def analyze_diff(diff: str) -> Dict:
+def analyze_diff(diff: str, scan: Optional[Dict] = None) -> Dict:
     """
     Analyze a unified diff for risky patterns and change statistics.
     
     Args:
         diff: Unified diff string (from difflib.unified_diff)
+        scan: Optional precomputed result of diff_scanner.scan_diff(diff)
         
     Returns:
         Dictionary with keys:
         - lines_added: int - Number of lines added
         - lines_removed: int - Number of lines removed
         - risky_patterns: List[str] - Detected risky patterns (DELETE, DROP, etc.)
-        - sensitive_data: bool - True if potential secrets detected
+        - sensitive_data: bool - True if the secret scanner found anything
         - summary: str - Human-readable summary
         - added_lines: List[str] - First 10 added lines (preview)
         - removed_lines: List[str] - First 10 removed lines (preview)
+        - pattern_hits: List[Dict] - Rule hits with line numbers
+        - hit_counts: Dict[str, int] - Lines hit per rule id
+        - secret_findings: List[Dict] - Redacted secret findings (see app/secret_scan.py)
+        - secret_weight: int - Risk penalty from secret findings
     """
     if not diff:
         return {
@@ -28,59 +34,51 @@ def analyze_diff(diff: str) -> Dict:
             "summary": "No changes detected"
         }
     
-    lines = diff.split("\n")
-    added = []
-    removed = []
+    scanner = get_scanner()
+    if scan is None:
+        scan = scanner.scan(diff)
     
-    for line in lines:
-        if line.startswith("+") and not line.startswith("+++"):
-            added.append(line[1:])
-        elif line.startswith("-") and not line.startswith("---"):
-            removed.append(line[1:])
-    
-    # Check for risky patterns
+    # Risky patterns and sensitive data come from the shared single-pass scan
     risky_patterns = []
-    all_text = "\n".join(added + removed).upper()
-    
-    patterns = {
-        "DELETE": "DELETE statement detected",
-        "DROP": "DROP statement detected",
-        "TRUNCATE": "TRUNCATE statement detected",
-        "rm -rf": "Recursive delete command",
-        "--force": "Force flag detected",
-        "--no-check": "Safety check bypass",
-        "password": "Potential password exposure",
-        "secret": "Potential secret exposure",
-        "api_key": "Potential API key exposure",
-        "token": "Potential token exposure",
-    }
+    sensitive_data = False
+    for rule_id in scan["hit_counts"]:
+        rule = scanner.rules.get(rule_id, {})
+        if rule.get("sensitive"):
+            sensitive_data = True
+        risky_patterns.append(scanner.description(rule_id))
     
-    for pattern, description in patterns.items():
-        if pattern in all_text:
-            risky_patterns.append(description)
+    # Secret findings from signature + entropy screening of added lines
+    seen_labels = set()
+    for finding in scan["secrets"]:
+        sensitive_data = True
+        if finding["label"] not in seen_labels:
+            seen_labels.add(finding["label"])
+            risky_patterns.append(f"Potential {finding['label']} exposure (line {finding['line']})")
     
-    # Check for sensitive data patterns
-    sensitive_patterns = ["password", "secret", "api_key", "token", "credential"]
-    sensitive_data = any(p in all_text.lower() for p in sensitive_patterns)
+    added = scan["lines_added"]
+    removed = scan["lines_removed"]
     
     # Generate summary
     summary_parts = []
-    if len(added) > 0:
-        summary_parts.append(f"{len(added)} line(s) added")
-    if len(removed) > 0:
-        summary_parts.append(f"{len(removed)} line(s) removed")
+    if added > 0:
+        summary_parts.append(f"{added} line(s) added")
+    if removed > 0:
+        summary_parts.append(f"{removed} line(s) removed")
     if risky_patterns:
         summary_parts.append(f"{len(risky_patterns)} risky pattern(s) found")
     
     summary = ", ".join(summary_parts) if summary_parts else "No significant changes"
     
     return {
-        "lines_added": len(added),
-        "lines_removed": len(removed),
+        "lines_added": added,
+        "lines_removed": removed,
         "risky_patterns": risky_patterns,
         "sensitive_data": sensitive_data,
         "summary": summary,
-        "added_lines": added[:10],  # First 10 for preview
-        "removed_lines": removed[:10]
+        "added_lines": scan["added_lines"],  # First 10 for preview
+        "removed_lines": scan["removed_lines"],
+        "pattern_hits": scan["hits"],
+        "hit_counts": scan["hit_counts"],
+        "secret_findings": scan["secrets"],
+        "secret_weight": scan["secret_weight"]
     }
-
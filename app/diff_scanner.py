@@ -0,0 +1,186 @@
+"""
+Single-pass diff scanner for Aegis.
+
+Walks a unified diff once and produces everything the downstream consumers
+need: added/removed line counts, preview lines, pattern hits with line
+numbers, and secret findings for added lines. analyze_diff,
+calculate_risk_score and explain_reason all reuse the same scan instead of
+re-splitting and re-uppercasing the diff text.
+
+All rule patterns are compiled into one case-insensitive alternation, so each
+changed line is searched once regardless of how many rules exist. Rules are
+configurable via a JSON file pointed to by AEGIS_SCAN_RULES (a list of rule
+dicts with the same keys as DEFAULT_RULES).
+"""
+import io
+import json
+import os
+import re
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Tuple
+from app.secret_scan import scan_line
+
+# id: stable rule id, pattern: literal text (case-insensitive),
+# description: shown in risky_patterns, weight: risk score penalty when hit,
+# sensitive: marks the hit as potential sensitive data.
+# Credentials are detected by app/secret_scan.py rather than keyword rules.
+DEFAULT_RULES = [
+    {"id": "delete", "pattern": "DELETE", "description": "DELETE statement detected", "weight": 10},
+    {"id": "drop", "pattern": "DROP", "description": "DROP statement detected", "weight": 10},
+    {"id": "drop_table", "pattern": "DROP TABLE", "description": "DROP TABLE statement detected", "weight": 15},
+    {"id": "truncate", "pattern": "TRUNCATE", "description": "TRUNCATE statement detected", "weight": 12},
+    {"id": "rm_rf", "pattern": "rm -rf", "description": "Recursive delete command", "weight": 15},
+    {"id": "force", "pattern": "--force", "description": "Force flag detected", "weight": 8},
+    {"id": "no_check", "pattern": "--no-check", "description": "Safety check bypass", "weight": 8},
+]
+
+# Keep stored scans small even for huge generated diffs
+MAX_HITS = 100
+MAX_SECRETS = 50
+PREVIEW_LINES = 10
+
+_HUNK_RE = re.compile(r"^@@ -(\d+)(?:,\d+)? \+(\d+)(?:,\d+)? @@")
+
+
+def iter_lines(text: str) -> Iterator[str]:
+    """Yield lines of text without building an intermediate list."""
+    for line in io.StringIO(text):
+        yield line.rstrip("\r\n")
+
+
+def iter_changed_lines(diff: str) -> Iterator[Tuple[str, int, str]]:
+    """
+    Yield (side, line_number, text) for every added/removed line of a unified diff.
+
+    side is "+" or "-"; line_number is the line in the new file for additions
+    and in the old file for removals (0 if the diff has no hunk headers).
+    """
+    old_no = new_no = 0
+    for line in iter_lines(diff):
+        if line.startswith("@@"):
+            m = _HUNK_RE.match(line)
+            if m:
+                old_no, new_no = int(m.group(1)), int(m.group(2))
+            continue
+        if line.startswith("+") and not line.startswith("+++"):
+            yield "+", new_no, line[1:]
+            new_no += 1
+        elif line.startswith("-") and not line.startswith("---"):
+            yield "-", old_no, line[1:]
+            old_no += 1
+        elif line.startswith(" "):
+            old_no += 1
+            new_no += 1
+
+
+class DiffScanner:
+    """Matches a rule set against the changed lines of a diff in one pass."""
+
+    def __init__(self, rules: List[Dict]):
+        self.rules = {r["id"]: r for r in rules}
+        literals = sorted({r["pattern"].lower() for r in rules}, key=len, reverse=True)
+        # Longest-first alternation; a match on "drop table" also counts for "drop"
+        self._regex = re.compile("|".join(re.escape(p) for p in literals), re.IGNORECASE) if literals else None
+        self._implied = {
+            lit: [r["id"] for r in rules if r["pattern"].lower() in lit]
+            for lit in literals
+        }
+
+    def _match_line(self, text: str) -> List[str]:
+        """Return the ids of all rules that hit on one line."""
+        hit = []
+        for m in self._regex.finditer(text):
+            for rule_id in self._implied[m.group(0).lower()]:
+                if rule_id not in hit:
+                    hit.append(rule_id)
+        return hit
+
+    def scan(self, diff: str) -> Dict:
+        """
+        Scan a unified diff once.
+
+        Args:
+            diff: Unified diff string
+
+        Returns:
+            Dictionary with keys:
+            - lines_added: int - Number of lines added
+            - lines_removed: int - Number of lines removed
+            - added_lines: List[str] - First 10 added lines (preview)
+            - removed_lines: List[str] - First 10 removed lines (preview)
+            - hits: List[Dict] - {"rule", "line", "side"} per rule per line (capped at MAX_HITS)
+            - hit_counts: Dict[str, int] - Number of lines each rule hit on
+            - secrets: List[Dict] - Secret findings on added lines (capped at MAX_SECRETS)
+            - secret_count: int - Total secret findings
+            - secret_weight: int - Sum of finding weights (for risk scoring)
+        """
+        added = removed = 0
+        added_preview, removed_preview = [], []
+        hits, hit_counts = [], {}
+        secrets, secret_count, secret_weight = [], 0, 0
+
+        for side, line_no, text in iter_changed_lines(diff or ""):
+            if side == "+":
+                added += 1
+                if len(added_preview) < PREVIEW_LINES:
+                    added_preview.append(text)
+                # Only added lines can introduce a leaked secret
+                if len(text) >= 8:
+                    for finding in scan_line(text, line_no):
+                        secret_count += 1
+                        secret_weight += finding["weight"]
+                        if len(secrets) < MAX_SECRETS:
+                            secrets.append(finding)
+            else:
+                removed += 1
+                if len(removed_preview) < PREVIEW_LINES:
+                    removed_preview.append(text)
+            if self._regex is None:
+                continue
+            for rule_id in self._match_line(text):
+                hit_counts[rule_id] = hit_counts.get(rule_id, 0) + 1
+                if len(hits) < MAX_HITS:
+                    hits.append({"rule": rule_id, "line": line_no, "side": side})
+
+        return {
+            "lines_added": added,
+            "lines_removed": removed,
+            "added_lines": added_preview,
+            "removed_lines": removed_preview,
+            "hits": hits,
+            "hit_counts": hit_counts,
+            "secrets": secrets,
+            "secret_count": secret_count,
+            "secret_weight": secret_weight,
+        }
+
+    def weight(self, rule_id: str) -> int:
+        """Risk score penalty for a rule (0 for unknown rules)."""
+        return self.rules.get(rule_id, {}).get("weight", 0)
+
+    def description(self, rule_id: str) -> str:
+        """Human-readable description for a rule."""
+        return self.rules.get(rule_id, {}).get("description", rule_id)
+
+
+def load_rules() -> List[Dict]:
+    """Load scanner rules from AEGIS_SCAN_RULES if set, else DEFAULT_RULES."""
+    path = os.getenv("AEGIS_SCAN_RULES")
+    if path and os.path.exists(path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Invalid AEGIS_SCAN_RULES file (using defaults): {e}")
+    return DEFAULT_RULES
+
+
+@lru_cache(maxsize=1)
+def get_scanner() -> DiffScanner:
+    """Shared scanner built from the configured rule set."""
+    return DiffScanner(load_rules())
+
+
+def scan_diff(diff: Optional[str]) -> Dict:
+    """Scan a diff with the shared scanner."""
+    return get_scanner().scan(diff or "")
@@ -3,31 +3,54 @@ Local sandbox execution for Aegis.
 
 Creates an isolated copy of the demo/ directory, applies proposed changes,
 runs pytest, and generates a unified diff. All operations happen in a
-temporary directory that is cleaned up after execution.
+temporary directory that is cleaned up after execution. The tests run under
+the resource limits in app/sandbox_limits.py and their usage is returned.
+Results are compared per test against the cached baseline of the unmodified
+demo/ tree (app/baseline_cache.py), so only new failures fail the dry run.
 
 See docs/ARCHITECTURE.md for sandbox workflow details.
 """
 import subprocess, tempfile, os, shutil, difflib
 from pathlib import Path
+from app.structural_diff import structural_diff
+from app.baseline_cache import BASELINE_ENABLED, compare, get_baseline_cache
+from app.test_runner import compact_results, resolve_test_mode, run_suite
 
-def dry_run(file_path: str, new_contents: str):
+def dry_run(file_path: str, new_contents: str, test_mode: str = None, log=None):
     """
     Execute a dry run in a local sandbox.
     
     Args:
         file_path: Path to file being modified (e.g., "config/app.yaml")
         new_contents: Proposed new file contents
+        test_mode: "fail_fast" (stop at the first new failure) or "full"
+            (complete failure list); defaults to AEGIS_TEST_FAIL_FAST
+        log: Live log to stream pytest output to; cancelling it stops the
+            tests (app/sandbox_logs.py)
         
     Returns:
         Dictionary with keys:
-        - ok: bool - True if pytest passed
+        - ok: bool - True if pytest passed, ignoring tests that already fail
+          on the baseline
         - diff: str - Unified diff of changes
         - stdout: str - Last 400 chars of pytest stdout
         - stderr: str - Last 400 chars of pytest stderr
+        - structural_diff: dict | None - Keyed diff for YAML/JSON files
+        - usage: dict - CPU seconds, max RSS, disk/IO bytes and wall time of the
+          test run, summed over the pytest workers (see app/test_runner.py)
+        - limit_hit: str | None - Resource limit that stopped the tests, or
+          "cancelled"
+        - baseline: dict | None - Comparison with the baseline run: fingerprint,
+          cached, new_failures, preexisting_failures, fixed, not_run,
+          stopped_early (None when the baseline cache is off or unavailable)
+        - test_mode: str - Test mode the suite ran in
+        - test_results: dict | None - Per-test outcomes, durations and failure
+          messages (see app/test_runner.compact_results)
         
     Side effects:
         Creates and destroys a temporary directory
     """
+    test_mode = resolve_test_mode(test_mode)
     work = tempfile.mkdtemp()
     try:
         # Find project root (where app/ directory is located)
@@ -48,16 +71,45 @@ def dry_run(file_path: str, new_contents: str):
             with open(target,"r") as f: old = f.read()
         with open(target,"w") as f: f.write(new_contents)
 
-        test = subprocess.run(["pytest","-q"], cwd=work, capture_output=True, text=True, timeout=30)
+        baseline = None
+        if BASELINE_ENABLED:
+            cache = get_baseline_cache()
+            fingerprint, baseline_report, cached = cache.baseline(src)
+            if baseline_report is not None:
+                baseline = {"fingerprint": fingerprint, "cached": cached, "report": baseline_report}
+        if baseline is not None:
+            tests = baseline["report"]["tests"]
+            known = [nodeid for nodeid, result in tests.items() if result["outcome"] in ("failed", "error")]
+            test = run_suite(work, order=cache.test_order(baseline["report"]), known_failures=known,
+                             test_mode=test_mode,
+                             durations={nodeid: result["duration"] for nodeid, result in tests.items()}, log=log)
+        else:
+            test = run_suite(work, test_mode=test_mode, log=log)
+        if test["limit_hit"] in ("wall", "cancelled"):
+            return {"ok": False, "diff": "", "stdout": test["stdout"],
+                    "stderr": "Tests timed out" if test["limit_hit"] == "wall" else "Tests cancelled",
+                    "usage": test["usage"], "limit_hit": test["limit_hit"], "baseline": None, "test_mode": test_mode,
+                    "test_results": compact_results(test.get("report"))}
         diff = "\n".join(difflib.unified_diff(
             old.splitlines(), new_contents.splitlines(),
             fromfile=file_path, tofile=file_path
         ))
-        ok = (test.returncode == 0)
-        stdout = test.stdout[-400:] if test.stdout else ""
-        stderr = test.stderr[-400:] if test.stderr else ""
-        return {"ok": ok, "diff": diff, "stdout": stdout, "stderr": stderr}
-    except subprocess.TimeoutExpired:
-        return {"ok": False, "diff": "", "stdout": "", "stderr": "Tests timed out"}
+        ok = (test["returncode"] == 0)
+        comparison = None
+        if baseline is not None and test.get("report") is not None:
+            candidate = test["report"]["tests"]
+            comparison = compare(baseline["report"]["tests"], candidate)
+            comparison.update(fingerprint=baseline["fingerprint"], cached=baseline["cached"],
+                              stopped_early=test["report"]["stopped_early"])
+            # Exit code 1 only means "some tests failed"; they may all be pre-existing
+            ok = ok or (test["returncode"] == 1 and not test["limit_hit"] and not comparison["new_failures"])
+            cache.record_run(candidate)
+        stderr = test["stderr"]
+        if test["limit_hit"]:
+            stderr = f"Sandbox {test['limit_hit']} limit exceeded\n{stderr}"[-400:]
+        return {"ok": ok, "diff": diff, "stdout": test["stdout"], "stderr": stderr,
+                "structural_diff": structural_diff(file_path, old, new_contents),
+                "usage": test["usage"], "limit_hit": test["limit_hit"], "baseline": comparison,
+                "test_mode": test_mode, "test_results": compact_results(test.get("report"))}
     finally:
         shutil.rmtree(work, ignore_errors=True)
@@ -0,0 +1,140 @@
+"""
+In-process pub/sub for risk card events.
+
+Saved risk cards (and later updates such as backfilled explanations) are
+published as compact summaries to every subscriber of the push feed
+(/riskcard/stream over SSE, /riskcard/ws over WebSocket). Each subscriber gets
+a bounded buffer: a consumer that falls behind loses its oldest events rather
+than slowing down publishers or growing memory.
+
+Publishers may run on any thread (request threadpool, explanation workers);
+subscribers live on the server's event loop.
+
+Configuration (environment variables):
+- AEGIS_STREAM_BUFFER: events buffered per subscriber (default 100)
+"""
+import asyncio
+import itertools
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from app.risk_scoring import get_risk_level
+
+BUFFER_SIZE = int(os.getenv("AEGIS_STREAM_BUFFER", "100"))
+
+
+def summarize(risk_card: dict) -> Dict:
+    """Compact risk card summary for the push feed (no diff, stdout or blobs)."""
+    action = risk_card.get("action") or {}
+    diff_analysis = risk_card.get("diff_analysis") or {}
+    test_results = risk_card.get("test_results") or {}
+    score = risk_card.get("risk_score", 0)
+    return {
+        "request_id": risk_card.get("request_id"),
+        "status": risk_card.get("status", "unknown"),
+        "risk_score": score,
+        "risk_level": get_risk_level(score)[0],
+        "file_path": action.get("file_path"),
+        "intent": action.get("intent"),
+        "failed_checks": [name for name, ok, _ in risk_card.get("checks", []) if not ok],
+        "lines_added": diff_analysis.get("lines_added", 0),
+        "lines_removed": diff_analysis.get("lines_removed", 0),
+        "tests_failed": test_results.get("failed", 0) + test_results.get("error", 0),
+        "explanation_status": risk_card.get("explanation_status", "final"),
+        "ts": risk_card.get("ts", time.time()),
+    }
+
+
+class Subscription:
+    """One subscriber's bounded event buffer."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, maxsize: int, statuses: Optional[List[str]] = None):
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.statuses = set(statuses) if statuses else None
+        self.dropped = 0
+
+    def wants(self, event: Dict) -> bool:
+        return self.statuses is None or event["data"].get("status") in self.statuses
+
+    def _offer(self, event: Dict):
+        # Runs on the subscriber's loop: drop the oldest event when the buffer is full
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout: float) -> Optional[Dict]:
+        """Next event, or None after `timeout` seconds (lets callers send heartbeats)."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventBus:
+    """Fan-out of published events to all current subscriptions."""
+
+    def __init__(self, buffer_size: int = BUFFER_SIZE):
+        self.buffer_size = buffer_size
+        self._subs: List[Subscription] = []
+        self._lock = threading.Lock()
+        self._seq = itertools.count(1)
+        self.published = 0
+
+    def subscribe(self, statuses: Optional[List[str]] = None) -> Subscription:
+        """Register a subscriber on the running event loop."""
+        sub = Subscription(asyncio.get_running_loop(), self.buffer_size, statuses)
+        with self._lock:
+            self._subs.append(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        with self._lock:
+            if sub in self._subs:
+                self._subs.remove(sub)
+
+    def publish(self, event_type: str, risk_card: dict) -> Dict:
+        """
+        Publish a risk card event to every subscriber. Safe to call from any thread.
+
+        Returns:
+            The event that was published ({"id", "event", "data"})
+        """
+        event = {"id": next(self._seq), "event": event_type, "data": summarize(risk_card)}
+        with self._lock:
+            subs = list(self._subs)
+            self.published += 1
+        for sub in subs:
+            if sub.wants(event):
+                try:
+                    sub.loop.call_soon_threadsafe(sub._offer, event)
+                except RuntimeError:
+                    self.unsubscribe(sub)  # Subscriber's loop is gone
+        return event
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "subscribers": len(self._subs),
+                "published": self.published,
+                "dropped": sum(s.dropped for s in self._subs),
+            }
+
+
+_bus = EventBus()
+
+
+def get_event_bus() -> EventBus:
+    """Process-wide risk card event bus."""
+    return _bus
+
+
+def publish_card(risk_card: dict, event_type: str = "risk_card"):
+    """Publish a risk card; never raises into the request path."""
+    try:
+        _bus.publish(event_type, risk_card)
+    except Exception as e:
+        print(f"Event publish failed: {e}")
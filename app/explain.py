@@ -6,63 +6,116 @@ Generates human-readable explanations of risk assessments. Uses OpenRouter
 explanations from checks and diff analysis.
 
 Always returns a string - never crashes, even if OpenRouter fails.
+
+OpenRouter answers are cached by a normalized signature of the prompt inputs
+(see app/explain_cache.py), so repeated situations cost no tokens. Cache misses
+that arrive together can share one OpenRouter call (see app/explain_batcher.py).
 """
+from itertools import islice
+from typing import Optional
 from app.secrets import read_openrouter_key
+from app.explain_cache import get_explanation_cache
+from app.explain_batcher import batching_enabled, get_batcher
 from app.openrouter import call_openrouter
+from app.diff_scanner import iter_lines, scan_diff
 
 
-def explain_reason(risk_card: dict, max_chars: int = 400) -> str:
+def _diff_counts(risk_card: dict):
+    """Added/removed line counts, reusing the card's diff scan when present."""
+    scan = risk_card.get("diff_analysis") or {}
+    if "lines_added" not in scan:
+        scan = scan_diff(risk_card.get("diff", ""))
+    return scan["lines_added"], scan["lines_removed"]
+
+# Plain-English context for each policy rule id (see app/guards.py)
+_VIOLATION_HINTS = {
+    "path_allowlist": "Only files under 'config/' or 'flags/' can be modified for safety.",
+    "destructive_intent": "Intents containing 'delete' are blocked by the destructive operation policy. This prevents accidental deletion of critical resources.",
+    "key_not_allowed": "Only specific keys (service, pagination, featureX) are allowed in app.yaml for security.",
+    "pagination_range": "Pagination values must be between 1-100 to prevent performance issues or broken pagination.",
+    "percentage_range": "Rollout percentages are capped at 50% to prevent instant 100% rollouts that could break production.",
+    "yaml_parse": "The file content is not valid YAML/JSON.",
+    "json_parse": "The file content is not valid YAML/JSON.",
+}
+
+
+def _explain_violation(violation: dict, file_path: str, intent: str) -> str:
+    """Turn one structured policy violation into a sentence."""
+    rule = violation.get("rule", "")
+    msg = violation.get("message", "")
+    if rule == "path_allowlist":
+        return f"Policy violation: The file path '{file_path}' is not in the allowed list. {_VIOLATION_HINTS[rule]}"
+    if rule == "destructive_intent":
+        return f"Policy violation: The intent '{intent}' contains 'delete', which is blocked. {_VIOLATION_HINTS[rule]}"
+    hint = _VIOLATION_HINTS.get(rule)
+    return f"Policy violation: {msg}. {hint}" if hint else f"Policy violation: {msg}."
+
+
+def build_context(risk_card: dict) -> str:
     """
-    Generate a clear, specific explanation of the risk assessment.
-    Uses OpenRouter if API key is available, otherwise builds a detailed plain-English explanation.
-    Never crashes; always returns a string.
+    Describe a risk card for the LLM: action details, check results and a diff summary.
+    
+    This is the only card-dependent part of the prompt, so it also serves as the
+    input to the explanation cache key and to batched multi-item prompts.
     """
-    try:
-        # Try OpenRouter first if key is available
-        api_key = read_openrouter_key()
-        if api_key and api_key.strip():
-            try:
-                # Build detailed prompt for OpenRouter with full context
-                checks = risk_card.get("checks", [])
-                status = risk_card.get("status", "unknown")
-                diff = risk_card.get("diff", "")
-                action = risk_card.get("action", {})
-                file_path = action.get("file_path", "unknown")
-                intent = action.get("intent", "unknown")
-                
-                # Build detailed check summary
-                check_details = []
-                for name, ok, msg in checks:
-                    if not ok:
-                        check_details.append(f"FAILED: {name.upper()} check - {msg}")
-                    else:
-                        check_details.append(f"PASSED: {name.upper()} check - {msg}")
-                
-                check_summary = "\n".join(check_details)
-                
-                # Extract diff details
-                diff_summary = ""
-                if diff:
-                    lines = diff.split("\n")
-                    added = sum(1 for line in lines if line.startswith("+") and not line.startswith("+++"))
-                    removed = sum(1 for line in lines if line.startswith("-") and not line.startswith("---"))
-                    diff_summary = f"\n\nCode Changes:\n- {added} lines added\n- {removed} lines removed"
-                    # Include first few lines of actual diff for context
-                    diff_preview = "\n".join([line for line in lines[:10] if line.strip() and not line.startswith("@@")])
-                    if diff_preview:
-                        diff_summary += f"\n\nPreview of changes:\n{diff_preview}"
-                
-                # Build comprehensive prompt
-                prompt = f"""You are a security analyst explaining a code change risk assessment. Provide a clear, specific explanation.
+    checks = risk_card.get("checks", [])
+    status = risk_card.get("status", "unknown")
+    diff = risk_card.get("diff", "")
+    action = risk_card.get("action", {})
+    file_path = action.get("file_path", "unknown")
+    intent = action.get("intent", "unknown")
+
+    # Build detailed check summary
+    check_details = []
+    for name, ok, msg in checks:
+        if not ok:
+            check_details.append(f"FAILED: {name.upper()} check - {msg}")
+        else:
+            check_details.append(f"PASSED: {name.upper()} check - {msg}")
+
+    check_summary = "\n".join(check_details)
 
-ACTION DETAILS:
+    # List every policy violation so the model can address all of them at once
+    violations = risk_card.get("policy_violations", [])
+    if violations:
+        check_summary += "\n\nPOLICY VIOLATIONS:\n" + "\n".join(
+            f"- [{v['rule']}] {v['path'] or file_path}: {v['message']}" for v in violations
+        )
+
+    # Extract diff details
+    diff_summary = ""
+    if diff:
+        added, removed = _diff_counts(risk_card)
+        diff_summary = f"\n\nCode Changes:\n- {added} lines added\n- {removed} lines removed"
+        # Include first few lines of actual diff for context
+        diff_preview = "\n".join([line for line in islice(iter_lines(diff), 10) if line.strip() and not line.startswith("@@")])
+        if diff_preview:
+            diff_summary += f"\n\nPreview of changes:\n{diff_preview}"
+
+    # Keyed changes for YAML/JSON files are more precise than the line preview
+    sdiff = risk_card.get("structural_diff")
+    if sdiff:
+        key_changes = [f"- {c['path']}: {c['old']!r} -> {c['new']!r}" for c in sdiff.get("changed", [])[:10]]
+        key_changes += [f"- {c['path']}: added ({c['new']!r})" for c in sdiff.get("added", [])[:5]]
+        key_changes += [f"- {c['path']}: removed" for c in sdiff.get("removed", [])[:5]]
+        if key_changes:
+            diff_summary += "\n\nChanged keys:\n" + "\n".join(key_changes)
+
+    return f"""ACTION DETAILS:
 - File: {file_path}
 - Intent: {intent}
 - Status: {status.upper()}
 
 CHECK RESULTS:
 {check_summary}
-{diff_summary}
+{diff_summary}"""
+
+
+def build_prompt(risk_card: dict, max_chars: int = 400) -> str:
+    """Build the single-card OpenRouter prompt."""
+    return f"""You are a security analyst explaining a code change risk assessment. Provide a clear, specific explanation.
+
+{build_context(risk_card)}
 
 INSTRUCTIONS:
 1. If BLOCKED: Explain SPECIFICALLY which check failed and why it's dangerous. Mention the exact policy rule or test that failed.
@@ -75,18 +128,51 @@ Example for blocked: "This action was BLOCKED because the policy check failed. T
 Example for allowed: "This action is SAFE. The policy check passed (file path is allowed, intent is safe). The sandbox tests passed, confirming the change works correctly. The pagination value (50) is within the allowed range (1-100)."
 
 Now provide the explanation:"""
-                
-                explanation = call_openrouter(prompt, api_key)
-                if explanation and explanation.strip():
-                    # Truncate to max_chars if needed
-                    if len(explanation) > max_chars:
-                        explanation = explanation[:max_chars-3] + "..."
-                    return explanation.strip()
-            except Exception as e:
-                # Log error but don't crash - fall through to local explanation
-                print(f"OpenRouter error (falling back to local): {e}")
-                pass
-        
+
+
+def _truncate(text: str, max_chars: int) -> str:
+    if len(text) > max_chars:
+        return text[:max_chars-3] + "..."
+    return text
+
+
+def llm_explanation(risk_card: dict, max_chars: int = 400) -> Optional[str]:
+    """
+    Get an OpenRouter explanation, served from the explanation cache when possible.
+    
+    Returns:
+        Explanation string, or None if no API key is configured or the call failed
+    """
+    api_key = read_openrouter_key()
+    if not api_key or not api_key.strip():
+        return None
+    
+    prompt = build_prompt(risk_card, max_chars)
+    cache = get_explanation_cache()
+    key = cache.key_for(prompt)
+    cached = cache.get(key)
+    if cached:
+        return cached
+    
+    if batching_enabled():
+        explanation, retry = get_batcher().explain(key, prompt, build_context(risk_card), max_chars, api_key)
+        if explanation is None and retry:
+            explanation = call_openrouter(prompt, api_key)
+    else:
+        explanation = call_openrouter(prompt, api_key)
+    if explanation and explanation.strip():
+        explanation = _truncate(explanation, max_chars).strip()
+        cache.put(key, explanation)
+        return explanation
+    return None
+
+
+def local_explanation(risk_card: dict, max_chars: int = 400) -> str:
+    """
+    Build a detailed plain-English explanation from checks and diff, without any network call.
+    Never crashes; always returns a string.
+    """
+    try:
         # Build detailed local explanation from checks and diff
         checks = risk_card.get("checks", [])
         status = risk_card.get("status", "unknown")
@@ -126,7 +212,10 @@ Now provide the explanation:"""
                 # Build detailed failure explanations
                 failure_explanations = []
                 for name, msg in failed:
-                    if name == "policy":
+                    if name == "policy" and risk_card.get("policy_violations"):
+                        for v in risk_card["policy_violations"]:
+                            failure_explanations.append(_explain_violation(v, file_path, intent))
+                    elif name == "policy":
                         if "not in allowlist" in msg:
                             failure_explanations.append(f"Policy violation: The file path '{file_path}' is not in the allowed list. Only files under 'config/' or 'flags/' can be modified for safety.")
                         elif "Destructive intent blocked" in msg:
@@ -159,9 +248,7 @@ Now provide the explanation:"""
         
         # Add diff summary if available
         if diff:
-            lines = diff.split("\n")
-            added = sum(1 for line in lines if line.startswith("+") and not line.startswith("+++"))
-            removed = sum(1 for line in lines if line.startswith("-") and not line.startswith("---"))
+            added, removed = _diff_counts(risk_card)
             if added > 0 or removed > 0:
                 parts.append(f"Change summary: {added} line(s) added, {removed} line(s) removed.")
         
@@ -177,3 +264,18 @@ Now provide the explanation:"""
         # Ultimate fallback - never crash
         return "Risk assessment completed."
 
+
+def explain_reason(risk_card: dict, max_chars: int = 400) -> str:
+    """
+    Generate a clear, specific explanation of the risk assessment.
+    Uses OpenRouter if API key is available, otherwise builds a detailed plain-English explanation.
+    Never crashes; always returns a string.
+    """
+    try:
+        explanation = llm_explanation(risk_card, max_chars)
+        if explanation:
+            return explanation
+    except Exception as e:
+        # Log error but don't crash - fall through to local explanation
+        print(f"OpenRouter error (falling back to local): {e}")
+    return local_explanation(risk_card, max_chars)
@@ -0,0 +1,232 @@
+"""
+Micro-batching of OpenRouter explanation requests.
+
+Under load many assessments reach the LLM explanation step within the same few
+hundred milliseconds, and each one used to make its own OpenRouter call. The
+batcher collects pending requests for up to AEGIS_EXPLAIN_BATCH_MS or
+AEGIS_EXPLAIN_BATCH_SIZE items, sends them as one numbered multi-item prompt
+and maps the JSON array answer back to each caller.
+
+If the batched answer cannot be parsed, callers fall back to an individual
+OpenRouter call; if the provider failed outright they fall back to the local
+explanation (see app/explain.py).
+
+Configuration (environment variables):
+- AEGIS_EXPLAIN_BATCH_SIZE: max items per OpenRouter call (default 1 = batching off)
+- AEGIS_EXPLAIN_BATCH_MS: how long to wait for more items after the first (default 50)
+- AEGIS_EXPLAIN_BATCH_WORKERS: batches in flight at once (default 4)
+"""
+import json
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+from app.openrouter import OPENROUTER_DEADLINE, call_openrouter
+
+BATCH_SIZE = int(os.getenv("AEGIS_EXPLAIN_BATCH_SIZE", "1"))
+BATCH_MS = float(os.getenv("AEGIS_EXPLAIN_BATCH_MS", "50"))
+BATCH_WORKERS = int(os.getenv("AEGIS_EXPLAIN_BATCH_WORKERS", "4"))
+
+# Completion tokens requested per item in a batched call
+TOKENS_PER_ITEM = 200
+
+
+def batching_enabled() -> bool:
+    return BATCH_SIZE > 1
+
+
+class _Item:
+    __slots__ = ("key", "prompt", "context", "max_chars", "api_key", "future")
+
+    def __init__(self, key, prompt, context, max_chars, api_key):
+        self.key = key
+        self.prompt = prompt
+        self.context = context
+        self.max_chars = max_chars
+        self.api_key = api_key
+        self.future = Future()
+
+
+def build_batch_prompt(contexts: List[Tuple[str, int]]) -> str:
+    """
+    Build one prompt covering several risk assessments.
+
+    Args:
+        contexts: (card context from build_context(), max_chars) per item
+
+    Returns:
+        Prompt asking for a JSON array with one explanation per item, in order
+    """
+    items = "\n\n".join(
+        f"### ITEM {i} (max {max_chars} characters)\n{context}"
+        for i, (context, max_chars) in enumerate(contexts, 1)
+    )
+    return f"""You are a security analyst explaining code change risk assessments. Below are {len(contexts)} independent assessments.
+
+{items}
+
+INSTRUCTIONS:
+For EACH item write a clear, specific explanation:
+1. If BLOCKED: Explain SPECIFICALLY which check failed and why it's dangerous. Mention the exact policy rule or test that failed.
+2. If ALLOWED: Explain why all checks passed and why this change is safe.
+3. Be specific about what would happen if this change was applied.
+4. Use plain English, be concise but informative (respect each item's character limit).
+
+Respond with ONLY a JSON array of {len(contexts)} strings, one explanation per item, in item order. No other text."""
+
+
+def parse_batch_response(text: str, expected: int) -> Optional[List[str]]:
+    """
+    Extract the per-item answers from a batched response.
+
+    Returns:
+        List of `expected` strings, or None if the response is not a usable array
+    """
+    if not text:
+        return None
+    start, end = text.find("["), text.rfind("]")
+    if start < 0 or end <= start:
+        return None
+    try:
+        answers = json.loads(text[start:end + 1])
+    except ValueError:
+        return None
+    if not isinstance(answers, list) or len(answers) != expected:
+        return None
+    if not all(isinstance(a, str) and a.strip() for a in answers):
+        return None
+    return [a.strip() for a in answers]
+
+
+class ExplanationBatcher:
+    """Collects explanation requests and dispatches them as batched OpenRouter calls."""
+
+    def __init__(self, max_batch: int = BATCH_SIZE, window_ms: float = BATCH_MS,
+                 workers: int = BATCH_WORKERS, call: Callable[..., str] = None):
+        self.max_batch = max(1, max_batch)
+        self.window = window_ms / 1000.0
+        self._call = call or call_openrouter
+        self._queue = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="aegis-explain-batch")
+        self._thread = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.parse_failures = 0
+
+    def explain(self, key: str, prompt: str, context: str, max_chars: int, api_key: str,
+                timeout: Optional[float] = None) -> Tuple[Optional[str], bool]:
+        """
+        Queue one explanation request and wait for its batch.
+
+        Args:
+            key: Explanation cache key (identical keys in a batch share one answer)
+            prompt: Single-item prompt, used when the batch holds only this request
+            context: Card context for the multi-item prompt
+            max_chars: Character limit for this explanation
+            api_key: OpenRouter API key
+            timeout: Seconds to wait for the batch to complete (default: the
+                collection window plus the longest an OpenRouter call can take,
+                timeouts and retries included)
+
+        Returns:
+            (explanation or None, retry_individually) - retry_individually is True
+            when the batched answer could not be parsed for this item
+        """
+        item = _Item(key, prompt, context, max_chars, api_key)
+        self._ensure_started()
+        self._queue.put(item)
+        if timeout is None:
+            timeout = self.window + OPENROUTER_DEADLINE
+        try:
+            return item.future.result(timeout=timeout)
+        except Exception:
+            return None, False
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._collect, name="aegis-explain-collector", daemon=True)
+                self._thread.start()
+
+    def _collect(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._executor.submit(self._dispatch, batch)
+
+    def _dispatch(self, batch: List[_Item]):
+        # Identical situations in one window are explained once
+        groups = OrderedDict()
+        for item in batch:
+            groups.setdefault(item.key, []).append(item)
+        with self._lock:
+            self.batches += 1
+            self.items += len(batch)
+
+        def resolve(items, result):
+            for it in items:
+                if not it.future.done():
+                    it.future.set_result(result)
+
+        try:
+            if len(groups) == 1:
+                first = batch[0]
+                text = self._call(first.prompt, first.api_key)
+                resolve(batch, (text.strip() if text and text.strip() else None, False))
+                return
+
+            firsts = [items[0] for items in groups.values()]
+            prompt = build_batch_prompt([(it.context, it.max_chars) for it in firsts])
+            text = self._call(prompt, firsts[0].api_key, max_tokens=TOKENS_PER_ITEM * len(firsts))
+            if not text:
+                # Provider failed - individual calls would fail the same way
+                resolve(batch, (None, False))
+                return
+
+            answers = parse_batch_response(text, len(firsts))
+            if answers is None:
+                with self._lock:
+                    self.parse_failures += 1
+                print(f"Batched explanation response could not be parsed ({len(firsts)} items), retrying individually")
+                resolve(batch, (None, True))
+                return
+            for answer, items in zip(answers, groups.values()):
+                resolve(items, (answer, False))
+        except Exception as e:
+            print(f"Batched explanation error: {e}")
+            resolve(batch, (None, True))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "items": self.items,
+                "parse_failures": self.parse_failures,
+                "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0,
+            }
+
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+
+def get_batcher() -> ExplanationBatcher:
+    """Process-wide explanation batcher."""
+    global _batcher
+    with _batcher_lock:
+        if _batcher is None:
+            _batcher = ExplanationBatcher()
+        return _batcher
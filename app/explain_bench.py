@@ -0,0 +1,152 @@
+"""
+Offline latency harness for the explanation and AI-analysis path.
+
+Starts the provider stub (app/llm_stub.py) in-process, points the OpenRouter
+and Airia clients at it, and pushes synthetic risk cards through
+explain_reason() and enhance_diff_analysis() at a given concurrency. Reports
+latency percentiles, how often the local fallback was used, and the circuit
+breaker states at the end - i.e. how the pipeline behaves when the AI
+providers are slow or failing.
+
+Usage:
+    python -m app.explain_bench --requests 200 --concurrency 16 --profile slow.json
+    python -m app.explain_bench --mode replay --record-file calls.jsonl --replay-latency
+    python -m app.explain_bench --no-cache --batch-size 8    # exercise batching
+
+Options that change client configuration (cache, batching) are applied
+through environment variables before the app modules are imported.
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+_INTENTS = ["update pagination", "enable featureX", "change service type", "delete table", "rollout flag"]
+_FILES = ["config/app.yaml", "flags/rollout.json", "src/main.py"]
+
+
+def sample_card(i: int) -> dict:
+    """Synthetic risk card; `i` varies file, intent and values so cache keys differ."""
+    file_path = _FILES[i % len(_FILES)]
+    intent = _INTENTS[i % len(_INTENTS)]
+    blocked = "delete" in intent or file_path.startswith("src/")
+    diff = (f"--- a/{file_path}\n+++ b/{file_path}\n@@ -1,2 +1,2 @@\n"
+            f"-pagination: {i % 100}\n+pagination: {(i * 7) % 100 + 1}\n")
+    checks = [["policy", not blocked, "Destructive intent blocked" if blocked else "ok"]]
+    if not blocked:
+        checks.append(["dry_run_tests", True, "tests passed"])
+    return {
+        "status": "blocked" if blocked else "allow",
+        "checks": checks,
+        "diff": diff,
+        "action": {"intent": intent, "file_path": file_path},
+        "request_id": f"bench_{i}",
+    }
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))]
+
+
+def _summary(latencies):
+    return {
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(_percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 1),
+        "max_ms": round(max(latencies) * 1000, 1) if latencies else 0.0,
+    }
+
+
+def run_bench(requests: int, concurrency: int, airia: bool = True) -> dict:
+    """
+    Run synthetic cards through the explanation path (clients must already point at the stub).
+
+    Returns:
+        Summary dictionary with latency percentiles and fallback counts
+    """
+    from app.explain import explain_reason, local_explanation
+    from app.airia_analysis import enhance_diff_analysis
+    from app.diff_analysis import analyze_diff
+    from app.http_client import breaker_states
+
+    def one(i):
+        card = sample_card(i)
+        t0 = time.perf_counter()
+        card["diff_analysis"] = analyze_diff(card["diff"])
+        if airia:
+            enhance_diff_analysis(card["diff_analysis"], card["diff"], card["action"]["file_path"],
+                                  card["action"]["intent"])
+        t1 = time.perf_counter()
+        explanation = explain_reason(card)
+        t2 = time.perf_counter()
+        return t1 - t0, t2 - t1, explanation == local_explanation(card), card["diff_analysis"].get("ai_enhanced")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(requests)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 1) if elapsed else 0,
+        "airia": _summary([r[0] for r in results]) if airia else None,
+        "explain": _summary([r[1] for r in results]),
+        "total": _summary([r[0] + r[1] for r in results]),
+        "local_fallbacks": sum(1 for r in results if r[2]),
+        "airia_enhanced": sum(1 for r in results if r[3]),
+        "breakers": breaker_states(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the explanation path against the local provider stub")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--profile", help="Stub profile JSON (see app/llm_stub.py)")
+    parser.add_argument("--mode", choices=["canned", "replay"], default="canned")
+    parser.add_argument("--record-file", help="Recorded responses for --mode replay")
+    parser.add_argument("--replay-latency", action="store_true")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the explanation cache")
+    parser.add_argument("--batch-size", type=int, help="Enable explanation batching with this size")
+    parser.add_argument("--no-airia", action="store_true", help="Skip the Airia analysis step")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    from app.llm_stub import load_profile, start_stub
+    server = start_stub(0, load_profile(args.profile), args.mode, args.record_file,
+                        replay_latency=args.replay_latency)
+    host, port = server.server_address
+
+    os.environ["OPENROUTER_BASE_URL"] = f"http://{host}:{port}/api/v1"
+    os.environ["AIRIA_BASE_URL"] = f"http://{host}:{port}/airia"
+    os.environ["AEGIS_LLM_STUB"] = "1"
+    # Stub answers must not land in the real explanation cache (history database or
+    # shared store) under the production model key
+    scratch = tempfile.TemporaryDirectory(prefix="aegis-bench-")
+    os.environ["AEGIS_EXPLAIN_CACHE_DB"] = os.path.join(scratch.name, "explain_cache.db")
+    os.environ["AEGIS_SHARED_STATE"] = "memory"
+    if args.no_cache:
+        os.environ["AEGIS_EXPLAIN_CACHE_SIZE"] = "0"
+    if args.batch_size:
+        os.environ["AEGIS_EXPLAIN_BATCH_SIZE"] = str(args.batch_size)
+
+    try:
+        summary = run_bench(args.requests, args.concurrency, not args.no_airia)
+    finally:
+        server.shutdown()
+        scratch.cleanup()
+    summary["stub"] = server.state.counts
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Explanation cache for Aegis.
+
+LLM explanations depend only on the card's status, check results, file,
+intent and a short diff preview - and those combinations repeat constantly
+(e.g. every "Destructive intent blocked" card for the same file). This cache
+keys explanations by a normalized signature of the prompt built from those
+inputs, plus the model name and prompt version, so identical situations are
+answered without an OpenRouter call.
+
+Two tiers:
+- In-memory LRU (per process, microsecond hits)
+- SQLite table in the history database (shared across restarts and workers),
+  or the shared state store when AEGIS_SHARED_STATE=redis so workers on other
+  hosts share it too
+
+Hit/miss counters live in the shared state store, so /metrics reports them
+for all workers.
+
+Configuration (environment variables):
+- AEGIS_EXPLAIN_CACHE_SIZE: in-memory entries (default 1024, 0 disables the cache)
+- AEGIS_EXPLAIN_CACHE_TTL: entry lifetime in seconds (default 86400)
+- AEGIS_EXPLAIN_CACHE_DB: SQLite file for the second tier (default: the history database)
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from app.openrouter import OPENROUTER_MODEL
+from app.shared_state import count, get_shared_state
+
+# Bump when the prompt wording changes so old explanations are not reused
+PROMPT_VERSION = "1"
+
+CACHE_SIZE = int(os.getenv("AEGIS_EXPLAIN_CACHE_SIZE", "1024"))
+CACHE_TTL = float(os.getenv("AEGIS_EXPLAIN_CACHE_TTL", "86400"))
+CACHE_DB = os.getenv("AEGIS_EXPLAIN_CACHE_DB")
+
+# Request-specific noise that must not split otherwise identical situations
+_NOISE = [
+    (re.compile(r"/(?:private/)?(?:var/folders/\S+?|tmp)/tmp\w+"), "<tmp>"),  # sandbox temp dirs
+    (re.compile(r"\b\d+(?:\.\d+)?s\b"), "<t>"),  # pytest durations ("in 0.04s")
+    (re.compile(r"0x[0-9a-f]+"), "<addr>"),  # object addresses in tracebacks
+    (re.compile(r"[ \t]+"), " "),
+]
+
+
+def normalize_signature(text: str) -> str:
+    """Strip request-specific noise from prompt inputs."""
+    for pattern, repl in _NOISE:
+        text = pattern.sub(repl, text)
+    return text.strip()
+
+
+class ExplanationCache:
+    """In-memory LRU backed by a SQLite table, with TTL."""
+
+    def __init__(self, db_path, max_entries: int = CACHE_SIZE, ttl: float = CACHE_TTL,
+                 model: str = OPENROUTER_MODEL, store=None):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.model = model
+        self.store = store  # Shared state store used as the second tier instead of SQLite
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        if store is not None:
+            return
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS explanation_cache (
+                key TEXT PRIMARY KEY,
+                explanation TEXT,
+                created_at REAL
+            )
+        """)
+        conn.commit()
+        conn.close()
+
+    def key_for(self, prompt: str) -> str:
+        """Cache key: model + prompt version + normalized prompt inputs."""
+        raw = f"{self.model}\x00{PROMPT_VERSION}\x00{normalize_signature(prompt)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return a fresh cached explanation, or None."""
+        if self.max_entries <= 0:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry and now - entry[1] < self.ttl:
+                self._lru.move_to_end(key)
+                count("explanation_cache", "hits")
+                return entry[0]
+
+        row = self._load(key)
+        if row and now - row[1] < self.ttl:
+            self._remember(key, row[0], row[1])
+            count("explanation_cache", "hits")
+            return row[0]
+
+        count("explanation_cache", "misses")
+        return None
+
+    def _load(self, key: str):
+        """(explanation, created_at) from the second tier, or None."""
+        if self.store is not None:
+            value = self.store.get(f"explain:{key}")
+            return tuple(value) if value else None
+        conn = sqlite3.connect(self.db_path)
+        row = conn.execute(
+            "SELECT explanation, created_at FROM explanation_cache WHERE key = ?", (key,)
+        ).fetchone()
+        conn.close()
+        return row
+
+    def put(self, key: str, explanation: str):
+        """Store an explanation in both tiers."""
+        if self.max_entries <= 0:
+            return
+        now = time.time()
+        self._remember(key, explanation, now)
+        if self.store is not None:
+            self.store.set(f"explain:{key}", [explanation, now], ttl=self.ttl)
+            return
+        conn = sqlite3.connect(self.db_path)
+        conn.execute(
+            "INSERT OR REPLACE INTO explanation_cache (key, explanation, created_at) VALUES (?, ?, ?)",
+            (key, explanation, now),
+        )
+        # Opportunistically drop expired rows so the table does not grow without bound
+        conn.execute("DELETE FROM explanation_cache WHERE created_at < ?", (now - self.ttl,))
+        conn.commit()
+        conn.close()
+
+    def _remember(self, key: str, explanation: str, created_at: float):
+        with self._lock:
+            self._lru[key] = (explanation, created_at)
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.max_entries:
+                self._lru.popitem(last=False)
+
+    def stats(self) -> dict:
+        counters = get_shared_state().counters("explanation_cache")
+        with self._lock:
+            entries = len(self._lru)
+        return {"entries": entries, "hits": int(counters.get("hits", 0)), "misses": int(counters.get("misses", 0))}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_explanation_cache() -> ExplanationCache:
+    """Process-wide explanation cache stored alongside the history database."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            from app.history import DB_PATH
+            state = get_shared_state()
+            _cache = ExplanationCache(CACHE_DB or DB_PATH, store=state if state.backend == "redis" else None)
+        return _cache
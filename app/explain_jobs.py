@@ -0,0 +1,107 @@
+"""
+Deferred explanation generation for Aegis.
+
+Most callers of /propose_action only look at `allowed` and `risk_score`, yet a
+synchronous OpenRouter explanation can add up to 20s. In deferred mode the risk
+card is returned immediately with the deterministic local explanation, and the
+LLM explanation is generated on a background thread, written back to the
+history row and pushed to subscribers. Callers that need the rich explanation
+fetch /riskcard/{request_id}?wait=<seconds> later.
+
+Configuration (environment variables):
+- AEGIS_EXPLAIN_MODE: default mode, "sync" (default) or "deferred"
+- AEGIS_EXPLAIN_WORKERS: background explanation threads (default 4)
+"""
+import copy
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from app.explain import llm_explanation
+from app.history import update_explanation
+
+EXPLAIN_MODES = ("sync", "deferred")
+DEFAULT_MODE = os.getenv("AEGIS_EXPLAIN_MODE", "sync")
+WORKERS = int(os.getenv("AEGIS_EXPLAIN_WORKERS", "4"))
+
+_executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="aegis-explain")
+_pending: Dict[str, Future] = {}
+_lock = threading.Lock()
+
+
+def resolve_mode(requested: Optional[str]) -> str:
+    """Pick the explanation mode for a request, falling back to AEGIS_EXPLAIN_MODE."""
+    mode = (requested or DEFAULT_MODE).lower()
+    return mode if mode in EXPLAIN_MODES else "sync"
+
+
+def _backfill(risk_card: dict, on_ready: Optional[Callable[[dict], None]]) -> Optional[str]:
+    request_id = risk_card["request_id"]
+    try:
+        explanation = llm_explanation(risk_card)
+        if explanation:
+            # Keep the Airia insights the synchronous path would have appended
+            try:
+                from app.airia_analysis import enhance_explanation_with_airia
+                explanation = enhance_explanation_with_airia(explanation, risk_card.get("diff_analysis", {}))
+            except Exception:
+                pass  # Silently ignore if Airia not available
+        else:
+            # LLM unavailable - the local explanation already on the card is final
+            explanation = risk_card.get("explanation", "")
+
+        update_explanation(request_id, explanation, "final")
+        risk_card["explanation"] = explanation
+        risk_card["explanation_status"] = "final"
+        if on_ready:
+            on_ready(risk_card)
+        return explanation
+    except Exception as e:
+        print(f"Deferred explanation failed for {request_id}: {e}")
+        update_explanation(request_id, risk_card.get("explanation", ""), "final")
+        return None
+    finally:
+        with _lock:
+            _pending.pop(request_id, None)
+
+
+def schedule_explanation(risk_card: dict, on_ready: Optional[Callable[[dict], None]] = None) -> Future:
+    """
+    Generate the LLM explanation for a saved card in the background.
+
+    Args:
+        risk_card: Completed risk card (already saved with its local explanation)
+        on_ready: Called with the updated card once the explanation is written back
+
+    Returns:
+        Future resolving to the new explanation (None on failure)
+    """
+    card = copy.deepcopy(risk_card)
+    with _lock:
+        future = _executor.submit(_backfill, card, on_ready)
+        _pending[card["request_id"]] = future
+    return future
+
+
+def wait_for_explanation(request_id: str, timeout: float) -> bool:
+    """
+    Block until a pending explanation for request_id is written back.
+
+    Returns:
+        True if nothing is pending (anymore), False if the wait timed out
+    """
+    with _lock:
+        future = _pending.get(request_id)
+    if future is None:
+        return True
+    try:
+        future.result(timeout=timeout)
+        return True
+    except Exception:
+        return future.done()
+
+
+def pending_count() -> int:
+    with _lock:
+        return len(_pending)
@@ -6,58 +6,113 @@ Enforces safety rules on proposed actions:
 - Intent validation (blocks destructive operations)
 - Content structure validation (YAML/JSON schema checks)
 
+Every rule is evaluated in a single pass, so a proposal with several problems
+gets all of them back at once instead of one per round trip.
+
 See docs/ARCHITECTURE.md for policy rule examples.
 """
+import json
+from typing import Dict, List, Tuple
+
+import yaml
+
 ALLOWED_PATHS = ["config", "flags"]
 
-def policy_check(action: dict):
+
+def _violation(rule: str, path: str, message: str) -> Dict:
+    """Build a structured policy violation."""
+    return {"rule": rule, "path": path, "message": message}
+
+
+def evaluate_policy(action: dict) -> List[Dict]:
     """
-    Validate a proposed action against policy rules.
-    
+    Evaluate every policy rule against a proposed action.
+
     Args:
         action: Dictionary with keys: file_path, intent, new_contents
-        
+
     Returns:
-        Tuple of (passed: bool, message: str)
-        - (True, "OK") if all checks pass
-        - (False, reason) if any check fails
+        List of violations (empty if the action passes). Each violation is a dict:
+        - rule: str - Stable rule id (e.g. "path_allowlist", "pagination_range")
+        - path: str - Key path inside the document ("" for file-level rules)
+        - message: str - Human-readable reason
     """
+    violations = []
     fp = action.get("file_path","")
     # Only allow editing files under config/ or flags/
     if not any(fp == p or fp.startswith(p + "/") for p in ALLOWED_PATHS):
-        return False, f"File '{fp}' not in allowlist {ALLOWED_PATHS}"
+        violations.append(_violation("path_allowlist", "", f"File '{fp}' not in allowlist {ALLOWED_PATHS}"))
     # Block obviously destructive intents
     if "delete" in action.get("intent","").lower():
-        return False, "Destructive intent blocked"
+        violations.append(_violation("destructive_intent", "", "Destructive intent blocked"))
 
     # Key allowlists with types/ranges (kid-simple)
     if fp == "config/app.yaml":
-        import yaml
-        try:
-            data = yaml.safe_load(action.get("new_contents","")) or {}
-        except Exception as e:
-            return False, f"YAML parse error: {e}"
-        allowed = {"service": str, "pagination": int, "featureX": bool}
-        for k,v in data.items():
-            if k not in allowed: return False, f"Key '{k}' not allowed in app.yaml"
-            if k=="pagination" and not (1 <= int(v) <= 100):
-                return False, "pagination must be 1..100"
-            if k=="service" and not isinstance(v, str):
-                return False, "service must be a string"
-            if k=="featureX" and not isinstance(v, bool):
-                return False, "featureX must be true/false"
+        violations.extend(_check_app_yaml(action.get("new_contents","")))
 
     if fp == "flags/rollout.json":
-        import json
-        try:
-            data = json.loads(action.get("new_contents",""))
-        except Exception as e:
-            return False, f"JSON parse error: {e}"
-        try:
-            pct = int(data["featureX"]["percentage"])
-        except Exception:
-            return False, "flags must have featureX.percentage"
-        if not (0 <= pct <= 50):
-            return False, "percentage must be 0..50 (no instant 100%)"
+        violations.extend(_check_rollout_json(action.get("new_contents","")))
+
+    return violations
+
+
+def _check_app_yaml(contents: str) -> List[Dict]:
+    """Validate config/app.yaml keys, types and ranges."""
+    try:
+        data = yaml.safe_load(contents) or {}
+    except Exception as e:
+        return [_violation("yaml_parse", "", f"YAML parse error: {e}")]
+    if not isinstance(data, dict):
+        return [_violation("yaml_mapping", "", "app.yaml must be a mapping of keys")]
 
+    violations = []
+    allowed = {"service": str, "pagination": int, "featureX": bool}
+    for k,v in data.items():
+        if k not in allowed:
+            violations.append(_violation("key_not_allowed", str(k), f"Key '{k}' not allowed in app.yaml"))
+            continue
+        if k=="pagination":
+            try:
+                in_range = 1 <= int(v) <= 100
+            except (TypeError, ValueError):
+                in_range = False
+            if not in_range:
+                violations.append(_violation("pagination_range", k, "pagination must be 1..100"))
+        if k=="service" and not isinstance(v, str):
+            violations.append(_violation("service_type", k, "service must be a string"))
+        if k=="featureX" and not isinstance(v, bool):
+            violations.append(_violation("featureX_type", k, "featureX must be true/false"))
+    return violations
+
+
+def _check_rollout_json(contents: str) -> List[Dict]:
+    """Validate flags/rollout.json rollout percentage."""
+    try:
+        data = json.loads(contents)
+    except Exception as e:
+        return [_violation("json_parse", "", f"JSON parse error: {e}")]
+    try:
+        pct = int(data["featureX"]["percentage"])
+    except Exception:
+        return [_violation("percentage_missing", "featureX.percentage", "flags must have featureX.percentage")]
+    if not (0 <= pct <= 50):
+        return [_violation("percentage_range", "featureX.percentage", "percentage must be 0..50 (no instant 100%)")]
+    return []
+
+
+def policy_check(action: dict) -> Tuple[bool, str]:
+    """
+    Validate a proposed action against policy rules.
+
+    Args:
+        action: Dictionary with keys: file_path, intent, new_contents
+
+    Returns:
+        Tuple of (passed: bool, message: str)
+        - (True, "OK") if all checks pass
+        - (False, reasons) if any check fails; reasons are joined with "; "
+    """
+    violations = evaluate_policy(action)
+    if violations:
+        return False, "; ".join(v["message"] for v in violations)
     return True, "OK"
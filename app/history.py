@@ -1,9 +1,10 @@
 """History and audit log system for Aegis."""
 import sqlite3
 import json
+import threading
 import time
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import List, Dict, Iterator, Optional, Tuple
 
 # Find project root (where app/ directory is located)
 _PROJECT_ROOT = Path(__file__).parent.parent
@@ -11,9 +12,14 @@ _PROJECT_ROOT = Path(__file__).parent.parent
 DB_PATH = _PROJECT_ROOT / "aegis_history.db"
 
 
+_db_ready = False
+_db_lock = threading.Lock()
+
+
 def init_db():
-    """Initialize the SQLite database."""
-    conn = sqlite3.connect(DB_PATH)
+    """Initialize the SQLite database (create tables, migrate columns, build indexes)."""
+    global _db_ready
+    conn = sqlite3.connect(DB_PATH, timeout=30)
     conn.execute("""
         CREATE TABLE IF NOT EXISTS risk_cards (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -33,8 +39,70 @@ def init_db():
             created_at REAL DEFAULT (julianday('now'))
         )
     """)
+    # Full sandbox output, gzip-compressed (app/sandbox_logs.py); cards keep only the tail
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sandbox_logs (
+            request_id TEXT PRIMARY KEY,
+            log BLOB,
+            status TEXT,
+            lines INTEGER,
+            bytes INTEGER,
+            truncated BOOLEAN DEFAULT 0,
+            created_at REAL
+        )
+    """)
+    _migrate_columns(conn)
     conn.commit()
     conn.close()
+    _db_ready = True
+
+
+def _ensure_db():
+    """Run init_db() once per process, on first use (the app also runs it at startup)."""
+    if not _db_ready:
+        with _db_lock:
+            if not _db_ready:
+                init_db()
+
+
+# Columns added after the original schema; existing databases get them via ALTER TABLE
+_ADDED_COLUMNS = {
+    "policy_violations": "TEXT",
+    "structural_diff": "TEXT",
+    "features": "BLOB",
+    "feature_schema": "TEXT",
+    "explanation_status": "TEXT",
+    "file_path": "TEXT",
+    "sandbox_usage": "TEXT",
+    "test_results": "TEXT",
+}
+
+# Indexes backing the history explorer's filters and ordering
+_INDEXES = {
+    "idx_risk_cards_timestamp": "risk_cards (timestamp)",
+    "idx_risk_cards_status_ts": "risk_cards (status, timestamp)",
+    "idx_risk_cards_score": "risk_cards (risk_score)",
+    "idx_risk_cards_file_path": "risk_cards (file_path)",
+}
+
+
+def _migrate_columns(conn: sqlite3.Connection):
+    """Add any missing columns from _ADDED_COLUMNS to risk_cards."""
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(risk_cards)")}
+    for name, decl in _ADDED_COLUMNS.items():
+        if name not in existing:
+            try:
+                conn.execute(f"ALTER TABLE risk_cards ADD COLUMN {name} {decl}")
+            except sqlite3.OperationalError as e:
+                # Another worker starting at the same time added it first
+                if "duplicate column" not in str(e):
+                    raise
+                continue
+            if name == "file_path":
+                # Backfill from the stored action so old cards are filterable too
+                conn.execute("UPDATE risk_cards SET file_path = json_extract(action, '$.file_path')")
+    for name, target in _INDEXES.items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
 
 
 def save_risk_card(risk_card: dict, request_id: str = None, execution_time: float = None) -> str:
@@ -42,11 +110,25 @@ def save_risk_card(risk_card: dict, request_id: str = None, execution_time: floa
     if request_id is None:
         request_id = f"req_{int(time.time() * 1000)}"
     
+    # Store the risk model feature vector so the card can be rescored later
+    # without re-scanning its diff (see app/rescore.py)
+    features, feature_schema = None, None
+    try:
+        from array import array
+        from app.risk_model import extract_features, feature_names
+        features = array("f", extract_features(risk_card)).tobytes()
+        feature_schema = ",".join(feature_names())
+    except Exception as e:
+        print(f"Feature extraction failed (card saved without features): {e}")
+    
+    _ensure_db()
     conn = sqlite3.connect(DB_PATH)
     conn.execute("""
         INSERT OR REPLACE INTO risk_cards 
-        (request_id, timestamp, status, risk_score, checks, explanation, diff, stdout, action, execution_time)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        (request_id, timestamp, status, risk_score, checks, explanation, diff, stdout, action, execution_time,
+         policy_violations, structural_diff, features, feature_schema, explanation_status, file_path,
+         sandbox_usage, test_results)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
     """, (
         request_id,
         risk_card.get("ts", time.time()),
@@ -57,24 +139,73 @@ def save_risk_card(risk_card: dict, request_id: str = None, execution_time: floa
         risk_card.get("diff", ""),
         risk_card.get("stdout", ""),
         json.dumps(risk_card.get("action", {})),
-        execution_time
+        execution_time,
+        json.dumps(risk_card.get("policy_violations", [])),
+        json.dumps(risk_card.get("structural_diff"), default=str),
+        features,
+        feature_schema,
+        risk_card.get("explanation_status", "final"),
+        (risk_card.get("action") or {}).get("file_path"),
+        json.dumps(risk_card["sandbox_usage"]) if risk_card.get("sandbox_usage") else None,
+        json.dumps(risk_card["test_results"], separators=(",", ":")) if risk_card.get("test_results") else None
     ))
     conn.commit()
     conn.close()
     return request_id
 
 
-def get_history(limit: int = 50) -> List[Dict]:
-    """Get recent risk cards from history."""
-    init_db()
+def _history_filters(status: Optional[str] = None, min_score: Optional[int] = None,
+                     max_score: Optional[int] = None, file_path: Optional[str] = None,
+                     since: Optional[float] = None, until: Optional[float] = None) -> Tuple[str, list]:
+    """
+    Build a WHERE clause for history queries.
+    
+    Args:
+        status: Comma-separated statuses ("allow", "blocked")
+        min_score / max_score: Inclusive risk score bounds
+        file_path: File path or directory prefix (e.g. "config/")
+        since / until: Unix timestamp bounds
+    
+    Returns:
+        (" WHERE ..." or "", params)
+    """
+    clauses, params = [], []
+    if status:
+        statuses = [x for x in status.split(",") if x]
+        clauses.append(f"status IN ({','.join('?' * len(statuses))})")
+        params.extend(statuses)
+    if min_score is not None:
+        clauses.append("risk_score >= ?")
+        params.append(min_score)
+    if max_score is not None:
+        clauses.append("risk_score <= ?")
+        params.append(max_score)
+    if file_path:
+        # A range rather than LIKE '%x%' so idx_risk_cards_file_path is used
+        clauses.append("file_path >= ? AND file_path < ?")
+        params.extend([file_path, file_path + "\U0010ffff"])
+    if since is not None:
+        clauses.append("timestamp >= ?")
+        params.append(since)
+    if until is not None:
+        clauses.append("timestamp <= ?")
+        params.append(until)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def get_history(limit: int = 50, offset: int = 0, **filters) -> List[Dict]:
+    """Get recent risk cards from history (filters: see _history_filters)."""
+    _ensure_db()
+    where, params = _history_filters(**filters)
     conn = sqlite3.connect(DB_PATH)
-    cursor = conn.execute("""
+    cursor = conn.execute(f"""
         SELECT request_id, timestamp, status, risk_score, checks, explanation, 
-               diff, stdout, action, approved, approved_by, approved_at, execution_time
-        FROM risk_cards
+               diff, stdout, action, approved, approved_by, approved_at, execution_time,
+               policy_violations, structural_diff, explanation_status, sandbox_usage, test_results
+        FROM risk_cards{where}
         ORDER BY timestamp DESC
-        LIMIT ?
-    """, (limit,))
+        LIMIT ? OFFSET ?
+    """, params + [limit, offset])
     
     results = []
     for row in cursor.fetchall():
@@ -91,20 +222,158 @@ def get_history(limit: int = 50) -> List[Dict]:
             "approved": bool(row[9]),
             "approved_by": row[10],
             "approved_at": row[11],
-            "execution_time": row[12]
+            "execution_time": row[12],
+            "policy_violations": json.loads(row[13]) if row[13] else [],
+            "structural_diff": json.loads(row[14]) if row[14] else None,
+            "explanation_status": row[15] or "final",
+            "sandbox_usage": json.loads(row[16]) if row[16] else None,
+            "test_results": json.loads(row[17]) if row[17] else None
+        })
+    conn.close()
+    return results
+
+
+def get_history_summary(limit: int = 50, offset: int = 0, **filters) -> List[Dict]:
+    """
+    Get recent risk cards as compact summaries (filters: see _history_filters).
+    
+    Reads only the small columns (no diff, stdout or feature blobs), so a page
+    of the history explorer costs a few KB regardless of card size.
+    """
+    _ensure_db()
+    where, params = _history_filters(**filters)
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.execute(f"""
+        SELECT request_id, timestamp, status, risk_score, checks, approved, explanation_status,
+               file_path, json_extract(action, '$.intent'), execution_time,
+               json_extract(sandbox_usage, '$.cpu_seconds'), json_extract(sandbox_usage, '$.max_rss_mb'),
+               json_extract(test_results, '$.passed'),
+               json_extract(test_results, '$.failed') + json_extract(test_results, '$.error')
+        FROM risk_cards{where}
+        ORDER BY timestamp DESC
+        LIMIT ? OFFSET ?
+    """, params + [limit, offset])
+    
+    results = []
+    for row in cursor.fetchall():
+        checks = json.loads(row[4]) if row[4] else []
+        results.append({
+            "request_id": row[0],
+            "timestamp": row[1],
+            "status": row[2],
+            "risk_score": row[3],
+            "failed_checks": [name for name, ok, _ in checks if not ok],
+            "approved": bool(row[5]),
+            "explanation_status": row[6] or "final",
+            "file_path": row[7],
+            "intent": row[8],
+            "execution_time": row[9],
+            "cpu_seconds": row[10],
+            "max_rss_mb": row[11],
+            "tests_passed": row[12],
+            "tests_failed": row[13]
         })
     conn.close()
     return results
 
 
+def count_history(**filters) -> int:
+    """Number of risk cards matching the filters."""
+    _ensure_db()
+    where, params = _history_filters(**filters)
+    conn = sqlite3.connect(DB_PATH)
+    total = conn.execute(f"SELECT COUNT(*) FROM risk_cards{where}", params).fetchone()[0]
+    conn.close()
+    return total
+
+
+def history_stats(top_files: int = 10, **filters) -> Dict:
+    """
+    Aggregates over the matching risk cards, computed in SQLite.
+    
+    Returns:
+        Dictionary with total, avg_score, by_status, by_level (score buckets
+        of get_risk_level), by_day (UTC date -> status counts), top_files,
+        sandbox (resource usage of the sandbox runs, most expensive first) and
+        failing_tests (tests that failed most often, with their average duration)
+    """
+    _ensure_db()
+    where, params = _history_filters(**filters)
+    conn = sqlite3.connect(DB_PATH)
+    total, avg_score = conn.execute(f"SELECT COUNT(*), AVG(risk_score) FROM risk_cards{where}", params).fetchone()
+    by_status = dict(conn.execute(f"SELECT status, COUNT(*) FROM risk_cards{where} GROUP BY status", params).fetchall())
+    by_level = dict(conn.execute(f"""
+        SELECT CASE WHEN risk_score < 20 THEN 'LOW' WHEN risk_score < 50 THEN 'MEDIUM'
+                    WHEN risk_score < 80 THEN 'HIGH' ELSE 'CRITICAL' END AS level, COUNT(*)
+        FROM risk_cards{where} GROUP BY level
+    """, params).fetchall())
+    by_day = {}
+    for day, status, count in conn.execute(f"""
+        SELECT date(timestamp, 'unixepoch') AS day, status, COUNT(*)
+        FROM risk_cards{where} GROUP BY day, status ORDER BY day
+    """, params):
+        by_day.setdefault(day, {})[status] = count
+    files = conn.execute(f"""
+        SELECT file_path, COUNT(*) AS n, AVG(risk_score) FROM risk_cards{where}
+        GROUP BY file_path ORDER BY n DESC LIMIT ?
+    """, params + [top_files]).fetchall()
+    usage_where = (where + " AND" if where else " WHERE") + " sandbox_usage IS NOT NULL"
+    runs, avg_cpu, max_cpu, avg_rss, max_rss, disk = conn.execute(f"""
+        SELECT COUNT(*), AVG(json_extract(sandbox_usage, '$.cpu_seconds')),
+               MAX(json_extract(sandbox_usage, '$.cpu_seconds')), AVG(json_extract(sandbox_usage, '$.max_rss_mb')),
+               MAX(json_extract(sandbox_usage, '$.max_rss_mb')), SUM(json_extract(sandbox_usage, '$.disk_bytes'))
+        FROM risk_cards{usage_where}
+    """, params).fetchone()
+    limits_hit = dict(conn.execute(f"""
+        SELECT json_extract(sandbox_usage, '$.limit_hit') AS hit, COUNT(*) FROM risk_cards{usage_where}
+        AND json_extract(sandbox_usage, '$.limit_hit') IS NOT NULL GROUP BY hit
+    """, params).fetchall())
+    expensive = conn.execute(f"""
+        SELECT request_id, file_path, json_extract(sandbox_usage, '$.cpu_seconds') AS cpu,
+               json_extract(sandbox_usage, '$.max_rss_mb')
+        FROM risk_cards{usage_where} ORDER BY cpu DESC LIMIT 5
+    """, params).fetchall()
+    results_where = (where + " AND" if where else " WHERE") + " test_results IS NOT NULL"
+    failing_tests = conn.execute(f"""
+        SELECT json_extract(t.value, '$[0]') AS nodeid, COUNT(*) AS n, AVG(json_extract(t.value, '$[2]'))
+        FROM risk_cards, json_each(risk_cards.test_results, '$.tests') AS t{results_where}
+        AND json_extract(t.value, '$[1]') IN ('failed', 'error')
+        GROUP BY nodeid ORDER BY n DESC LIMIT ?
+    """, params + [top_files]).fetchall()
+    conn.close()
+    return {
+        "total": total,
+        "avg_score": round(avg_score, 1) if avg_score is not None else None,
+        "by_status": by_status,
+        "by_level": by_level,
+        "by_day": by_day,
+        "top_files": [{"file_path": f, "count": n, "avg_score": round(a, 1)} for f, n, a in files],
+        "sandbox": {
+            "runs": runs,
+            "avg_cpu_seconds": round(avg_cpu, 3) if avg_cpu is not None else None,
+            "max_cpu_seconds": max_cpu,
+            "avg_max_rss_mb": round(avg_rss, 1) if avg_rss is not None else None,
+            "max_max_rss_mb": max_rss,
+            "total_disk_bytes": disk or 0,
+            "limits_hit": limits_hit,
+            "most_expensive": [{"request_id": r, "file_path": f, "cpu_seconds": c, "max_rss_mb": m}
+                               for r, f, c, m in expensive],
+        },
+        "failing_tests": [{"nodeid": t, "failures": n, "avg_duration": round(d or 0.0, 3)}
+                          for t, n, d in failing_tests],
+    }
+
+
 def get_risk_card(request_id: str) -> Optional[Dict]:
     """Get a specific risk card by request_id."""
-    init_db()
+    _ensure_db()
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.execute("""
-        SELECT request_id, timestamp, status, risk_score, checks, explanation,
-               diff, stdout, action, approved, approved_by, approved_at, execution_time
-        FROM risk_cards
+        SELECT request_id, timestamp, risk_cards.status, risk_score, checks, explanation,
+               diff, stdout, action, approved, approved_by, approved_at, execution_time,
+               policy_violations, structural_diff, explanation_status, sandbox_usage, test_results,
+               l.status, l.lines, l.bytes, l.truncated
+        FROM risk_cards LEFT JOIN sandbox_logs AS l USING (request_id)
         WHERE request_id = ?
     """, (request_id,))
     
@@ -127,13 +396,134 @@ def get_risk_card(request_id: str) -> Optional[Dict]:
         "approved": bool(row[9]),
         "approved_by": row[10],
         "approved_at": row[11],
-        "execution_time": row[12]
+        "execution_time": row[12],
+        "policy_violations": json.loads(row[13]) if row[13] else [],
+        "structural_diff": json.loads(row[14]) if row[14] else None,
+        "explanation_status": row[15] or "final",
+        "sandbox_usage": json.loads(row[16]) if row[16] else None,
+        "test_results": json.loads(row[17]) if row[17] else None,
+        "log": {"status": row[18], "lines": row[19], "bytes": row[20], "truncated": bool(row[21])}
+               if row[18] is not None else None
     }
 
 
+def save_sandbox_log(request_id: str, gzip_log: bytes, status: str, lines: int, size: int, truncated: bool):
+    """Store the gzip-compressed full output of a sandbox run."""
+    _ensure_db()
+    conn = sqlite3.connect(DB_PATH)
+    conn.execute("""
+        INSERT OR REPLACE INTO sandbox_logs (request_id, log, status, lines, bytes, truncated, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, (request_id, gzip_log, status, lines, size, int(truncated), time.time()))
+    conn.commit()
+    conn.close()
+
+
+def get_sandbox_log(request_id: str) -> Optional[Dict]:
+    """Stored sandbox log: {"log": gzip bytes, "status", "lines", "bytes", "truncated"}, or None."""
+    _ensure_db()
+    conn = sqlite3.connect(DB_PATH)
+    row = conn.execute("SELECT log, status, lines, bytes, truncated FROM sandbox_logs WHERE request_id = ?",
+                       (request_id,)).fetchone()
+    conn.close()
+    if not row:
+        return None
+    return {"log": row[0], "status": row[1], "lines": row[2], "bytes": row[3], "truncated": bool(row[4])}
+
+
+def update_explanation(request_id: str, explanation: str, status: str = "final") -> bool:
+    """Write back a (deferred) explanation for a saved risk card."""
+    _ensure_db()
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.execute("""
+        UPDATE risk_cards
+        SET explanation = ?, explanation_status = ?
+        WHERE request_id = ?
+    """, (explanation, status, request_id))
+    conn.commit()
+    success = cursor.rowcount > 0
+    conn.close()
+    return success
+
+
+def iter_feature_chunks(chunk_size: int = 10000) -> Iterator[List[Tuple]]:
+    """
+    Iterate over the whole history table in id order, one chunk at a time.
+    
+    Args:
+        chunk_size: Rows per chunk
+        
+    Yields:
+        Lists of (id, risk_score, features, feature_schema) tuples. features is
+        the packed float32 vector (None for cards saved before features existed).
+    """
+    _ensure_db()
+    conn = sqlite3.connect(DB_PATH)
+    last_id = 0
+    try:
+        while True:
+            rows = conn.execute("""
+                SELECT id, risk_score, features, feature_schema
+                FROM risk_cards
+                WHERE id > ?
+                ORDER BY id
+                LIMIT ?
+            """, (last_id, chunk_size)).fetchall()
+            if not rows:
+                return
+            yield rows
+            last_id = rows[-1][0]
+    finally:
+        conn.close()
+
+
+def get_risk_cards_by_ids(ids: List[int]) -> Dict[int, Dict]:
+    """Load full risk cards for the given row ids (used to backfill missing features)."""
+    if not ids:
+        return {}
+    _ensure_db()
+    conn = sqlite3.connect(DB_PATH)
+    placeholders = ",".join("?" * len(ids))
+    cursor = conn.execute(f"""
+        SELECT id, status, checks, diff, action, policy_violations, structural_diff
+        FROM risk_cards
+        WHERE id IN ({placeholders})
+    """, ids)
+    cards = {}
+    for row in cursor.fetchall():
+        cards[row[0]] = {
+            "status": row[1],
+            "checks": json.loads(row[2]) if row[2] else [],
+            "diff": row[3] or "",
+            "action": json.loads(row[4]) if row[4] else {},
+            "policy_violations": json.loads(row[5]) if row[5] else [],
+            "structural_diff": json.loads(row[6]) if row[6] else None
+        }
+    conn.close()
+    return cards
+
+
+def update_features(rows: List[Tuple[bytes, str, int]]):
+    """Backfill (features, feature_schema, id) rows."""
+    _ensure_db()
+    conn = sqlite3.connect(DB_PATH)
+    conn.executemany("UPDATE risk_cards SET features = ?, feature_schema = ? WHERE id = ?", rows)
+    conn.commit()
+    conn.close()
+
+
+def update_risk_scores(rows: List[Tuple[int, int]]):
+    """Write back (risk_score, id) rows from a rescore run."""
+    _ensure_db()
+    conn = sqlite3.connect(DB_PATH)
+    conn.executemany("UPDATE risk_cards SET risk_score = ? WHERE id = ?", rows)
+    conn.commit()
+    conn.close()
+
+
 def approve_risk_card(request_id: str, approved_by: str = "user") -> bool:
     """Approve a blocked risk card."""
-    init_db()
+    _ensure_db()
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.execute("""
         UPDATE risk_cards
@@ -146,6 +536,3 @@ def approve_risk_card(request_id: str, approved_by: str = "user") -> bool:
     return success
 
 
-# Initialize on import
-init_db()
-
@@ -0,0 +1,227 @@
+"""
+Shared outbound HTTP layer for Aegis.
+
+Every call to an external service (OpenRouter, Airia, webhooks) goes through
+this module instead of the module-level requests.post, which gives us:
+- Keep-alive connection pools (one requests.Session per host)
+- Per-host concurrency limits
+- Connect/read timeouts
+- Retry with jittered exponential backoff on connection errors and 429/5xx
+  (not on read timeouts - the request reached the server, which is just slow)
+- A circuit breaker per service, so a degraded provider fails fast instead of
+  burning the full timeout on every request
+
+Configuration (environment variables):
+- AEGIS_HTTP_POOL_SIZE: connections kept alive per host (default 10)
+- AEGIS_HTTP_HOST_CONCURRENCY: max in-flight requests per host (default 8)
+- AEGIS_BREAKER_FAILURES: consecutive failures before a breaker opens (default 5)
+- AEGIS_BREAKER_RESET: seconds an open breaker waits before a trial call (default 30)
+"""
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+POOL_SIZE = int(os.getenv("AEGIS_HTTP_POOL_SIZE", "10"))
+HOST_CONCURRENCY = int(os.getenv("AEGIS_HTTP_HOST_CONCURRENCY", "8"))
+BREAKER_FAILURES = int(os.getenv("AEGIS_BREAKER_FAILURES", "5"))
+BREAKER_RESET = float(os.getenv("AEGIS_BREAKER_RESET", "30"))
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Raised when a service's circuit breaker is open and the call is skipped."""
+
+
+class HostBusyError(requests.exceptions.RequestException):
+    """Raised when a host's concurrency limit is reached and no slot frees up in time."""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    closed -> open after `failure_threshold` consecutive failures; open ->
+    half-open after `reset_timeout` seconds, letting one trial call through;
+    the trial's outcome closes or re-opens the breaker.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURES, reset_timeout: float = BREAKER_RESET):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.state = "closed"
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Return True if a call may proceed."""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            # Open long enough (or a half-open trial that never reported back): allow one trial
+            if time.time() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self.opened_at = time.time()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.state = "closed"
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = time.time()
+
+    def call(self, fn: Callable, *args, **kwargs):
+        """Run fn through the breaker; exceptions count as failures and are re-raised."""
+        if not self.allow():
+            raise CircuitOpenError(f"circuit '{self.name}' is open")
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {"state": self.state, "failures": self.failures, "opened_at": self.opened_at or None}
+
+
+_lock = threading.Lock()
+_sessions: Dict[str, requests.Session] = {}
+_host_slots: Dict[str, threading.BoundedSemaphore] = {}
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Get (or create) the circuit breaker for a service name."""
+    with _lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
+
+
+def breaker_states() -> Dict[str, Dict]:
+    """Snapshot of every circuit breaker, for /metrics."""
+    with _lock:
+        breakers = list(_breakers.values())
+    return {b.name: b.snapshot() for b in breakers}
+
+
+def _session_for(host: str) -> Tuple[requests.Session, threading.BoundedSemaphore]:
+    """Pooled session and concurrency semaphore for a host."""
+    with _lock:
+        if host not in _sessions:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _sessions[host] = session
+            _host_slots[host] = threading.BoundedSemaphore(HOST_CONCURRENCY)
+        return _sessions[host], _host_slots[host]
+
+
+def _backoff(attempt: int, base: float, cap: float, retry_after: Optional[str] = None) -> float:
+    """Full-jitter exponential backoff, honouring a numeric Retry-After header."""
+    if retry_after:
+        try:
+            return min(cap, float(retry_after))
+        except ValueError:
+            pass
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def request(method: str, url: str, *, service: Optional[str] = None,
+            timeout: Tuple[float, float] = (3.05, 10), retries: int = 2,
+            backoff: float = 0.25, max_backoff: float = 4.0, **kwargs) -> requests.Response:
+    """
+    Make an outbound HTTP request through the shared layer.
+
+    Args:
+        method: HTTP method ("GET", "POST", ...)
+        url: Target URL
+        service: Circuit breaker name (defaults to the URL's host)
+        timeout: (connect, read) timeout in seconds
+        retries: Extra attempts after the first on connection errors / 429 / 5xx
+            (read timeouts are not retried)
+        backoff: Base backoff in seconds (doubles per attempt, full jitter)
+        max_backoff: Cap on a single backoff sleep
+        **kwargs: Passed through to requests (json, headers, data, ...)
+
+    Returns:
+        requests.Response (the last one, if retries were exhausted on status codes)
+
+    Raises:
+        CircuitOpenError: The service's breaker is open
+        HostBusyError: The host's concurrency limit stayed saturated
+        requests.exceptions.RequestException: Connection/timeout errors after retries
+    """
+    host = urlparse(url).netloc
+    breaker = get_breaker(service or host)
+    if not breaker.allow():
+        raise CircuitOpenError(f"circuit '{breaker.name}' is open")
+
+    session, slots = _session_for(host)
+    if not slots.acquire(timeout=timeout[0]):
+        raise HostBusyError(f"too many in-flight requests to {host}")
+    try:
+        attempt = 0
+        while True:
+            try:
+                response = session.request(method, url, timeout=timeout, **kwargs)
+            except requests.exceptions.ReadTimeout:
+                # The server has the request and is slow: a retry would double the wait
+                # (and may repeat a POST); count it and let the breaker handle degradation
+                breaker.record_failure()
+                raise
+            except requests.exceptions.ConnectionError:  # Includes ConnectTimeout
+                if attempt >= retries:
+                    breaker.record_failure()
+                    raise
+                time.sleep(_backoff(attempt, backoff, max_backoff))
+                attempt += 1
+                continue
+
+            if response.status_code in RETRY_STATUSES and attempt < retries:
+                time.sleep(_backoff(attempt, backoff, max_backoff, response.headers.get("Retry-After")))
+                attempt += 1
+                continue
+
+            if response.status_code >= 500 or response.status_code == 429:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            return response
+    finally:
+        slots.release()
+
+
+def worst_case_seconds(timeout: Tuple[float, float] = (3.05, 10), retries: int = 2,
+                       max_backoff: float = 4.0) -> float:
+    """
+    Longest a request() call with these settings can block the caller.
+
+    Covers the wait for a host slot, every attempt running to its connect and
+    read timeouts, and the longest backoff between attempts.
+    """
+    return timeout[0] + (retries + 1) * (timeout[0] + timeout[1]) + retries * max_backoff
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    """POST through the shared layer (see request())."""
+    return request("POST", url, **kwargs)
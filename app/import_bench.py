@@ -0,0 +1,185 @@
+"""
+Import-time benchmark for the Aegis API.
+
+Cold start matters for autoscaled workers and for `uvicorn --reload`, so this
+harness imports a module (app.app by default) in fresh interpreters with
+`python -X importtime`, and reports:
+- wall-clock import time (min / median over --runs)
+- the slowest modules by cumulative and self time
+- any "forbidden" heavy modules that were imported eagerly (e.g. modal,
+  which should only load when a request asks for use_modal)
+
+Results can be saved as a baseline and later runs compared against it, so a
+startup regression fails the run (exit code 1) instead of going unnoticed.
+
+Usage:
+    python -m app.import_bench
+    python -m app.import_bench --runs 10 --save-baseline import_baseline.json
+    python -m app.import_bench --baseline import_baseline.json --max-regression 20
+    python -m app.import_bench --budget-ms 800 --forbid modal,numpy
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+_PROJECT_ROOT = Path(__file__).parent.parent
+
+# Modules that should never be imported just by importing the API
+DEFAULT_FORBIDDEN = ("modal", "numpy", "airia", "streamlit")
+
+
+def _parse_importtime(stderr: str) -> List[Dict]:
+    """Parse `-X importtime` output into [{"module", "self_us", "cumulative_us"}]."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        try:
+            self_us, cumulative_us = int(parts[0]), int(parts[1])
+        except ValueError:
+            continue  # Header line
+        rows.append({"module": parts[2].strip(), "self_us": self_us, "cumulative_us": cumulative_us})
+    return rows
+
+
+def measure_once(module: str) -> Dict:
+    """
+    Import a module in a fresh interpreter.
+
+    Args:
+        module: Dotted module name to import
+
+    Returns:
+        Dictionary with keys:
+        - wall_ms: float - Interpreter start to import finished, as seen by the parent
+        - modules: list - Parsed -X importtime rows
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(_PROJECT_ROOT), env.get("PYTHONPATH")]))
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=_PROJECT_ROOT, env=env, capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - start) * 1000
+    if proc.returncode != 0:
+        tail = "\n".join(proc.stderr.splitlines()[-10:])
+        raise RuntimeError(f"import {module} failed:\n{tail}")
+    return {"wall_ms": wall_ms, "modules": _parse_importtime(proc.stderr)}
+
+
+def run_bench(module: str = "app.app", runs: int = 5, top: int = 15, forbidden=DEFAULT_FORBIDDEN) -> Dict:
+    """
+    Measure import time over several fresh interpreters.
+
+    The first run also warms the bytecode cache and is discarded.
+
+    Returns:
+        Summary dict (wall_ms min/median, import_ms of the target module,
+        slowest modules, forbidden modules that were imported)
+    """
+    measure_once(module)
+    samples = [measure_once(module) for _ in range(max(1, runs))]
+
+    walls = [s["wall_ms"] for s in samples]
+    target = [next((r["cumulative_us"] for r in s["modules"] if r["module"] == module), 0) / 1000 for s in samples]
+
+    # Per-module medians across runs
+    per_module: Dict[str, Dict[str, List[int]]] = {}
+    for s in samples:
+        for row in s["modules"]:
+            entry = per_module.setdefault(row["module"], {"self": [], "cumulative": []})
+            entry["self"].append(row["self_us"])
+            entry["cumulative"].append(row["cumulative_us"])
+    medians = {name: {"self_ms": round(statistics.median(v["self"]) / 1000, 2),
+                      "cumulative_ms": round(statistics.median(v["cumulative"]) / 1000, 2)}
+               for name, v in per_module.items()}
+
+    def slowest(key):
+        ranked = sorted(medians.items(), key=lambda kv: kv[1][key], reverse=True)[:top]
+        return [{"module": name, **values} for name, values in ranked]
+
+    imported_roots = {name.split(".")[0] for name in per_module}
+    return {
+        "module": module,
+        "runs": len(samples),
+        "python": sys.version.split()[0],
+        "wall_ms": {"min": round(min(walls), 1), "median": round(statistics.median(walls), 1)},
+        "import_ms": {"min": round(min(target), 1), "median": round(statistics.median(target), 1)},
+        "modules_imported": len(per_module),
+        "slowest_cumulative": slowest("cumulative_ms"),
+        "slowest_self": slowest("self_ms"),
+        "forbidden_imported": sorted(m for m in forbidden if m in imported_roots),
+    }
+
+
+def check(summary: Dict, baseline: Dict = None, max_regression: float = 20.0, budget_ms: float = None) -> List[str]:
+    """
+    Regression checks for a bench summary.
+
+    Args:
+        summary: run_bench() result
+        baseline: A previously saved summary to compare against
+        max_regression: Allowed median import time increase over the baseline, in percent
+        budget_ms: Absolute ceiling on the median import time
+
+    Returns:
+        List of failure messages (empty if all checks pass)
+    """
+    failures = []
+    median = summary["import_ms"]["median"]
+    if summary["forbidden_imported"]:
+        failures.append(f"heavy modules imported eagerly: {', '.join(summary['forbidden_imported'])}")
+    if budget_ms is not None and median > budget_ms:
+        failures.append(f"median import time {median}ms exceeds budget {budget_ms}ms")
+    if baseline:
+        base = baseline["import_ms"]["median"]
+        if base and (median - base) / base * 100 > max_regression:
+            failures.append(f"median import time {median}ms is more than {max_regression}% over baseline {base}ms")
+        new_modules = summary["modules_imported"] - baseline.get("modules_imported", 0)
+        if new_modules > 0:
+            print(f"Note: {new_modules} more modules imported than in the baseline")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how long importing the Aegis API takes")
+    parser.add_argument("--module", default="app.app")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="Slowest modules to report")
+    parser.add_argument("--forbid", default=",".join(DEFAULT_FORBIDDEN),
+                        help="Comma-separated top-level modules that must not be imported eagerly")
+    parser.add_argument("--baseline", help="Summary JSON from a previous --save-baseline run")
+    parser.add_argument("--max-regression", type=float, default=20.0, help="Allowed slowdown vs baseline (percent)")
+    parser.add_argument("--budget-ms", type=float, help="Fail if the median import time exceeds this")
+    parser.add_argument("--save-baseline", help="Write this run's summary to a file")
+    args = parser.parse_args()
+
+    forbidden = tuple(m.strip() for m in args.forbid.split(",") if m.strip())
+    summary = run_bench(args.module, args.runs, args.top, forbidden)
+    print(json.dumps(summary, indent=2))
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(summary, f, indent=2)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    failures = check(summary, baseline, args.max_regression, args.budget_ms)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+"""
+Local stand-in for the external AI providers (OpenRouter and Airia).
+
+Serves an OpenAI/OpenRouter-compatible chat completions endpoint and an Airia
+pipeline endpoint with configurable latency distributions, error and timeout
+rates and canned responses, so the explanation and AI-analysis paths can be
+benchmarked and load-tested offline. Point Aegis at it with:
+
+    OPENROUTER_BASE_URL=http://127.0.0.1:8787/api/v1
+    AIRIA_BASE_URL=http://127.0.0.1:8787/airia
+    AEGIS_LLM_STUB=1            # accept a placeholder key when no key file exists
+                                # (only while the base URLs above are local)
+
+Modes:
+- canned (default): answer from the profile's canned responses
+- record: proxy to the real provider and append every response to a JSONL file
+- replay: answer from a recorded JSONL file (canned response on a miss)
+
+Usage:
+    python -m app.llm_stub --port 8787 --profile slow.json
+    python -m app.llm_stub --mode record --record-file calls.jsonl
+    python -m app.llm_stub --mode replay --record-file calls.jsonl
+
+Profile (JSON, every key optional), per service ("openrouter" / "airia"):
+    {"openrouter": {"latency": "lognormal:-1.5,0.6", "error_rate": 0.05,
+                    "timeout_rate": 0.01, "error_statuses": [500, 503, 429],
+                    "responses": ["..."]},
+     "airia": {"latency": "uniform:0.2,0.8", "output": {"risks": [], ...}}}
+
+Latency specs: "fixed:S", "uniform:A,B", "normal:MEAN,SD", "lognormal:MU,SIGMA" (seconds).
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional
+
+import requests
+
+DEFAULT_UPSTREAMS = {
+    "openrouter": "https://openrouter.ai/api/v1",
+    "airia": "https://api.airia.ai",
+}
+
+DEFAULT_PROFILE = {
+    "openrouter": {
+        "latency": "fixed:0",
+        "error_rate": 0.0,
+        "timeout_rate": 0.0,
+        "error_statuses": [500, 502, 503, 429],
+        "responses": [
+            "This action was assessed by the stub provider. The policy check result and sandbox tests determine the status; review the failed checks above for specifics.",
+        ],
+    },
+    "airia": {
+        "latency": "fixed:0",
+        "error_rate": 0.0,
+        "timeout_rate": 0.0,
+        "error_statuses": [500, 503],
+        "output": {
+            "risks": [],
+            "confidence": 0.5,
+            "recommendations": ["Review the change before applying it"],
+            "summary": "Stub analysis: no additional risks detected",
+        },
+    },
+}
+
+# How long a "timeout" response hangs - longer than any client read timeout
+HANG_SECONDS = 60
+
+_BATCH_ITEM = re.compile(r"^### ITEM \d+", re.MULTILINE)
+
+
+def parse_latency(spec: str) -> Callable[[], float]:
+    """
+    Turn a latency spec into a sampler returning seconds.
+
+    Raises:
+        ValueError: Unknown distribution or bad parameters
+    """
+    kind, _, params = spec.partition(":")
+    args = [float(p) for p in params.split(",") if p.strip()]
+    if kind == "fixed":
+        return lambda: args[0] if args else 0.0
+    if kind == "uniform":
+        return lambda: random.uniform(args[0], args[1])
+    if kind == "normal":
+        return lambda: max(0.0, random.gauss(args[0], args[1]))
+    if kind == "lognormal":
+        return lambda: random.lognormvariate(args[0], args[1])
+    raise ValueError(f"unknown latency distribution: {spec}")
+
+
+def load_profile(path: Optional[str] = None) -> Dict[str, Dict]:
+    """Default profile merged with a JSON profile file (per-service keys override)."""
+    profile = {service: dict(cfg) for service, cfg in DEFAULT_PROFILE.items()}
+    if path:
+        with open(path) as f:
+            for service, cfg in json.load(f).items():
+                profile.setdefault(service, {}).update(cfg)
+    for cfg in profile.values():
+        cfg["_sample_latency"] = parse_latency(cfg.get("latency", "fixed:0"))
+    return profile
+
+
+def request_key(service: str, path: str, body: dict) -> str:
+    """Replay key: service, endpoint and the request fields that determine the answer."""
+    if service == "openrouter":
+        significant = {"model": body.get("model"), "messages": body.get("messages")}
+    else:
+        significant = body
+    raw = json.dumps([service, path, significant], sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class Recording:
+    """Append-only JSONL store of provider responses, keyed by request_key()."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        try:
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries[entry["key"]] = entry
+        except FileNotFoundError:
+            pass
+
+    def get(self, key: str) -> Optional[Dict]:
+        return self.entries.get(key)
+
+    def add(self, key: str, service: str, status: int, body: dict, latency: float):
+        entry = {"key": key, "service": service, "status": status, "body": body, "latency": round(latency, 4)}
+        with self._lock:
+            self.entries[key] = entry
+            with open(self.path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+
+
+class StubState:
+    """Configuration and counters shared by the request handlers."""
+
+    def __init__(self, profile: Dict[str, Dict], mode: str = "canned", recording: Optional[Recording] = None,
+                 upstreams: Optional[Dict[str, str]] = None, replay_latency: bool = False):
+        self.profile = profile
+        self.mode = mode
+        self.recording = recording
+        self.upstreams = dict(DEFAULT_UPSTREAMS, **(upstreams or {}))
+        self.replay_latency = replay_latency
+        self.counts = {"requests": 0, "errors": 0, "timeouts": 0, "replayed": 0, "recorded": 0, "canned": 0}
+        self._lock = threading.Lock()
+
+    def count(self, name: str):
+        with self._lock:
+            self.counts[name] += 1
+
+
+def canned_chat(cfg: Dict, body: dict) -> dict:
+    """OpenAI-style completion; batched multi-item prompts get a JSON array answer."""
+    prompt = "".join(m.get("content", "") for m in body.get("messages", []) if isinstance(m, dict))
+    responses = cfg.get("responses") or DEFAULT_PROFILE["openrouter"]["responses"]
+    items = len(_BATCH_ITEM.findall(prompt))
+    if items:
+        content = json.dumps([random.choice(responses) for _ in range(items)])
+    else:
+        content = random.choice(responses)
+    return {
+        "id": f"stub-{random.getrandbits(48):012x}",
+        "object": "chat.completion",
+        "model": body.get("model", "stub"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4},
+    }
+
+
+def _route(path: str):
+    """Map a request path to (service, upstream path) or (None, None)."""
+    if path.endswith("/chat/completions"):
+        return "openrouter", "/chat/completions"
+    if path.startswith("/airia/"):
+        return "airia", path[len("/airia"):]
+    return None, None
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    server_version = "AegisLLMStub/1.0"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass  # Keep benchmark output clean
+
+    def _send(self, status: int, payload: dict, headers: Optional[Dict[str, str]] = None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/stats":
+            self._send(200, self.server.state.counts)
+        else:
+            self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        state: StubState = self.server.state
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send(400, {"error": "invalid JSON"})
+            return
+
+        service, upstream_path = _route(self.path)
+        if service is None:
+            self._send(404, {"error": f"unknown endpoint {self.path}"})
+            return
+        state.count("requests")
+        cfg = state.profile.get(service, {})
+        key = request_key(service, upstream_path, body)
+
+        if state.mode == "record":
+            self._record(state, service, upstream_path, key, body)
+            return
+
+        if state.mode == "replay" and state.recording:
+            entry = state.recording.get(key)
+            if entry:
+                state.count("replayed")
+                time.sleep(entry["latency"] if state.replay_latency else cfg["_sample_latency"]())
+                self._send(entry["status"], entry["body"])
+                return
+
+        # Simulated provider behaviour
+        roll = random.random()
+        if roll < cfg.get("timeout_rate", 0):
+            state.count("timeouts")
+            time.sleep(HANG_SECONDS)
+            self._send(504, {"error": "stub timeout"})
+            return
+        time.sleep(cfg["_sample_latency"]())
+        if roll < cfg.get("timeout_rate", 0) + cfg.get("error_rate", 0):
+            state.count("errors")
+            status = random.choice(cfg.get("error_statuses") or [500])
+            self._send(status, {"error": {"message": "stub error", "code": status}},
+                       {"Retry-After": "1"} if status == 429 else None)
+            return
+
+        state.count("canned")
+        if service == "openrouter":
+            self._send(200, canned_chat(cfg, body))
+        else:
+            self._send(200, {"output": cfg.get("output", DEFAULT_PROFILE["airia"]["output"])})
+
+    def _record(self, state: StubState, service: str, upstream_path: str, key: str, body: dict):
+        headers = {name: self.headers[name] for name in ("Authorization", "X-API-KEY", "HTTP-Referer", "X-Title")
+                   if self.headers.get(name)}
+        start = time.time()
+        try:
+            response = requests.post(state.upstreams[service] + upstream_path, json=body, headers=headers,
+                                     timeout=(3.05, 60))
+            payload = response.json()
+            status = response.status_code
+        except Exception as e:
+            self._send(502, {"error": f"upstream error: {e}"})
+            return
+        if state.recording:
+            state.recording.add(key, service, status, payload, time.time() - start)
+            state.count("recorded")
+        self._send(status, payload)
+
+
+def start_stub(port: int = 0, profile: Optional[Dict[str, Dict]] = None, mode: str = "canned",
+               record_file: Optional[str] = None, upstreams: Optional[Dict[str, str]] = None,
+               replay_latency: bool = False, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """
+    Start the stub server on a background thread.
+
+    Args:
+        port: Port to listen on (0 picks a free port; see server.server_address)
+        profile: Profile dict from load_profile() (defaults to the built-in profile)
+        mode: "canned", "record" or "replay"
+        record_file: JSONL file for record/replay
+        upstreams: Real provider base URLs for record mode
+        replay_latency: Replay the recorded latency instead of the profile's distribution
+        host: Interface to bind
+
+    Returns:
+        The running server (call shutdown() to stop it)
+    """
+    recording = Recording(record_file) if record_file else None
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    server.state = StubState(profile or load_profile(), mode, recording, upstreams, replay_latency)
+    threading.Thread(target=server.serve_forever, name="aegis-llm-stub", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OpenRouter/Airia stand-in for Aegis")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--profile", help="JSON profile with latency/error/response settings")
+    parser.add_argument("--mode", choices=["canned", "record", "replay"], default="canned")
+    parser.add_argument("--record-file", help="JSONL file for record/replay")
+    parser.add_argument("--replay-latency", action="store_true", help="Replay recorded latencies")
+    parser.add_argument("--openrouter-upstream", default=DEFAULT_UPSTREAMS["openrouter"])
+    parser.add_argument("--airia-upstream", default=DEFAULT_UPSTREAMS["airia"])
+    args = parser.parse_args()
+
+    if args.mode != "canned" and not args.record_file:
+        parser.error("--record-file is required for record/replay")
+
+    server = start_stub(args.port, load_profile(args.profile), args.mode, args.record_file,
+                        {"openrouter": args.openrouter_upstream, "airia": args.airia_upstream},
+                        args.replay_latency, args.host)
+    host, port = server.server_address
+    print(f"LLM stub ({args.mode}) listening on http://{host}:{port}")
+    print(f"  OPENROUTER_BASE_URL=http://{host}:{port}/api/v1")
+    print(f"  AIRIA_BASE_URL=http://{host}:{port}/airia")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,70 +1,77 @@
-"""Performance metrics tracking for Aegis."""
+"""
+Performance metrics tracking for Aegis.
+
+Request samples are kept in the shared state store (app/shared_state.py), so
+with several uvicorn workers and a shared backend every worker reports the
+same aggregate /metrics. With the default memory backend they are per-process.
+"""
+import os
 import time
-from typing import Dict, List
+from typing import Dict
 from collections import defaultdict
 
-_metrics = {
-    "requests": [],
-    "execution_times": [],
-    "errors": []
-}
+from app.shared_state import get_shared_state
+
+MAX_REQUESTS = 1000
+MAX_ERRORS = 100
 
 
 def record_request(endpoint: str, execution_time: float, success: bool, error: str = None):
     """
     Record a request metric for performance tracking.
-    
+
     Args:
         endpoint: API endpoint path (e.g., "/propose_action")
         execution_time: Request duration in seconds
         success: True if request succeeded
         error: Optional error message if failed
-        
+
     Side effects:
-        Updates in-memory metrics dictionary (keeps last 1000 entries)
+        Appends to the shared metrics lists (keeps last 1000 requests, 100 errors)
     """
-    _metrics["requests"].append({
-        "endpoint": endpoint,
-        "timestamp": time.time(),
-        "execution_time": execution_time,
-        "success": success
-    })
-    _metrics["execution_times"].append(execution_time)
-    
-    if error:
-        _metrics["errors"].append({
+    try:
+        state = get_shared_state()
+        state.append("metrics:requests", {
             "endpoint": endpoint,
             "timestamp": time.time(),
-            "error": error
-        })
-    
-    # Keep only last 1000 entries
-    if len(_metrics["requests"]) > 1000:
-        _metrics["requests"] = _metrics["requests"][-1000:]
-    if len(_metrics["execution_times"]) > 1000:
-        _metrics["execution_times"] = _metrics["execution_times"][-1000:]
-    if len(_metrics["errors"]) > 100:
-        _metrics["errors"] = _metrics["errors"][-100:]
+            "execution_time": execution_time,
+            "success": success,
+            "pid": os.getpid()
+        }, MAX_REQUESTS)
+
+        if error:
+            state.append("metrics:errors", {
+                "endpoint": endpoint,
+                "timestamp": time.time(),
+                "error": error
+            }, MAX_ERRORS)
+    except Exception as e:
+        print(f"Metrics update failed: {e}")
 
 
 def get_metrics() -> Dict:
-    """Get aggregated metrics."""
-    if not _metrics["execution_times"]:
+    """Get aggregated metrics (across workers when the shared state backend is shared)."""
+    state = get_shared_state()
+    requests = state.items("metrics:requests")
+    errors = state.items("metrics:errors")
+    if not requests:
         return {
             "total_requests": 0,
             "avg_execution_time": 0,
             "total_errors": 0,
-            "endpoints": {}
+            "endpoints": {},
+            "workers": 0,
+            "shared_state": state.backend
         }
-    
+
     endpoint_stats = defaultdict(lambda: {"count": 0, "total_time": 0, "errors": 0})
-    
-    for req in _metrics["requests"]:
+
+    for req in requests:
         endpoint_stats[req["endpoint"]]["count"] += 1
         endpoint_stats[req["endpoint"]]["total_time"] += req["execution_time"]
         if not req["success"]:
             endpoint_stats[req["endpoint"]]["errors"] += 1
-    
+
     endpoints = {}
     for endpoint, stats in endpoint_stats.items():
         endpoints[endpoint] = {
@@ -72,11 +79,12 @@ def get_metrics() -> Dict:
             "avg_time": stats["total_time"] / stats["count"] if stats["count"] > 0 else 0,
             "errors": stats["errors"]
         }
-    
+
     return {
-        "total_requests": len(_metrics["requests"]),
-        "avg_execution_time": sum(_metrics["execution_times"]) / len(_metrics["execution_times"]),
-        "total_errors": len(_metrics["errors"]),
-        "endpoints": endpoints
+        "total_requests": len(requests),
+        "avg_execution_time": sum(req["execution_time"] for req in requests) / len(requests),
+        "total_errors": len(errors),
+        "endpoints": endpoints,
+        "workers": len({req.get("pid") for req in requests}),
+        "shared_state": state.backend
     }
-
@@ -3,7 +3,8 @@ Modal cloud sandbox execution for Aegis.
 
 Runs sandbox execution in Modal's cloud infrastructure. Clones the specified
 repository, applies changes, runs pytest, and returns results. This allows
-testing against real repositories without local setup.
+testing against real repositories without local setup. dry_run_repo_stream
+yields the pytest output line by line while the tests run.
 
 Requires:
 - Modal package installed
@@ -13,13 +14,35 @@ Requires:
 
 See docs/WALKTHROUGH.md for Modal setup instructions.
 """
-import modal, subprocess, tempfile, os, shutil, difflib
+import modal, subprocess, tempfile, os, shutil, difflib, queue, threading
 
 image = modal.Image.debian_slim().pip_install("pytest","pyyaml","gitpython")
+# Ship the app package so the sandbox can compute the structural diff remotely
+if hasattr(image, "add_local_python_source"):
+    image = image.add_local_python_source("app")
 app = modal.App("aegis")
 
+# Output lines buffered between the test run and the streaming generator;
+# when the caller reads too slowly, further lines are dropped, never the run slowed
+STREAM_BUFFER_LINES = 1000
+
+
+class _QueueLog:
+    """Minimal live log (see app/sandbox_logs.py) that hands lines to dry_run_repo_stream."""
+    cancelled = False
+
+    def __init__(self, lines):
+        self.lines = lines
+
+    def write(self, source, line):
+        try:
+            self.lines.put_nowait({"source": source, "line": line})
+        except queue.Full:
+            pass
+
+
 @app.function(image=image, timeout=180)
-def dry_run_repo(repo_url: str, file_path: str, new_contents: str):
+def dry_run_repo(repo_url: str, file_path: str, new_contents: str, test_mode: str = "fail_fast"):
     """
     Execute a dry run in Modal cloud sandbox.
     
@@ -27,6 +50,7 @@ def dry_run_repo(repo_url: str, file_path: str, new_contents: str):
         repo_url: Git repository URL to clone
         file_path: Path to file being modified
         new_contents: Proposed new file contents
+        test_mode: "fail_fast" (stop at the first failure) or "full"
         
     Returns:
         Dictionary with keys:
@@ -34,10 +58,49 @@ def dry_run_repo(repo_url: str, file_path: str, new_contents: str):
         - diff: str - Unified diff of changes
         - stdout: str - Last 400 chars of pytest stdout
         - stderr: str - Last 400 chars of pytest stderr
+        - structural_diff: dict | None - Keyed diff for YAML/JSON files
+        - usage: dict | None - Resource usage of the test run (see app/sandbox_limits.py)
+        - test_mode: str - Test mode the suite ran in
+        - test_results: dict | None - Per-test results (see app/test_runner.compact_results)
         
     Side effects:
         Clones repository and runs tests in Modal cloud
     """
+    return _dry_run(repo_url, file_path, new_contents, test_mode)
+
+
+@app.function(image=image, timeout=180)
+def dry_run_repo_stream(repo_url: str, file_path: str, new_contents: str, test_mode: str = "fail_fast"):
+    """
+    dry_run_repo that streams pytest output while the tests run (call with .remote_gen()).
+    
+    Yields:
+        {"source": "stdout" | "stderr", "line": str} for each output line, then
+        {"result": dict} with the same result as dry_run_repo
+    """
+    lines = queue.Queue(maxsize=STREAM_BUFFER_LINES)
+    done = object()
+    result = {}
+
+    def run():
+        try:
+            result["value"] = _dry_run(repo_url, file_path, new_contents, test_mode, _QueueLog(lines))
+        except Exception as e:
+            result["value"] = {"ok": False, "diff": "", "stdout": "", "stderr": f"Modal dry run failed: {e}"}
+        finally:
+            lines.put(done)
+
+    threading.Thread(target=run, daemon=True).start()
+    while True:
+        item = lines.get()
+        if item is done:
+            break
+        yield item
+    yield {"result": result["value"]}
+
+
+def _dry_run(repo_url: str, file_path: str, new_contents: str, test_mode: str, log=None):
+    """Clone, apply and test (see dry_run_repo); `log` receives output lines as they are printed."""
     work = tempfile.mkdtemp()
     try:
         subprocess.run(["git","clone","--depth","1",repo_url,work], check=True, capture_output=True)
@@ -49,15 +112,34 @@ def dry_run_repo(repo_url: str, file_path: str, new_contents: str):
             with open(target,"r") as f: old = f.read()
         with open(target,"w") as f: f.write(new_contents)
 
-        test = subprocess.run(["pytest","-q"], cwd=work, capture_output=True, text=True, timeout=60)
+        usage, test_results = None, None
+        try:
+            # Same limits, accounting and parallel workers as the local sandbox
+            # (app/ is shipped with the image); no baseline is kept for remote repos
+            from app.test_runner import compact_results, run_suite
+            limited = run_suite(work, test_mode=test_mode, limits={"wall_seconds": 60}, log=log)
+            test_results = compact_results(limited["report"])
+            if limited["limit_hit"] == "wall":
+                return {"ok": False, "diff": "", "stdout": "", "stderr": "Modal tests timed out",
+                        "usage": limited["usage"], "test_mode": test_mode, "test_results": test_results}
+            ok = (limited["returncode"] == 0)
+            stdout, stderr, usage = limited["stdout"], limited["stderr"], limited["usage"]
+        except ImportError:
+            test = subprocess.run(["pytest","-q"] + (["-x"] if test_mode == "fail_fast" else []), cwd=work, capture_output=True, text=True, timeout=60)
+            ok = (test.returncode == 0)
+            stdout = test.stdout[-400:] if test.stdout else ""
+            stderr = test.stderr[-400:] if test.stderr else ""
         diff = "\n".join(difflib.unified_diff(
             old.splitlines(), new_contents.splitlines(),
             fromfile=file_path, tofile=file_path
         ))
-        ok = (test.returncode == 0)
-        stdout = test.stdout[-400:] if test.stdout else ""
-        stderr = test.stderr[-400:] if test.stderr else ""
-        return {"ok": ok, "diff": diff, "stdout": stdout, "stderr": stderr}
+        try:
+            from app.structural_diff import structural_diff
+            sdiff = structural_diff(file_path, old, new_contents)
+        except ImportError:
+            sdiff = None
+        return {"ok": ok, "diff": diff, "stdout": stdout, "stderr": stderr, "structural_diff": sdiff,
+                "usage": usage, "test_mode": test_mode, "test_results": test_results}
     except subprocess.TimeoutExpired:
         return {"ok": False, "diff": "", "stdout": "", "stderr": "Modal tests timed out"}
     finally:
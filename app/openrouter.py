@@ -4,19 +4,36 @@ OpenRouter API client for Aegis.
 Calls OpenRouter API to get AI-powered explanations using Claude 3.5 Sonnet.
 Handles errors gracefully - returns empty string on any failure.
 
+Requests go through the shared pooled client (app/http_client.py); when the
+"openrouter" circuit breaker is open the call returns "" immediately so the
+caller falls back to the local explanation without waiting on the timeout.
+
 Requires:
 - OpenRouter API key in OPENROUTER_API_KEY.txt
 """
+import os
 import requests
+from app import http_client
+
+# Point at an OpenAI-compatible stand-in (e.g. app/llm_stub.py) for offline benchmarks
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1").rstrip("/")
+OPENROUTER_URL = f"{OPENROUTER_BASE_URL}/chat/completions"
+OPENROUTER_MODEL = os.getenv("AEGIS_OPENROUTER_MODEL", "anthropic/claude-3.5-sonnet")
 
+# (connect, read) timeout and extra attempts on connection errors / 429 / 5xx
+OPENROUTER_TIMEOUT = (3.05, 20)
+OPENROUTER_RETRIES = 1
+# Longest call_openrouter() can take before it gives up
+OPENROUTER_DEADLINE = http_client.worst_case_seconds(OPENROUTER_TIMEOUT, OPENROUTER_RETRIES)
 
-def call_openrouter(prompt: str, api_key: str) -> str:
+
+def call_openrouter(prompt: str, api_key: str, max_tokens: int = 500) -> str:
     """
     Call OpenRouter API with the given prompt.
     Returns empty string on any error.
     """
     try:
-        url = "https://openrouter.ai/api/v1/chat/completions"
+        url = OPENROUTER_URL
         headers = {
             "Authorization": f"Bearer {api_key.strip()}",
             "Content-Type": "application/json",
@@ -24,14 +41,15 @@ def call_openrouter(prompt: str, api_key: str) -> str:
             "X-Title": "Nova Aegis"
         }
         payload = {
-            "model": "anthropic/claude-3.5-sonnet",
+            "model": OPENROUTER_MODEL,
             "messages": [
                 {"role": "user", "content": prompt}
             ],
             "temperature": 0.3,  # Lower temperature for more consistent, factual explanations
-            "max_tokens": 500  # Allow longer explanations
+            "max_tokens": max_tokens  # Allow longer explanations (batched prompts need more)
         }
-        response = requests.post(url, json=payload, headers=headers, timeout=20)
+        response = http_client.post(url, json=payload, headers=headers, service="openrouter",
+                                    timeout=OPENROUTER_TIMEOUT, retries=OPENROUTER_RETRIES)
         response.raise_for_status()
         result = response.json()
         # Extract the content from the response
@@ -40,6 +58,9 @@ def call_openrouter(prompt: str, api_key: str) -> str:
             if content:
                 return content
         return ""
+    except http_client.CircuitOpenError:
+        # Provider is degraded - skip straight to the local fallback
+        return ""
     except requests.exceptions.RequestException as e:
         # Log specific error for debugging
         print(f"OpenRouter API error: {type(e).__name__}: {str(e)[:200]}")
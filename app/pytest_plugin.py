@@ -0,0 +1,120 @@
+"""
+pytest plugin used inside Aegis sandboxes.
+
+Loaded with `pytest -p app.pytest_plugin` (the project root on PYTHONPATH) and
+driven by environment variables so the sandbox command line stays simple:
+
+- AEGIS_TEST_REPORT: write per-test results here as JSON
+  ({"tests": {nodeid: {"outcome", "duration"}}, "exitstatus", "stopped_early",
+  "memory_error": whether a test raised MemoryError, i.e. hit the address space limit})
+- AEGIS_TEST_ORDER: JSON file {nodeid: rank}; tests run in ascending rank,
+  unranked tests last in their collected order
+- AEGIS_KNOWN_FAILURES: JSON file [nodeid, ...] of tests already failing on
+  the baseline
+- AEGIS_FAIL_FAST=1: stop at the first failure that is not a known failure
+  (unlike -x, pre-existing failures do not end the run)
+- AEGIS_TEST_SHARD: JSON file {"index", "count", "assign": {nodeid: shard}};
+  only this shard's tests run (unassigned tests are spread by a hash of
+  their node id)
+- AEGIS_STOP_FILE: created at a new failure with fail-fast; the other shards
+  of the run stop once it exists
+
+Only the standard library is used, so the plugin works in any sandbox that
+has pytest.
+"""
+import json
+import os
+import time
+import zlib
+
+_results = {}
+_state = {"session": None, "known_failures": set(), "fail_fast": False, "stopped_early": False,
+          "memory_error": False}
+
+
+def _load_json(env_var: str, default):
+    path = os.environ.get(env_var)
+    if not path:
+        return default
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def pytest_sessionstart(session):
+    _state["session"] = session
+    _state["known_failures"] = set(_load_json("AEGIS_KNOWN_FAILURES", []))
+    _state["fail_fast"] = os.environ.get("AEGIS_FAIL_FAST") == "1"
+    _state["started"] = time.time()
+
+
+def pytest_collection_modifyitems(session, config, items):
+    order = _load_json("AEGIS_TEST_ORDER", {})
+    if order:
+        unranked = len(order)
+        # sort() is stable, so unranked tests keep their collected order
+        items.sort(key=lambda item: order.get(item.nodeid, unranked))
+    shard = _load_json("AEGIS_TEST_SHARD", None)
+    if shard:
+        keep, drop = [], []
+        for item in items:
+            index = shard["assign"].get(item.nodeid)
+            if index is None:
+                index = zlib.crc32(item.nodeid.encode("utf-8")) % shard["count"]
+            (keep if index == shard["index"] else drop).append(item)
+        if drop:
+            config.hook.pytest_deselected(items=drop)
+            items[:] = keep
+
+
+def pytest_runtest_logreport(report):
+    entry = _results.setdefault(report.nodeid, {"outcome": "passed", "duration": 0.0})
+    entry["duration"] = round(entry["duration"] + report.duration, 4)
+    if report.failed:
+        # A failing setup/teardown is an error, a failing call is a failure
+        entry["outcome"] = "failed" if report.when == "call" else "error"
+        if report.longrepr is not None:
+            crash = getattr(report.longrepr, "reprcrash", None)
+            entry["message"] = (crash.message if crash is not None else str(report.longrepr))[-500:]
+        session = _state["session"]
+        if _state["fail_fast"] and session is not None and report.nodeid not in _state["known_failures"]:
+            session.shouldfail = f"New failure in {report.nodeid} (AEGIS_FAIL_FAST)"
+            _state["stopped_early"] = True
+            stop_file = os.environ.get("AEGIS_STOP_FILE")
+            if stop_file:
+                open(stop_file, "a").close()
+    elif report.skipped and entry["outcome"] == "passed":
+        entry["outcome"] = "skipped"
+    if report.when == "teardown" and not _state["stopped_early"]:
+        stop_file = os.environ.get("AEGIS_STOP_FILE")
+        if stop_file and os.path.exists(stop_file) and _state["session"] is not None:
+            _state["session"].shouldfail = "New failure in another shard (AEGIS_FAIL_FAST)"
+            _state["stopped_early"] = True
+
+
+def pytest_exception_interact(node, call, report):
+    if call.excinfo is not None and call.excinfo.errisinstance(MemoryError):
+        _state["memory_error"] = True
+
+
+def pytest_collectreport(report):
+    if report.failed:
+        _results[report.nodeid or "<collection>"] = {
+            "outcome": "error", "duration": 0.0, "message": str(report.longrepr)[-500:]}
+
+
+def pytest_sessionfinish(session, exitstatus):
+    path = os.environ.get("AEGIS_TEST_REPORT")
+    if not path:
+        return
+    report = {
+        "tests": _results,
+        "exitstatus": int(exitstatus),
+        "stopped_early": _state["stopped_early"],
+        "memory_error": _state["memory_error"],
+        "duration": round(time.time() - _state.get("started", time.time()), 3),
+    }
+    with open(path, "w") as f:
+        json.dump(report, f)
@@ -0,0 +1,220 @@
+"""
+Recent risk cards store for Aegis.
+
+Holds the most recently completed risk cards behind /riskcard. A request
+builds its card privately and publishes it only once it is complete, so
+readers never see a half-built card; later changes (e.g. a backfilled
+explanation) replace the stored card instead of mutating it in place.
+
+Backends:
+- memory: per-process ring buffer
+- sqlite: `recent_cards` table in the history database, so every uvicorn
+  worker sees the same "latest" card
+- shared: the shared state store (app/shared_state.py), which also covers
+  workers on several hosts with the redis backend
+
+Configuration (environment variables):
+- AEGIS_RECENT_BACKEND: "memory", "sqlite" or "shared" (default shared when
+  AEGIS_SHARED_STATE is not memory, else memory)
+- AEGIS_RECENT_SIZE: cards kept (default 50)
+- AEGIS_RECENT_TTL: lifetime of cards in the shared backend, in seconds (default 86400)
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from app.shared_state import SHARED_BACKEND, get_shared_state
+
+RECENT_BACKEND = os.getenv("AEGIS_RECENT_BACKEND") or ("shared" if SHARED_BACKEND != "memory" else "memory")
+RECENT_SIZE = int(os.getenv("AEGIS_RECENT_SIZE", "50"))
+RECENT_TTL = float(os.getenv("AEGIS_RECENT_TTL", "86400"))
+
+
+class MemoryRecentCards:
+    """Per-process ring buffer of completed cards, newest last."""
+
+    def __init__(self, size: int = RECENT_SIZE):
+        self.size = size
+        self._cards: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def publish(self, card: Dict):
+        """Store a completed card as the newest entry."""
+        snapshot = dict(card)
+        with self._lock:
+            self._cards.pop(snapshot["request_id"], None)
+            self._cards[snapshot["request_id"]] = snapshot
+            while len(self._cards) > self.size:
+                self._cards.popitem(last=False)
+
+    def update(self, request_id: str, **fields) -> Optional[Dict]:
+        """Replace a stored card with a copy carrying `fields` (position unchanged)."""
+        with self._lock:
+            card = self._cards.get(request_id)
+            if card is None:
+                return None
+            card = {**card, **fields}
+            self._cards[request_id] = card
+            return card
+
+    def latest(self) -> Optional[Dict]:
+        with self._lock:
+            if not self._cards:
+                return None
+            return next(reversed(self._cards.values()))
+
+    def get(self, request_id: str) -> Optional[Dict]:
+        with self._lock:
+            return self._cards.get(request_id)
+
+    def recent(self, limit: int = 10) -> List[Dict]:
+        """Newest first."""
+        with self._lock:
+            return list(reversed(self._cards.values()))[:limit]
+
+
+class SqliteRecentCards:
+    """Recent cards in the history database, shared by all worker processes."""
+
+    def __init__(self, db_path, size: int = RECENT_SIZE):
+        self.db_path = db_path
+        self.size = size
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS recent_cards (
+                request_id TEXT PRIMARY KEY,
+                card TEXT,
+                published_at REAL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_recent_published ON recent_cards (published_at)")
+        conn.commit()
+        conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    def publish(self, card: Dict):
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO recent_cards (request_id, card, published_at) VALUES (?, ?, ?)",
+            (card["request_id"], json.dumps(card, default=str), time.time()),
+        )
+        conn.execute(
+            "DELETE FROM recent_cards WHERE request_id NOT IN "
+            "(SELECT request_id FROM recent_cards ORDER BY published_at DESC LIMIT ?)",
+            (self.size,),
+        )
+        conn.commit()
+        conn.close()
+
+    def update(self, request_id: str, **fields) -> Optional[Dict]:
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT card FROM recent_cards WHERE request_id = ?", (request_id,)).fetchone()
+            if row is None:
+                conn.rollback()
+                return None
+            card = {**json.loads(row[0]), **fields}
+            conn.execute("UPDATE recent_cards SET card = ? WHERE request_id = ?",
+                         (json.dumps(card, default=str), request_id))
+            conn.commit()
+            return card
+        finally:
+            conn.close()
+
+    def latest(self) -> Optional[Dict]:
+        conn = self._connect()
+        row = conn.execute("SELECT card FROM recent_cards ORDER BY published_at DESC LIMIT 1").fetchone()
+        conn.close()
+        return json.loads(row[0]) if row else None
+
+    def get(self, request_id: str) -> Optional[Dict]:
+        conn = self._connect()
+        row = conn.execute("SELECT card FROM recent_cards WHERE request_id = ?", (request_id,)).fetchone()
+        conn.close()
+        return json.loads(row[0]) if row else None
+
+    def recent(self, limit: int = 10) -> List[Dict]:
+        conn = self._connect()
+        rows = conn.execute("SELECT card FROM recent_cards ORDER BY published_at DESC LIMIT ?", (limit,)).fetchall()
+        conn.close()
+        return [json.loads(row[0]) for row in rows]
+
+
+class SharedRecentCards:
+    """
+    Recent cards in the shared state store.
+
+    Each card is a hash (one field per card key), so update() writes only the
+    changed fields and concurrent updates from different workers never
+    overwrite each other. Publish order is a capped list of request ids.
+    """
+
+    def __init__(self, state, size: int = RECENT_SIZE, ttl: float = RECENT_TTL):
+        self.state = state
+        self.size = size
+        self.ttl = ttl
+
+    def publish(self, card: Dict):
+        request_id = card["request_id"]
+        self.state.delete(f"recent:{request_id}")
+        self.state.hset(f"recent:{request_id}", card, ttl=self.ttl)
+        # Extra room for ids published more than once
+        self.state.append("recent:ids", request_id, self.size * 2)
+
+    def update(self, request_id: str, **fields) -> Optional[Dict]:
+        key = f"recent:{request_id}"
+        if not self.state.exists(key):
+            return None
+        self.state.hset(key, fields)
+        return self.state.hgetall(key) or None
+
+    def latest(self) -> Optional[Dict]:
+        cards = self.recent(1)
+        return cards[0] if cards else None
+
+    def get(self, request_id: str) -> Optional[Dict]:
+        return self.state.hgetall(f"recent:{request_id}") or None
+
+    def recent(self, limit: int = 10) -> List[Dict]:
+        """Newest first."""
+        cards, seen = [], set()
+        for request_id in reversed(self.state.items("recent:ids")):
+            if request_id in seen:
+                continue
+            seen.add(request_id)
+            if len(seen) > self.size:
+                break
+            card = self.get(request_id)
+            if card:
+                cards.append(card)
+                if len(cards) >= limit:
+                    break
+        return cards
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_recent_cards():
+    """Process-wide recent cards store for the configured backend."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            if RECENT_BACKEND == "sqlite":
+                from app.history import DB_PATH
+                _store = SqliteRecentCards(DB_PATH)
+            elif RECENT_BACKEND == "shared":
+                _store = SharedRecentCards(get_shared_state())
+            else:
+                if RECENT_BACKEND != "memory":
+                    print(f"Unknown AEGIS_RECENT_BACKEND '{RECENT_BACKEND}', using memory")
+                _store = MemoryRecentCards()
+        return _store
@@ -0,0 +1,215 @@
+"""
+HTML rendering of risk cards.
+
+The page layout and CSS are compiled once into string.Template objects at
+import, and rendered pages are cached per request_id together with an ETag
+derived from the parts of the card that can change (explanation backfill,
+approval, rescoring). Reviewers reopening the same card from a chat link get
+a cache hit - or a 304 from their browser - instead of a full re-render and
+re-escape of the diff.
+
+Large diffs are truncated to AEGIS_HTML_DIFF_LINES lines inside a collapsible
+block; the full diff stays available from /riskcard/{request_id}.
+
+Configuration (environment variables):
+- AEGIS_HTML_CACHE_SIZE: rendered pages kept in memory (default 256)
+- AEGIS_HTML_DIFF_LINES: diff lines rendered before truncating (default 400)
+"""
+import hashlib
+import html as html_module
+import json
+import os
+import threading
+from collections import OrderedDict
+from email.utils import formatdate
+from itertools import islice
+from string import Template
+from typing import Dict, Optional, Tuple
+
+from app.risk_scoring import get_risk_level
+from app.shared_state import count, get_shared_state
+
+HTML_CACHE_SIZE = int(os.getenv("AEGIS_HTML_CACHE_SIZE", "256"))
+HTML_DIFF_LINES = int(os.getenv("AEGIS_HTML_DIFF_LINES", "400"))
+
+# Bump when the templates change so cached pages and browser ETags are invalidated
+TEMPLATE_VERSION = "1"
+
+_CSS = """
+        body { font-family: Arial, sans-serif; margin: 20px; background: #1a1a1a; color: #e0e0e0; }
+        .badge { display: inline-block; padding: 8px 16px; border-radius: 4px; color: white; font-weight: bold; margin: 10px 0; }
+        .status-allow { background: green; }
+        .status-blocked { background: red; }
+        .pill { color: white; padding: 2px 8px; border-radius: 3px; font-size: 12px; }
+        .pass { background: green; }
+        .fail { background: red; }
+        table { border-collapse: collapse; width: 100%; margin: 20px 0; background: #2a2a2a; }
+        th, td { border: 1px solid #444; padding: 8px; text-align: left; }
+        th { background-color: #333; color: #fff; }
+        pre { background: #2a2a2a; padding: 10px; border-radius: 4px; overflow-x: auto; color: #e0e0e0; border: 1px solid #444; }
+        summary { cursor: pointer; margin: 10px 0; }
+        .explanation { margin: 20px 0; padding: 10px; background: #2a2a2a; border-left: 4px solid #4CAF50; border-radius: 4px; }
+        .meta { color: #aaa; font-size: 13px; }
+        h1, h2, h3 { color: #fff; }
+"""
+
+_PAGE = Template("""<!DOCTYPE html>
+<html>
+<head>
+    <title>Aegis Risk Card $title_suffix</title>
+    <style>$css</style>
+</head>
+<body>
+    <h1>🛡️ Aegis Risk Card</h1>
+    <div class="meta">$meta</div>
+    <div class="badge status-$status_class">$status_text</div>
+    <div class="badge" style="background: $risk_color;">Risk Score: $risk_score/100 ($risk_level)</div>
+    $approval
+    <h2>Checks</h2>
+    <table>
+        <tr><th>Check</th><th>Status</th><th>Message</th></tr>
+        $checks_rows
+    </table>
+    $explanation
+    $diff
+</body>
+</html>""")
+
+_CHECK_ROW = Template('<tr><td>$name</td><td><span class="pill $cls">$label</span></td><td>$msg</td></tr>')
+_EXPLANATION = Template('<div class="explanation"><h3>Explanation$pending</h3><p>$text</p></div>')
+_DIFF = Template('<h2>Unified Diff</h2><pre>$diff</pre>')
+_DIFF_TRUNCATED = Template("""<h2>Unified Diff</h2>
+    <details open><summary>Showing first $shown of $total lines ($hidden more truncated - full diff in the JSON risk card)</summary>
+    <pre>$diff</pre></details>""")
+
+EMPTY_PAGE = "<html><body><p>No actions yet</p></body></html>"
+
+
+def card_etag(card: Dict) -> str:
+    """Strong ETag over the card fields shown on the page."""
+    parts = [
+        TEMPLATE_VERSION,
+        str(card.get("request_id")),
+        str(card.get("status")),
+        str(card.get("risk_score")),
+        str(card.get("explanation_status", "final")),
+        str(card.get("approved", False)),
+        str(card.get("approved_by") or ""),
+        card.get("explanation") or "",
+        str(len(card.get("diff") or "")),
+        # Tuples in the recent cards store, lists from the history database: same card, same tag
+        json.dumps([list(check) for check in card.get("checks") or []], default=str),
+    ]
+    return '"' + hashlib.sha1("\x00".join(parts).encode("utf-8")).hexdigest() + '"'
+
+
+def last_modified(card: Dict) -> Optional[str]:
+    """HTTP date of the card's last change (creation or approval)."""
+    ts = max(card.get("approved_at") or 0, card.get("timestamp") or card.get("ts") or 0)
+    return formatdate(ts, usegmt=True) if ts else None
+
+
+def _render_diff(diff: str, max_lines: int) -> str:
+    if not diff:
+        return ""
+    total = diff.count("\n") + (0 if diff.endswith("\n") else 1)
+    if total <= max_lines:
+        return _DIFF.substitute(diff=html_module.escape(diff))
+    shown = "\n".join(islice(diff.splitlines(), max_lines))
+    return _DIFF_TRUNCATED.substitute(diff=html_module.escape(shown), shown=max_lines, total=total,
+                                      hidden=total - max_lines)
+
+
+def render_risk_card(card: Dict, max_diff_lines: int = HTML_DIFF_LINES) -> str:
+    """Render a risk card as a standalone HTML page."""
+    status = card.get("status", "unknown")
+    risk_score = card.get("risk_score", 0)
+    risk_level, risk_color = get_risk_level(risk_score)
+    esc = html_module.escape
+
+    checks_rows = "".join(
+        _CHECK_ROW.substitute(name=esc(str(name)), cls="pass" if ok else "fail",
+                              label="PASS" if ok else "FAIL", msg=esc(str(msg)))
+        for name, ok, msg in card.get("checks", [])
+    )
+
+    explanation = card.get("explanation", "")
+    explanation_html = _EXPLANATION.substitute(
+        text=esc(explanation),
+        pending=" (AI explanation pending)" if card.get("explanation_status") == "pending" else "",
+    ) if explanation else ""
+
+    action = card.get("action") or {}
+    meta = " · ".join(esc(str(x)) for x in (card.get("request_id"), action.get("file_path"), action.get("intent")) if x)
+    approval = f'<div class="meta">Approved by {esc(str(card.get("approved_by") or "user"))}</div>' if card.get("approved") else ""
+
+    return _PAGE.substitute(
+        title_suffix=esc(str(card.get("request_id") or "")),
+        css=_CSS,
+        meta=meta,
+        status_class="allow" if status == "allow" else "blocked",
+        status_text="ALLOW" if status == "allow" else "BLOCKED",
+        risk_color=risk_color,
+        risk_score=risk_score,
+        risk_level=risk_level,
+        approval=approval,
+        checks_rows=checks_rows,
+        explanation=explanation_html,
+        diff=_render_diff(card.get("diff", ""), max_diff_lines),
+    )
+
+
+class RenderCache:
+    """LRU of rendered pages: request_id -> (etag, html)."""
+
+    def __init__(self, max_entries: int = HTML_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._pages: "OrderedDict[str, Tuple[str, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def render(self, card: Dict, etag: Optional[str] = None) -> Tuple[str, str]:
+        """
+        Rendered page for a card, from cache when the card has not changed.
+
+        Args:
+            card: Risk card dictionary
+            etag: card_etag(card), if the caller already computed it
+
+        Returns:
+            (etag, html)
+        """
+        etag = etag or card_etag(card)
+        key = card.get("request_id")
+        with self._lock:
+            cached = self._pages.get(key)
+            if cached and cached[0] == etag:
+                self._pages.move_to_end(key)
+            else:
+                cached = None
+        if cached:
+            count("html_cache", "hits")
+            return cached
+        count("html_cache", "misses")
+
+        page = (etag, render_risk_card(card))
+        if key and self.max_entries > 0:
+            with self._lock:
+                self._pages[key] = page
+                self._pages.move_to_end(key)
+                while len(self._pages) > self.max_entries:
+                    self._pages.popitem(last=False)
+        return page
+
+    def stats(self) -> Dict:
+        """Entries in this process; hits/misses across all workers (see app/shared_state.py)."""
+        counters = get_shared_state().counters("html_cache")
+        with self._lock:
+            entries = len(self._pages)
+        return {"entries": entries, "hits": int(counters.get("hits", 0)), "misses": int(counters.get("misses", 0))}
+
+
+_render_cache = RenderCache()
+
+
+def get_render_cache() -> RenderCache:
+    return _render_cache
@@ -0,0 +1,141 @@
+"""
+Batch rescoring of risk card history.
+
+Recomputes risk scores for every card in the history table with a (possibly
+new) weight config, in fixed-size chunks, using the feature vectors stored at
+save time and NumPy for the scoring. Cards saved before features existed are
+re-extracted from their stored checks/diff once and backfilled.
+
+Usage:
+    python -m app.rescore --weights new_weights.json            # dry run, report only
+    python -m app.rescore --weights new_weights.json --write    # persist new scores
+
+The report shows how many cards change score and risk level, so weight
+changes can be evaluated against the full history before rollout.
+"""
+import argparse
+import json
+import time
+from array import array
+from collections import Counter
+from typing import Dict
+
+import numpy as np
+
+from app.history import (get_risk_cards_by_ids, iter_feature_chunks,
+                         update_features, update_risk_scores)
+from app.risk_model import extract_features, feature_names, load_weights, score_batch
+
+# Score thresholds of get_risk_level(), for vectorized level bucketing
+_LEVEL_EDGES = np.array([20, 50, 80])
+_LEVELS = ["LOW", "MEDIUM", "HIGH", "CRITICAL"]
+
+
+def _column_map(schema: str, names) -> tuple:
+    """Map columns of a stored feature schema onto the current feature order."""
+    index = {name: i for i, name in enumerate(names)}
+    src, dst = [], []
+    for i, name in enumerate(schema.split(",")):
+        if name in index:
+            src.append(i)
+            dst.append(index[name])
+    return len(schema.split(",")), np.array(src, dtype=np.intp), np.array(dst, dtype=np.intp)
+
+
+def rescore_history(weights: Dict[str, float] = None, chunk_size: int = 10000,
+                    write: bool = False, backfill: bool = True) -> Dict:
+    """
+    Rescore the whole history table.
+
+    Args:
+        weights: Weights dict (defaults to the configured weights)
+        chunk_size: Rows loaded and scored per chunk
+        write: Persist new scores for cards whose score changed
+        backfill: Store freshly extracted features for cards that had none
+
+    Returns:
+        Summary dictionary with counts, mean scores and level transitions
+    """
+    weights = weights if weights is not None else load_weights()
+    names = feature_names()
+    schema_maps = {}
+    start = time.time()
+
+    total = changed = backfilled = 0
+    old_sum = new_sum = 0
+    transitions = Counter()
+
+    for rows in iter_feature_chunks(chunk_size):
+        n = len(rows)
+        x = np.zeros((n, len(names)), dtype=np.float32)
+
+        # Cards without stored features: extract once from the stored card
+        missing = [r[0] for r in rows if r[2] is None]
+        extracted = {}
+        if missing:
+            for row_id, card in get_risk_cards_by_ids(missing).items():
+                extracted[row_id] = extract_features(card)
+            if backfill and extracted:
+                schema = ",".join(names)
+                update_features([(array("f", vec).tobytes(), schema, row_id) for row_id, vec in extracted.items()])
+                backfilled += len(extracted)
+
+        # Group stored vectors by schema and copy them into the current column order
+        by_schema = {}
+        for i, (row_id, _, blob, schema) in enumerate(rows):
+            if blob is None:
+                if row_id in extracted:
+                    x[i] = extracted[row_id]
+                continue
+            by_schema.setdefault(schema, []).append(i)
+        for schema, idx in by_schema.items():
+            if schema not in schema_maps:
+                schema_maps[schema] = _column_map(schema, names)
+            width, src, dst = schema_maps[schema]
+            stored = np.frombuffer(b"".join(rows[i][2] for i in idx), dtype=np.float32).reshape(len(idx), width)
+            x[np.ix_(np.array(idx), dst)] = stored[:, src]
+
+        new_scores = score_batch(x, weights)
+        old_scores = np.array([r[1] or 0 for r in rows], dtype=np.int16)
+        diff_mask = new_scores != old_scores
+
+        old_levels = np.searchsorted(_LEVEL_EDGES, old_scores, side="right")
+        new_levels = np.searchsorted(_LEVEL_EDGES, new_scores, side="right")
+        moved = old_levels != new_levels
+        for o, nl in zip(old_levels[moved], new_levels[moved]):
+            transitions[f"{_LEVELS[o]}->{_LEVELS[nl]}"] += 1
+
+        total += n
+        changed += int(diff_mask.sum())
+        old_sum += int(old_scores.sum())
+        new_sum += int(new_scores.sum())
+
+        if write and diff_mask.any():
+            update_risk_scores([(int(new_scores[i]), rows[i][0]) for i in np.flatnonzero(diff_mask)])
+
+    return {
+        "cards": total,
+        "changed": changed,
+        "backfilled_features": backfilled,
+        "mean_old_score": old_sum / total if total else 0,
+        "mean_new_score": new_sum / total if total else 0,
+        "level_transitions": dict(transitions),
+        "written": write,
+        "seconds": round(time.time() - start, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rescore Aegis risk card history with a weight config")
+    parser.add_argument("--weights", help="JSON file of {feature: weight} (default: AEGIS_RISK_WEIGHTS or built-in)")
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument("--write", action="store_true", help="Persist new scores")
+    parser.add_argument("--no-backfill", action="store_true", help="Do not store extracted features for old cards")
+    args = parser.parse_args()
+
+    summary = rescore_history(load_weights(args.weights), args.chunk_size, args.write, not args.no_backfill)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Lean JSON responses for Aegis.
+
+- Projections of the /propose_action payload (view=full|card|summary, fields=)
+- Large `new_contents` replaced by a digest in the stored/echoed action
+- Fast JSON serialization (orjson when installed) that skips FastAPI's
+  jsonable_encoder pass for big payloads
+- Response compression middleware (brotli when brotli-asgi is installed, gzip otherwise)
+
+Configuration (environment variables):
+- AEGIS_ACTION_INLINE_BYTES: new_contents larger than this is stored as a digest (default 4096)
+- AEGIS_COMPRESS_MIN_BYTES: smallest response body that gets compressed (default 1024)
+"""
+import hashlib
+import json
+import os
+from typing import Dict, Optional
+
+from fastapi import HTTPException
+from fastapi.responses import Response
+
+from app.events import summarize
+
+ACTION_INLINE_BYTES = int(os.getenv("AEGIS_ACTION_INLINE_BYTES", "4096"))
+COMPRESS_MIN_BYTES = int(os.getenv("AEGIS_COMPRESS_MIN_BYTES", "1024"))
+
+VIEWS = ("full", "card", "summary")
+
+# dry_run keys that duplicate fields already on the risk card
+_DRY_RUN_DUPLICATES = ("diff", "stdout", "structural_diff", "test_results", "baseline")
+
+def _json_dumps(obj) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+try:
+    import orjson
+
+    def dumps(obj) -> bytes:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            # orjson.JSONEncodeError (a TypeError): ints wider than 64 bits from user
+            # YAML/JSON, unsupported types - the stdlib encoder handles both
+            return _json_dumps(obj)
+except ImportError:
+    dumps = _json_dumps
+
+
+def json_response(payload, status_code: int = 200) -> Response:
+    """Serialize a plain dict/list payload directly (no jsonable_encoder pass)."""
+    return Response(content=dumps(payload), status_code=status_code, media_type="application/json")
+
+
+def card_action(action: Dict) -> Dict:
+    """Action as stored on the card; large new_contents becomes a sha256 digest and size."""
+    contents = action.get("new_contents")
+    if contents is None:
+        return action
+    size = len(contents.encode("utf-8"))
+    if size <= ACTION_INLINE_BYTES:
+        return action
+    lean = {k: v for k, v in action.items() if k != "new_contents"}
+    lean["new_contents_sha256"] = hashlib.sha256(contents.encode("utf-8")).hexdigest()
+    lean["new_contents_bytes"] = size
+    return lean
+
+
+def project_card(card: Dict, fields: Optional[str]) -> Dict:
+    """Keep only the requested top-level card fields (request_id is always kept)."""
+    if not fields:
+        return card
+    keep = {f.strip() for f in fields.split(",") if f.strip()}
+    keep.add("request_id")
+    return {k: v for k, v in card.items() if k in keep}
+
+
+def propose_payload(allowed: bool, card: Dict, request_id: str, dry_run: Optional[Dict] = None,
+                    view: str = "full", fields: Optional[str] = None) -> Dict:
+    """
+    Build the /propose_action response for a view.
+
+    Args:
+        allowed: Whether the action was allowed
+        card: Completed risk card
+        request_id: Request id
+        dry_run: Raw sandbox result (None for policy-blocked actions)
+        view: "full" (card + full dry_run), "card" (dry_run without fields
+              duplicated on the card) or "summary" (compact card summary)
+        fields: Comma-separated risk card fields to keep (full/card views)
+
+    Raises:
+        HTTPException: Unknown view
+    """
+    if view not in VIEWS:
+        raise HTTPException(status_code=400, detail=f"view must be one of {', '.join(VIEWS)}")
+
+    if view == "summary":
+        summary = summarize(card)
+        summary["explanation"] = card.get("explanation", "")
+        return {"allowed": allowed, "risk_card": summary, "request_id": request_id}
+
+    payload = {"allowed": allowed, "risk_card": project_card(card, fields), "request_id": request_id}
+    if dry_run is not None:
+        if view == "card":
+            dry_run = {k: v for k, v in dry_run.items() if k not in _DRY_RUN_DUPLICATES}
+        payload["dry_run"] = dry_run
+    return payload
+
+
+def add_compression(app):
+    """Compress large responses: brotli (with gzip fallback) if brotli-asgi is installed, else gzip."""
+    try:
+        from brotli_asgi import BrotliMiddleware
+        app.add_middleware(BrotliMiddleware, minimum_size=COMPRESS_MIN_BYTES, gzip_fallback=True)
+        return "br"
+    except ImportError:
+        from starlette.middleware.gzip import GZipMiddleware
+        app.add_middleware(GZipMiddleware, minimum_size=COMPRESS_MIN_BYTES, compresslevel=6)
+        return "gzip"
@@ -0,0 +1,193 @@
+"""
+Feature-based risk model for Aegis.
+
+Turns a risk card into a fixed feature vector (check failures, pattern hits,
+secret findings, change size, file class, AI signals) and scores it as a
+weighted sum clipped to 0-100. Weights live in a config (JSON file pointed to
+by AEGIS_RISK_WEIGHTS) instead of code, and the same vectors are stored in
+history so past cards can be rescored in bulk with NumPy (see app/rescore.py).
+
+The default weights reproduce the hand-tuned additive scoring in
+app/risk_scoring.py.
+"""
+import json
+import os
+from functools import lru_cache
+from typing import Dict, List, Sequence
+
+from app.diff_scanner import get_scanner, scan_diff
+from app.risk_scoring import SECRET_SCORE_CAP, key_rule_penalty
+
+# Fixed features; pattern features ("pattern:<rule id>") are appended per scanner rule
+BASE_FEATURES = [
+    "bias",
+    "status_blocked",
+    "status_allow",
+    "failed_checks",
+    "policy_failed",
+    "tests_failed",
+    "policy_violations",
+    "lines_added",
+    "lines_removed",
+    "large_deletion",
+    "secret_signatures",
+    "secret_entropy",
+    "secret_penalty",
+    "key_rule_penalty",
+    "file_config",
+    "file_flags",
+    "file_other",
+    "ai_risks",
+    "ai_confidence",
+    "ai_adjustment",
+]
+
+DEFAULT_WEIGHTS = {
+    "status_blocked": 50,
+    "status_allow": 10,
+    "failed_checks": 15,
+    "policy_failed": 20,
+    "tests_failed": 25,
+    "large_deletion": 1,
+    "secret_penalty": 1,
+    "key_rule_penalty": 1,
+    "ai_adjustment": 1,
+}
+
+
+@lru_cache(maxsize=1)
+def feature_names() -> List[str]:
+    """Ordered feature names for the configured scanner rule set."""
+    return BASE_FEATURES + [f"pattern:{rule_id}" for rule_id in get_scanner().rules]
+
+
+def default_weights() -> Dict[str, float]:
+    """Default weights, including the scanner's per-rule pattern weights."""
+    weights = dict(DEFAULT_WEIGHTS)
+    scanner = get_scanner()
+    for rule_id in scanner.rules:
+        weights[f"pattern:{rule_id}"] = scanner.weight(rule_id)
+    return weights
+
+
+def load_weights(path: str = None) -> Dict[str, float]:
+    """
+    Load model weights.
+
+    Args:
+        path: JSON file of {feature_name: weight}; defaults to AEGIS_RISK_WEIGHTS.
+              Features missing from the file keep their default weight.
+
+    Returns:
+        Dictionary of weights by feature name
+    """
+    weights = default_weights()
+    path = path or os.getenv("AEGIS_RISK_WEIGHTS")
+    if path and os.path.exists(path):
+        try:
+            with open(path) as f:
+                weights.update(json.load(f))
+        except Exception as e:
+            print(f"Invalid risk weights file (using defaults): {e}")
+    return weights
+
+
+def weight_vector(weights: Dict[str, float], names: Sequence[str] = None) -> List[float]:
+    """Order a weights dict to match feature_names()."""
+    names = names or feature_names()
+    return [float(weights.get(name, 0)) for name in names]
+
+
+def _file_class(file_path: str) -> str:
+    if file_path.startswith("config/"):
+        return "file_config"
+    if file_path.startswith("flags/"):
+        return "file_flags"
+    return "file_other"
+
+
+def extract_features(risk_card: dict) -> List[float]:
+    """
+    Turn a risk card into a feature vector ordered like feature_names().
+
+    Args:
+        risk_card: Risk card dictionary (checks, status, diff, diff_analysis, ...)
+
+    Returns:
+        List of floats
+    """
+    checks = risk_card.get("checks", [])
+    status = risk_card.get("status", "unknown")
+    diff = risk_card.get("diff", "")
+    diff_analysis = risk_card.get("diff_analysis") or {}
+
+    f = dict.fromkeys(feature_names(), 0.0)
+    f["bias"] = 1.0
+    f["status_blocked"] = float(status == "blocked")
+    f["status_allow"] = float(status == "allow")
+    f["failed_checks"] = float(sum(1 for _, ok, _ in checks if not ok))
+    f["policy_failed"] = float(any(name == "policy" and not ok for name, ok, _ in checks))
+    f["tests_failed"] = float(any(name == "dry_run_tests" and not ok for name, ok, _ in checks))
+    f["policy_violations"] = float(len(risk_card.get("policy_violations") or []))
+
+    if diff:
+        scan = diff_analysis if "hit_counts" in diff_analysis else scan_diff(diff)
+        f["lines_added"] = float(scan["lines_added"])
+        f["lines_removed"] = float(scan["lines_removed"])
+        if scan["lines_removed"] > 10:
+            f["large_deletion"] = float(min(15, scan["lines_removed"] // 5))
+        for rule_id in scan["hit_counts"]:
+            key = f"pattern:{rule_id}"
+            if key in f:
+                f[key] = 1.0
+        findings = scan.get("secret_findings", scan.get("secrets", []))
+        f["secret_signatures"] = float(sum(1 for x in findings if x["kind"] == "signature"))
+        f["secret_entropy"] = float(sum(1 for x in findings if x["kind"] == "entropy"))
+        f["secret_penalty"] = float(min(SECRET_SCORE_CAP, scan.get("secret_weight", 0)))
+
+    f["key_rule_penalty"] = float(key_rule_penalty(risk_card.get("structural_diff")))
+
+    file_path = (risk_card.get("action") or {}).get("file_path", "")
+    f[_file_class(file_path)] = 1.0
+
+    if diff_analysis.get("ai_enhanced"):
+        f["ai_risks"] = float(len(diff_analysis.get("ai_risks", [])))
+        f["ai_confidence"] = float(diff_analysis.get("ai_confidence", 0.5))
+        try:
+            from app.airia_analysis import get_airia_risk_adjustment
+            f["ai_adjustment"] = float(get_airia_risk_adjustment(diff_analysis))
+        except Exception:
+            pass  # Silently ignore if Airia module has issues
+
+    return [f[name] for name in feature_names()]
+
+
+def score_features(features: Sequence[float], weights: Dict[str, float] = None) -> int:
+    """Score one feature vector (0-100). Pure Python so the request path needs no NumPy."""
+    w = weight_vector(weights if weights is not None else get_weights())
+    raw = sum(x * wi for x, wi in zip(features, w))
+    return int(min(100, max(0, round(raw))))
+
+
+def score_batch(matrix, weights: Dict[str, float] = None, names: Sequence[str] = None):
+    """
+    Score many feature vectors at once.
+
+    Args:
+        matrix: 2-D array-like of shape (n_cards, n_features)
+        weights: Weights dict (defaults to the configured weights)
+        names: Feature names for the matrix columns (defaults to feature_names())
+
+    Returns:
+        NumPy int array of scores (0-100)
+    """
+    import numpy as np
+    w = np.asarray(weight_vector(weights if weights is not None else get_weights(), names), dtype=np.float32)
+    x = np.asarray(matrix, dtype=np.float32)
+    return np.clip(np.rint(x @ w), 0, 100).astype(np.int16)
+
+
+@lru_cache(maxsize=1)
+def get_weights() -> Dict[str, float]:
+    """Configured weights, loaded once per process."""
+    return load_weights()
@@ -1,5 +1,59 @@
 """Risk scoring system for Aegis."""
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
+from app.structural_diff import get_change
+
+# Key-targeted rules evaluated against the structural diff of YAML/JSON files.
+# Each rule fires on one key path:
+# - min_increase: numeric value grew by at least this much
+# - min_ratio: numeric value changed by at least this factor (either direction)
+# - becomes: value was switched to exactly this value
+KEY_RULES = [
+    {"path": "featureX.percentage", "min_increase": 20, "penalty": 10},
+    {"path": "featureX", "becomes": True, "penalty": 5},
+    {"path": "pagination", "min_ratio": 2, "penalty": 5},
+]
+# Cap on the combined penalty from secret findings
+SECRET_SCORE_CAP = 40
+# Penalty per removed key, capped
+REMOVED_KEY_PENALTY = 5
+REMOVED_KEY_CAP = 15
+
+
+def _is_number(v) -> bool:
+    return isinstance(v, (int, float)) and not isinstance(v, bool)
+
+
+def key_rule_penalty(sdiff: Optional[Dict]) -> int:
+    """
+    Score a structural diff against KEY_RULES.
+    
+    Args:
+        sdiff: Result of structural_diff() (None for non-config files)
+        
+    Returns:
+        Integer penalty to add to the risk score
+    """
+    if not sdiff:
+        return 0
+    
+    penalty = 0
+    for rule in KEY_RULES:
+        change = get_change(sdiff, rule["path"])
+        if not change:
+            continue
+        old, new = change["old"], change["new"]
+        if "becomes" in rule:
+            if change["kind"] != "removed" and new is rule["becomes"] and old is not rule["becomes"]:
+                penalty += rule["penalty"]
+        elif _is_number(old) and _is_number(new):
+            if "min_increase" in rule and new - old >= rule["min_increase"]:
+                penalty += rule["penalty"]
+            elif "min_ratio" in rule and min(old, new) > 0 and max(old, new) / min(old, new) >= rule["min_ratio"]:
+                penalty += rule["penalty"]
+    
+    removed = len(sdiff.get("removed", []))
+    penalty += min(REMOVED_KEY_CAP, removed * REMOVED_KEY_PENALTY)
+    return penalty
 
 
 def calculate_risk_score(risk_card: dict) -> int:
@@ -11,8 +65,14 @@ def calculate_risk_score(risk_card: dict) -> int:
     - Failed checks: +15 per failure
     - Policy failures: +20 extra
     - Test failures: +25 extra
-    - Risky patterns: +8-15 per pattern
+    - Risky patterns: per-rule weight from the diff scanner rule set
+    - Secret findings: per-finding weight, capped at +40
     - Large deletions: +15 if >10 lines
+    - Key rules on the structural diff (see KEY_RULES)
+    - Airia AI adjustment: up to +20
+    
+    Weights can be overridden without code changes via AEGIS_RISK_WEIGHTS
+    (see app/risk_model.py).
     
     Args:
         risk_card: Risk card dictionary with checks, status, diff
@@ -20,63 +80,9 @@ def calculate_risk_score(risk_card: dict) -> int:
     Returns:
         Integer score 0-100 (capped)
     """
-    checks = risk_card.get("checks", [])
-    status = risk_card.get("status", "unknown")
-    diff = risk_card.get("diff", "")
-    
-    score = 0
-    
-    # Base score from status
-    if status == "blocked":
-        score += 50
-    elif status == "allow":
-        score += 10
-    
-    # Failed checks add to score
-    failed_checks = [name for name, ok, msg in checks if not ok]
-    score += len(failed_checks) * 15
-    
-    # Policy failures are more serious
-    for name, ok, msg in checks:
-        if not ok and name == "policy":
-            score += 20
-        elif not ok and name == "dry_run_tests":
-            score += 25
-    
-    # Analyze diff for risky patterns
-    if diff:
-        risky_patterns = [
-            ("DELETE", 10),
-            ("DROP", 10),
-            ("rm -rf", 15),
-            ("DROP TABLE", 15),
-            ("TRUNCATE", 12),
-            ("--force", 8),
-            ("--no-check", 8),
-        ]
-        diff_upper = diff.upper()
-        for pattern, penalty in risky_patterns:
-            if pattern in diff_upper:
-                score += penalty
-    
-    # Large deletions are risky
-    if diff:
-        lines = diff.split("\n")
-        deletions = sum(1 for line in lines if line.startswith("-") and not line.startswith("---"))
-        if deletions > 10:
-            score += min(15, deletions // 5)
-    
-    # Airia AI risk adjustment (if available)
-    diff_analysis = risk_card.get("diff_analysis", {})
-    if diff_analysis.get("ai_enhanced"):
-        try:
-            from app.airia_analysis import get_airia_risk_adjustment
-            score += get_airia_risk_adjustment(diff_analysis)
-        except Exception:
-            pass  # Silently ignore if Airia module has issues
-    
-    # Cap at 100
-    return min(100, max(0, score))
+    # The additive rules above are the default weights of the feature model
+    from app.risk_model import extract_features, score_features
+    return score_features(extract_features(risk_card))
 
 
 def get_risk_level(score: int) -> Tuple[str, str]:
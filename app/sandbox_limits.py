@@ -0,0 +1,352 @@
+"""
+Resource limits and usage accounting for sandbox test runs.
+
+A proposal's tests run arbitrary code (a huge config file, a memory-hungry
+test), so the test process runs under limits instead of only a wall-clock
+timeout:
+
+- rlimits applied by a small exec wrapper before the command starts: CPU seconds, address
+  space, open files, largest file written
+- wall time and total sandbox directory size, watched from the parent; the
+  whole process group is killed when either is exceeded
+- optionally a cgroup v2 (memory.max / pids.max / cpu.max) when
+  AEGIS_SANDBOX_CGROUP points at a cgroup directory delegated to this user
+
+The child is reaped with wait4(), which gives its resource usage; that usage
+is returned so it can be stored on the risk card (capacity planning, finding
+expensive proposals).
+
+With a live log (app/sandbox_logs.py) the output is read from pipes line by
+line as the tests run, and cancelling the log kills the process group.
+
+Configuration (environment variables, 0 disables a limit):
+- AEGIS_SANDBOX_TIMEOUT: wall-clock seconds (default 30)
+- AEGIS_SANDBOX_CPU_SECONDS: CPU seconds (default 30)
+- AEGIS_SANDBOX_MEMORY_MB: address space (default 2048)
+- AEGIS_SANDBOX_NOFILE: open files (default 256)
+- AEGIS_SANDBOX_FILE_MB: largest single file written (default 64)
+- AEGIS_SANDBOX_DISK_MB: total growth of the sandbox directory (default 256)
+- AEGIS_SANDBOX_CGROUP: delegated cgroup v2 directory (default unset)
+"""
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Not available on Windows: run without rlimits/accounting
+    resource = None
+
+SANDBOX_TIMEOUT = float(os.getenv("AEGIS_SANDBOX_TIMEOUT", "30"))
+SANDBOX_CPU_SECONDS = int(os.getenv("AEGIS_SANDBOX_CPU_SECONDS", "30"))
+SANDBOX_MEMORY_MB = int(os.getenv("AEGIS_SANDBOX_MEMORY_MB", "2048"))
+SANDBOX_NOFILE = int(os.getenv("AEGIS_SANDBOX_NOFILE", "256"))
+SANDBOX_FILE_MB = int(os.getenv("AEGIS_SANDBOX_FILE_MB", "64"))
+SANDBOX_DISK_MB = int(os.getenv("AEGIS_SANDBOX_DISK_MB", "256"))
+SANDBOX_CGROUP = os.getenv("AEGIS_SANDBOX_CGROUP")
+
+POLL_SECONDS = 0.1
+_MB = 1024 * 1024
+
+
+def default_limits(timeout: Optional[float] = None) -> Dict:
+    """Configured limits; `timeout` overrides the wall-clock limit."""
+    return {
+        "wall_seconds": timeout if timeout is not None else SANDBOX_TIMEOUT,
+        "cpu_seconds": SANDBOX_CPU_SECONDS,
+        "memory_mb": SANDBOX_MEMORY_MB,
+        "nofile": SANDBOX_NOFILE,
+        "file_mb": SANDBOX_FILE_MB,
+        "disk_mb": SANDBOX_DISK_MB,
+    }
+
+
+def _rlimits(limits: Dict) -> List[tuple]:
+    """(resource, soft, hard) triples for the configured limits."""
+    if resource is None:
+        return []
+    out = []
+    if limits.get("cpu_seconds"):
+        # SIGXCPU at the soft limit, SIGKILL shortly after at the hard limit
+        out.append((resource.RLIMIT_CPU, limits["cpu_seconds"], limits["cpu_seconds"] + 5))
+    if limits.get("memory_mb") and hasattr(resource, "RLIMIT_AS"):
+        size = limits["memory_mb"] * _MB
+        out.append((resource.RLIMIT_AS, size, size))
+    if limits.get("nofile"):
+        out.append((resource.RLIMIT_NOFILE, limits["nofile"], limits["nofile"]))
+    if limits.get("file_mb"):
+        size = limits["file_mb"] * _MB
+        out.append((resource.RLIMIT_FSIZE, size, size))
+    # Never raise a limit above what this process is allowed
+    capped = []
+    for res, soft, hard in out:
+        cur_soft, cur_hard = resource.getrlimit(res)
+        if cur_hard != resource.RLIM_INFINITY:
+            hard = min(hard, cur_hard)
+            soft = min(soft, hard)
+        capped.append((res, soft, hard))
+    return capped
+
+
+# Joins the cgroup and applies the rlimits, then execs the real command. Running it
+# as its own process (rather than a preexec_fn between fork and exec) keeps the
+# setup out of a forked copy of the multi-threaded server, where it can deadlock
+_EXEC_WRAPPER = """
+import os, resource, sys
+procs, limits, cmd = sys.argv[1], sys.argv[2], sys.argv[3:]
+if procs:
+    with open(procs, "w") as f:
+        f.write(str(os.getpid()))
+for spec in filter(None, limits.split(",")):
+    res, soft, hard = (int(x) for x in spec.split(":"))
+    resource.setrlimit(res, (soft, hard))
+os.execvp(cmd[0], cmd)
+"""
+
+
+def _limited_cmd(cmd: List[str], rlimits: List[tuple], cgroup_procs: Optional[str]) -> List[str]:
+    """`cmd` wrapped so it starts inside the cgroup and under the rlimits."""
+    limits = ",".join(f"{res}:{soft}:{hard}" for res, soft, hard in rlimits)
+    return [sys.executable, "-c", _EXEC_WRAPPER, cgroup_procs or "", limits] + list(cmd)
+
+
+def _create_cgroup(limits: Dict) -> Optional[str]:
+    """Child cgroup under AEGIS_SANDBOX_CGROUP with the memory/cpu limits, or None."""
+    if not SANDBOX_CGROUP or not os.path.isdir(SANDBOX_CGROUP):
+        return None
+    path = os.path.join(SANDBOX_CGROUP, f"aegis-{uuid.uuid4().hex[:12]}")
+    try:
+        os.mkdir(path)
+        settings = {"pids.max": "256"}
+        if limits.get("memory_mb"):
+            settings["memory.max"] = str(limits["memory_mb"] * _MB)
+        settings["cpu.max"] = "100000 100000"  # One CPU
+        for name, value in settings.items():
+            if os.path.exists(os.path.join(path, name)):
+                with open(os.path.join(path, name), "w") as f:
+                    f.write(value)
+        return path
+    except OSError as e:
+        print(f"Sandbox cgroup unavailable, using rlimits only: {e}")
+        return None
+
+
+def _cgroup_peak_bytes(path: str) -> Optional[int]:
+    for name in ("memory.peak", "memory.max_usage_in_bytes"):
+        try:
+            with open(os.path.join(path, name)) as f:
+                return int(f.read().strip())
+        except (OSError, ValueError):
+            continue
+    return None
+
+
+def _cgroup_oom_kills(path: str) -> int:
+    """Processes the cgroup's memory.max OOM-killed (memory.events oom_kill)."""
+    try:
+        with open(os.path.join(path, "memory.events")) as f:
+            for line in f:
+                name, _, value = line.partition(" ")
+                if name == "oom_kill":
+                    return int(value)
+    except (OSError, ValueError):
+        pass
+    return 0
+
+
+def dir_size(path: str) -> int:
+    """Total size in bytes of the files under a directory."""
+    total = 0
+    stack = [path]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            total += entry.stat(follow_symlinks=False).st_size
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+    return total
+
+
+def _kill_group(pid: int):
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _tail(path: str, max_chars: int) -> str:
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        f.seek(max(0, size - max_chars * 4))
+        return f.read().decode("utf-8", errors="replace")[-max_chars:]
+
+
+def _pump(pipe, out, log, source: str):
+    """Copy a child pipe to its output file and the live log, line by line."""
+    with pipe:
+        for line in iter(pipe.readline, b""):
+            try:
+                out.write(line)
+            except ValueError:
+                return  # Output file closed: a stray grandchild kept the pipe open past the run
+            log.write(source, line.decode("utf-8", errors="replace").rstrip("\r\n"))
+
+
+def run_limited(cmd: List[str], cwd: str, limits: Optional[Dict] = None, tail_chars: int = 400,
+                env: Optional[Dict] = None, log=None, log_source: str = "") -> Dict:
+    """
+    Run a sandbox command under resource limits and measure what it used.
+
+    Args:
+        cmd: Command to run (e.g. ["pytest", "-q"])
+        cwd: Sandbox directory; its growth counts against the disk limit
+        limits: default_limits() overrides
+        tail_chars: Characters of stdout/stderr to keep
+        env: Extra environment variables for the command
+        log: Live log (app/sandbox_logs.SandboxLog) to stream output to; its
+            cancel flag stops the run
+        log_source: Prefix for this process's lines in the log (e.g. "shard-1")
+
+    Returns:
+        Dictionary with keys:
+        - returncode: int - Exit code (negative signal number if killed)
+        - stdout / stderr: str - Last tail_chars characters
+        - limit_hit: str | None - "wall", "cpu", "memory", "disk", "file_size"
+          or "cancelled" (from the exit signal, cgroup OOM kills and what the
+          parent watched; see app/test_runner.py for MemoryError in tests)
+        - usage: dict - cpu_user_seconds, cpu_system_seconds, cpu_seconds,
+          max_rss_mb, wall_seconds, disk_bytes, io_write_bytes, output_bytes,
+          limit_hit, limits (as applied) and enforced_by
+    """
+    limits = dict(default_limits(), **(limits or {}))
+    rlimits = _rlimits(limits)
+    cgroup = _create_cgroup(limits)
+    enforced_by = "+".join(x for x in ("rlimit" if rlimits else "", "cgroup" if cgroup else "") if x) or "timeout"
+
+    # pytest's tmp_path and friends go inside the sandbox so they count as disk use
+    child_env = dict(os.environ, **(env or {}))
+    tmp = os.path.join(cwd, ".tmp")
+    os.makedirs(tmp, exist_ok=True)
+    child_env["TMPDIR"] = tmp
+    if log is not None:
+        child_env["PYTHONUNBUFFERED"] = "1"  # Lines reach the log as they are printed
+
+    disk_limit = limits.get("disk_mb", 0) * _MB
+    disk_before = dir_size(cwd) if disk_limit else 0
+    disk_peak = disk_before
+
+    limit_hit = None
+    start = time.time()
+    with tempfile.TemporaryDirectory(prefix="aegis-sandbox-io-") as io_dir:
+        out_path, err_path = os.path.join(io_dir, "stdout"), os.path.join(io_dir, "stderr")
+        with open(out_path, "wb") as out, open(err_path, "wb") as err:
+            if rlimits or cgroup:
+                cmd = _limited_cmd(cmd, rlimits, os.path.join(cgroup, "cgroup.procs") if cgroup else None)
+            pipe = subprocess.PIPE if log is not None else None
+            proc = subprocess.Popen(cmd, cwd=cwd, stdout=pipe or out, stderr=pipe or err, env=child_env,
+                                    start_new_session=True)
+            if cgroup:
+                # The wrapper also joins before exec, so nothing runs outside the cgroup
+                try:
+                    with open(os.path.join(cgroup, "cgroup.procs"), "w") as f:
+                        f.write(str(proc.pid))
+                except OSError as e:
+                    print(f"Sandbox cgroup join failed: {e}")
+            pumps = []
+            if log is not None:
+                prefix = f"{log_source}:" if log_source else ""
+                pumps = [threading.Thread(target=_pump, args=(proc.stdout, out, log, prefix + "stdout"), daemon=True),
+                         threading.Thread(target=_pump, args=(proc.stderr, err, log, prefix + "stderr"), daemon=True)]
+                for pump in pumps:
+                    pump.start()
+
+            status, rusage = 0, None
+            next_disk_check = 0.0
+            while True:
+                if hasattr(os, "wait4"):
+                    pid, status, rusage = os.wait4(proc.pid, os.WNOHANG)
+                    done = pid != 0
+                else:
+                    done = proc.poll() is not None
+                if done:
+                    break
+                now = time.time()
+                if log is not None and log.cancelled and limit_hit != "cancelled":
+                    limit_hit = "cancelled"
+                    _kill_group(proc.pid)
+                elif limits.get("wall_seconds") and now - start > limits["wall_seconds"]:
+                    limit_hit = "wall"
+                    _kill_group(proc.pid)
+                elif disk_limit and now >= next_disk_check:
+                    disk_peak = max(disk_peak, dir_size(cwd))
+                    next_disk_check = now + 1.0
+                    if disk_peak - disk_before > disk_limit:
+                        limit_hit = "disk"
+                        _kill_group(proc.pid)
+                time.sleep(POLL_SECONDS)
+            # Clean up anything the test left running in its process group
+            _kill_group(proc.pid)
+            for pump in pumps:
+                pump.join(timeout=5)
+
+        wall = time.time() - start
+        if hasattr(os, "wait4"):
+            proc.returncode = os.waitstatus_to_exitcode(status)
+        returncode = proc.returncode
+        stdout, stderr = _tail(out_path, tail_chars), _tail(err_path, tail_chars)
+        output_bytes = os.path.getsize(out_path) + os.path.getsize(err_path)
+
+    if disk_limit:
+        disk_peak = max(disk_peak, dir_size(cwd))
+
+    cpu_used = rusage.ru_utime + rusage.ru_stime if rusage is not None else 0.0
+    if limit_hit is None and cgroup and _cgroup_oom_kills(cgroup):
+        limit_hit = "memory"
+    if limit_hit is None and returncode < 0:
+        sig = -returncode
+        if sig == getattr(signal, "SIGXCPU", None) or (
+                sig == signal.SIGKILL and limits.get("cpu_seconds") and cpu_used >= limits["cpu_seconds"]):
+            limit_hit = "cpu"
+        elif sig == getattr(signal, "SIGXFSZ", None):
+            limit_hit = "file_size"
+        elif sig == signal.SIGKILL:
+            limit_hit = "memory"  # Not killed by us or for CPU: the kernel OOM killer
+    if limit_hit is None and "File too large" in stderr:
+        limit_hit = "file_size"  # Python ignores SIGXFSZ, so writes fail with EFBIG instead
+
+    usage = {"wall_seconds": round(wall, 3), "disk_bytes": max(0, disk_peak - disk_before),
+             "output_bytes": output_bytes, "limit_hit": limit_hit, "limits": limits, "enforced_by": enforced_by}
+    if rusage is not None:
+        # ru_maxrss is KB on Linux, bytes on macOS
+        rss_scale = 1 if os.uname().sysname == "Darwin" else 1024
+        usage.update({
+            "cpu_user_seconds": round(rusage.ru_utime, 3),
+            "cpu_system_seconds": round(rusage.ru_stime, 3),
+            "cpu_seconds": round(cpu_used, 3),
+            "max_rss_mb": round(rusage.ru_maxrss * rss_scale / _MB, 1),
+            "io_write_bytes": rusage.ru_oublock * 512,
+        })
+    if cgroup:
+        peak = _cgroup_peak_bytes(cgroup)
+        if peak is not None:
+            usage["cgroup_peak_mb"] = round(peak / _MB, 1)
+        try:
+            os.rmdir(cgroup)
+        except OSError:
+            pass
+
+    return {"returncode": returncode, "stdout": stdout, "stderr": stderr, "limit_hit": limit_hit, "usage": usage}
@@ -0,0 +1,211 @@
+"""
+Live sandbox output for Aegis.
+
+While a proposal's tests run, the sandbox process pipes are read line by line
+into a SandboxLog tied to the request_id:
+
+- recent lines go to a bounded buffer and to every live subscriber
+  (/riskcard/{request_id}/log/stream over SSE); a watcher that falls behind
+  loses its oldest lines rather than slowing down the test run
+- the full log is gzip-compressed as it is written and saved to the history
+  database when the run ends (/riskcard/{request_id}/log); only the tail of
+  stdout stays on the risk card
+- an operator can cancel a hopeless run (/riskcard/{request_id}/cancel); the
+  sandbox processes are killed and the slot is freed
+
+Runs stay watchable for a while after they finish so a late watcher still
+gets the tail and the "end" event.
+
+Configuration (environment variables):
+- AEGIS_LOG_BUFFER_LINES: recent lines kept per run and per subscriber (default 500)
+- AEGIS_LOG_MAX_BYTES: largest full log kept per run, uncompressed (default 10 MB)
+- AEGIS_LOG_RETAIN_SECONDS: how long a finished run stays in /sandbox/runs (default 120)
+"""
+import asyncio
+import os
+import threading
+import time
+import zlib
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.events import Subscription
+
+BUFFER_LINES = int(os.getenv("AEGIS_LOG_BUFFER_LINES", "500"))
+MAX_LOG_BYTES = int(os.getenv("AEGIS_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+RETAIN_SECONDS = float(os.getenv("AEGIS_LOG_RETAIN_SECONDS", "120"))
+
+
+class SandboxLog:
+    """Output of one sandbox run: live fan-out, compressed full log and a cancel flag."""
+
+    def __init__(self, request_id: str, **meta):
+        self.request_id = request_id
+        self.meta = meta
+        self.started = time.time()
+        self.finished: Optional[float] = None
+        self.status = "queued"  # Until a sandbox slot is free
+        self.lines = 0
+        self.bytes = 0
+        self.truncated = False
+        self._lock = threading.Lock()
+        self._next_id = 1
+        self._recent: deque = deque(maxlen=BUFFER_LINES)
+        self._subs: List[Subscription] = []
+        self._compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: gzip container
+        self._chunks: List[bytes] = []
+        self._cancel = threading.Event()
+        self._cancel_callbacks: List[Callable[[], None]] = []
+
+    def _publish(self, event_type: str, data: Dict) -> Dict:
+        # Lock held
+        event = {"id": self._next_id, "event": event_type, "data": data}
+        self._next_id += 1
+        self._recent.append(event)
+        for sub in list(self._subs):
+            try:
+                sub.loop.call_soon_threadsafe(sub._offer, event)
+            except RuntimeError:
+                self._subs.remove(sub)  # Subscriber's loop is gone
+        return event
+
+    def write(self, source: str, line: str):
+        """Add one output line ("stdout"/"stderr", optionally shard-prefixed). Safe from any thread."""
+        raw = (line if source.endswith("stdout") else f"[{source}] {line}").encode("utf-8", errors="replace") + b"\n"
+        with self._lock:
+            self.lines += 1
+            self.bytes += len(raw)
+            if self.bytes <= MAX_LOG_BYTES:
+                self._chunks.append(self._compressor.compress(raw))
+            else:
+                self.truncated = True
+            self._publish("line", {"source": source, "line": line})
+
+    def subscribe(self) -> Tuple[Subscription, List[Dict]]:
+        """Register a subscriber on the running event loop; returns it and the buffered backlog."""
+        sub = Subscription(asyncio.get_running_loop(), BUFFER_LINES)
+        with self._lock:
+            self._subs.append(sub)
+            return sub, list(self._recent)
+
+    def unsubscribe(self, sub: Subscription):
+        with self._lock:
+            if sub in self._subs:
+                self._subs.remove(sub)
+
+    def cancel(self) -> bool:
+        """Ask the sandbox to stop. Returns False if the run already finished."""
+        with self._lock:
+            if self.finished is not None:
+                return False
+            self._cancel.set()
+            callbacks, self._cancel_callbacks = self._cancel_callbacks, []
+        for callback in callbacks:
+            callback()
+        return True
+
+    def on_cancel(self, callback: Callable[[], None]):
+        """Run `callback` once when the run is cancelled (right away if it already was)."""
+        with self._lock:
+            if not self._cancel.is_set():
+                self._cancel_callbacks.append(callback)
+                return
+        callback()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def gzip_bytes(self) -> bytes:
+        """The full log so far as a complete gzip stream."""
+        with self._lock:
+            if self.finished is not None:
+                return b"".join(self._chunks)
+            return b"".join(self._chunks) + self._compressor.copy().flush()
+
+    def finish(self, status: str) -> bytes:
+        """Close the log; publishes the "end" event and returns the final gzip stream."""
+        with self._lock:
+            if self.finished is None:
+                self._chunks.append(self._compressor.flush())
+                self.finished = time.time()
+                self.status = "cancelled" if self.cancelled else status
+                self._publish("end", self._summary())
+            return b"".join(self._chunks)
+
+    def _summary(self) -> Dict:
+        return {
+            "request_id": self.request_id,
+            "status": self.status,
+            "lines": self.lines,
+            "bytes": self.bytes,
+            "truncated": self.truncated,
+            "started": self.started,
+            "elapsed": round((self.finished or time.time()) - self.started, 3),
+            **self.meta,
+        }
+
+    def summary(self) -> Dict:
+        with self._lock:
+            return dict(self._summary(), subscribers=len(self._subs))
+
+
+_logs: Dict[str, SandboxLog] = {}
+_logs_lock = threading.Lock()
+
+
+def _prune():
+    # Lock held: forget finished runs past their retention
+    cutoff = time.time() - RETAIN_SECONDS
+    for request_id in [r for r, log in _logs.items() if log.finished is not None and log.finished < cutoff]:
+        del _logs[request_id]
+
+
+def open_log(request_id: str, **meta) -> SandboxLog:
+    """Start the live log of a sandbox run (meta: client, file_path, ... shown in /sandbox/runs)."""
+    log = SandboxLog(request_id, **meta)
+    with _logs_lock:
+        _prune()
+        _logs[request_id] = log
+    return log
+
+
+def get_log(request_id: str) -> Optional[SandboxLog]:
+    """Live (or recently finished) log of a run, or None."""
+    with _logs_lock:
+        _prune()
+        return _logs.get(request_id)
+
+
+def list_runs() -> List[Dict]:
+    """Summaries of running and recently finished sandbox runs, newest first."""
+    with _logs_lock:
+        _prune()
+        logs = list(_logs.values())
+    return sorted((log.summary() for log in logs), key=lambda s: s["started"], reverse=True)
+
+
+def close_log(log: SandboxLog, status: str = "finished") -> Dict:
+    """
+    Finish a run's log and persist the compressed full log.
+
+    A "rejected" run (turned away by admission control) never ran: its log is
+    dropped instead of saved, so load shedding does not cost a database write.
+
+    Returns:
+        Compact log summary for the risk card (status, lines, bytes, truncated)
+    """
+    data = log.finish(status)
+    summary = log.summary()
+    if status == "rejected":
+        with _logs_lock:
+            if _logs.get(log.request_id) is log:
+                del _logs[log.request_id]
+        return {k: summary[k] for k in ("status", "lines", "bytes", "truncated")}
+    try:
+        from app.history import save_sandbox_log
+        save_sandbox_log(log.request_id, data, summary["status"], summary["lines"], summary["bytes"],
+                         summary["truncated"])
+    except Exception as e:
+        print(f"Sandbox log save failed: {e}")
+    return {k: summary[k] for k in ("status", "lines", "bytes", "truncated")}
@@ -0,0 +1,256 @@
+"""
+Admission control for sandbox execution.
+
+Every /propose_action that passes policy runs a sandbox (copy the demo repo,
+run pytest). Without a bound, a burst of requests starts as many sandboxes as
+there are requests and every one of them gets slow. The scheduler caps how
+many sandboxes run at once, keeps a bounded wait queue behind that, and
+rejects early once the queue is full so callers can back off:
+
+- 503 + Retry-After: all slots busy and the queue is full, or the request
+  waited longer than the queue timeout
+- 429 + Retry-After: the client already has its fair share of running and
+  queued sandboxes (only with a per-client quota)
+
+When a slot frees up, waiting clients are served round-robin (the client with
+the fewest running sandboxes first), so one busy client cannot starve the rest.
+A request cancelled while queued leaves the queue without taking a slot.
+Limits apply per worker process. /propose_action is a sync endpoint, so each
+running or queued sandbox holds a request thread; app startup grows the
+thread pool by AEGIS_SANDBOX_CONCURRENCY + AEGIS_SANDBOX_QUEUE so waiting
+sandboxes cannot starve the other endpoints of threads.
+
+Configuration (environment variables):
+- AEGIS_SANDBOX_CONCURRENCY: sandboxes running at once (default: CPU count divided
+  by AEGIS_TEST_WORKERS, the pytest processes each sandbox may start)
+- AEGIS_SANDBOX_QUEUE: requests allowed to wait for a slot (default 16, 0 = reject when busy)
+- AEGIS_SANDBOX_QUEUE_TIMEOUT: longest wait for a slot in seconds (default 30)
+- AEGIS_SANDBOX_CLIENT_QUOTA: running + queued sandboxes per client (default 0 = no quota)
+- AEGIS_TRUST_CLIENT_HEADER: "1" identifies clients by the X-Aegis-Client header
+  instead of the peer address; only for deployments where a trusted proxy or
+  auth layer sets it, since callers could otherwise rotate it to dodge quotas
+  (default off)
+"""
+import math
+import os
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+from app.test_runner import TEST_WORKERS
+
+# Each sandbox may run up to TEST_WORKERS pytest processes, so the default keeps
+# sandboxes x workers at about one process per CPU
+SANDBOX_CONCURRENCY = int(os.getenv("AEGIS_SANDBOX_CONCURRENCY",
+                                    str(max(1, (os.cpu_count() or 2) // max(1, TEST_WORKERS)))))
+SANDBOX_QUEUE = int(os.getenv("AEGIS_SANDBOX_QUEUE", "16"))
+SANDBOX_QUEUE_TIMEOUT = float(os.getenv("AEGIS_SANDBOX_QUEUE_TIMEOUT", "30"))
+SANDBOX_CLIENT_QUOTA = int(os.getenv("AEGIS_SANDBOX_CLIENT_QUOTA", "0"))
+TRUST_CLIENT_HEADER = os.getenv("AEGIS_TRUST_CLIENT_HEADER", "0") == "1"
+
+# Assumed sandbox duration until real runs have been timed
+_INITIAL_RUN_SECONDS = 5.0
+_MAX_RETRY_AFTER = 300
+
+
+class SandboxBusy(Exception):
+    """Request rejected by admission control."""
+
+    def __init__(self, status_code: int, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class SandboxCancelled(Exception):
+    """Run cancelled while waiting in the queue; no slot was taken."""
+
+    def __init__(self, waited: float):
+        super().__init__("Sandbox run cancelled while queued")
+        self.waited = waited
+
+
+class _Waiter:
+    __slots__ = ("client", "event", "granted", "cancelled")
+
+    def __init__(self, client: str):
+        self.client = client
+        self.event = threading.Event()
+        self.granted = False
+        self.cancelled = False
+
+
+class SandboxScheduler:
+    """Bounded concurrency + bounded fair queue for sandbox runs."""
+
+    def __init__(self, max_concurrent: int = SANDBOX_CONCURRENCY, max_queue: int = SANDBOX_QUEUE,
+                 queue_timeout: float = SANDBOX_QUEUE_TIMEOUT, client_quota: int = SANDBOX_CLIENT_QUOTA):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self.client_quota = client_quota
+        self._lock = threading.Lock()
+        self._running = 0
+        self._running_by_client: Counter = Counter()
+        self._queues: "OrderedDict[str, deque]" = OrderedDict()  # client -> waiters, in round-robin order
+        self._queued = 0
+        self._avg_run = _INITIAL_RUN_SECONDS
+        self._waits: deque = deque(maxlen=500)
+        self.counts = {"admitted": 0, "waited": 0, "rejected_quota": 0, "rejected_full": 0, "timed_out": 0,
+                       "cancelled": 0}
+
+    def _retry_after(self) -> int:
+        """Seconds until a slot is likely free for a new request (lock held)."""
+        backlog = (self._queued + 1) / self.max_concurrent
+        return max(1, min(_MAX_RETRY_AFTER, math.ceil(self._avg_run * backlog)))
+
+    def _grant_next(self):
+        """Hand free slots to waiting clients, fewest running first (lock held)."""
+        while self._running < self.max_concurrent and self._queued:
+            client = min(self._queues, key=lambda c: self._running_by_client[c])
+            waiters = self._queues.pop(client)
+            waiter = waiters.popleft()
+            if waiters:
+                self._queues[client] = waiters  # Back of the round-robin order
+            self._queued -= 1
+            self._running += 1
+            self._running_by_client[client] += 1
+            waiter.granted = True
+            waiter.event.set()
+
+    def _remove(self, waiter: _Waiter):
+        """Take a waiter out of its client's queue, if still there (lock held)."""
+        waiters = self._queues.get(waiter.client)
+        if waiters and waiter in waiters:
+            waiters.remove(waiter)
+            if not waiters:
+                del self._queues[waiter.client]
+            self._queued -= 1
+
+    def _withdraw(self, waiter: _Waiter):
+        """Drop a cancelled waiter from the queue and wake it."""
+        with self._lock:
+            if waiter.granted or waiter.cancelled:
+                return
+            self._remove(waiter)
+            waiter.cancelled = True
+        waiter.event.set()
+
+    def acquire(self, client: str = "anonymous",
+                on_cancel: Optional[Callable[[Callable[[], None]], None]] = None) -> float:
+        """
+        Take a sandbox slot, waiting in the queue if necessary.
+
+        Args:
+            client: Client identity used for fair share and quotas
+            on_cancel: Registers a callback to run when the request is cancelled
+                (e.g. SandboxLog.on_cancel); a cancelled waiter leaves the queue
+
+        Returns:
+            Seconds spent waiting for the slot
+
+        Raises:
+            SandboxBusy: Rejected (quota exceeded, queue full or queue timeout)
+            SandboxCancelled: Cancelled while queued
+        """
+        start = time.time()
+        with self._lock:
+            if self.client_quota > 0:
+                held = self._running_by_client[client] + len(self._queues.get(client, ()))
+                if held >= self.client_quota:
+                    self.counts["rejected_quota"] += 1
+                    raise SandboxBusy(429, f"Client '{client}' already has {held} sandbox runs in progress "
+                                           f"(quota {self.client_quota})", self._retry_after())
+            if self._running < self.max_concurrent and not self._queued:
+                self._running += 1
+                self._running_by_client[client] += 1
+                self.counts["admitted"] += 1
+                self._waits.append(0.0)
+                return 0.0
+            if self._queued >= self.max_queue:
+                self.counts["rejected_full"] += 1
+                raise SandboxBusy(503, "Sandbox capacity exhausted, try again later", self._retry_after())
+            waiter = _Waiter(client)
+            self._queues.setdefault(client, deque()).append(waiter)
+            self._queued += 1
+            self.counts["waited"] += 1
+
+        if on_cancel is not None:
+            on_cancel(lambda: self._withdraw(waiter))
+        waiter.event.wait(self.queue_timeout)
+        with self._lock:
+            waited = time.time() - start
+            if waiter.cancelled:
+                self.counts["cancelled"] += 1
+                self._waits.append(waited)
+                raise SandboxCancelled(waited)
+            if not waiter.granted:
+                # Timed out: leave the queue
+                self._remove(waiter)
+                waiter.cancelled = True  # A late cancel must not touch the queue again
+                self.counts["timed_out"] += 1
+                self._waits.append(waited)
+                raise SandboxBusy(503, f"No sandbox slot within {self.queue_timeout:g}s, try again later",
+                                  self._retry_after())
+            self.counts["admitted"] += 1
+            self._waits.append(waited)
+            return waited
+
+    def release(self, client: str = "anonymous", run_seconds: float = None):
+        """Give a slot back (and record how long the sandbox ran)."""
+        with self._lock:
+            self._running -= 1
+            self._running_by_client[client] -= 1
+            if self._running_by_client[client] <= 0:
+                del self._running_by_client[client]
+            if run_seconds is not None:
+                self._avg_run = 0.8 * self._avg_run + 0.2 * run_seconds
+            self._grant_next()
+
+    @contextmanager
+    def slot(self, client: str = "anonymous", on_cancel: Optional[Callable[[Callable[[], None]], None]] = None):
+        """Run the body in a sandbox slot; yields the queue wait in seconds (see acquire())."""
+        waited = self.acquire(client, on_cancel)
+        start = time.time()
+        try:
+            yield waited
+        finally:
+            self.release(client, time.time() - start)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            waits = sorted(self._waits)
+
+            def pct(p):
+                return round(waits[min(len(waits) - 1, int(p / 100.0 * len(waits)))], 3) if waits else 0.0
+
+            return {
+                "running": self._running,
+                "queued": self._queued,
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "client_quota": self.client_quota,
+                "avg_run_seconds": round(self._avg_run, 3),
+                "wait_p50": pct(50),
+                "wait_p95": pct(95),
+                "wait_max": round(waits[-1], 3) if waits else 0.0,
+                "clients": {c: {"running": self._running_by_client[c], "queued": len(self._queues.get(c, ()))}
+                            for c in set(self._running_by_client) | set(self._queues)},
+                **self.counts,
+            }
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> SandboxScheduler:
+    """Process-wide sandbox scheduler."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = SandboxScheduler()
+        return _scheduler
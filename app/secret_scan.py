@@ -0,0 +1,153 @@
+"""
+Secret detection for Aegis.
+
+Scans added diff lines for leaked credentials using two techniques:
+- Signatures: a precompiled set of known key formats (AWS, GCP, GitHub,
+  OpenRouter/OpenAI-style keys, Slack tokens, private key headers, JWTs)
+  matched through one combined regex per line
+- Entropy: Shannon-entropy screening of long base64/hex-looking tokens that
+  no signature recognised, plus credential-looking assignments whose value
+  is high-entropy
+
+Works one line at a time (app/diff_scanner.py feeds it the added lines of a
+diff), so multi-megabyte diffs are scanned without materialising copies of
+the text. Very long lines (minified bundles, inline base64) are scanned in
+overlapping windows, so the regex work per window stays bounded without
+leaving the end of the line unscanned.
+"""
+import math
+import re
+from typing import Dict, List, Tuple
+
+# (id, label, regex, weight) - weight is the risk score penalty per finding
+SIGNATURES = [
+    ("aws_access_key", "AWS access key", r"\b(?:AKIA|ASIA)[0-9A-Z]{16}\b", 25),
+    ("gcp_api_key", "GCP API key", r"\bAIza[0-9A-Za-z_\-]{35}\b", 25),
+    ("gcp_service_account", "GCP service account key", r"\"type\"\s*:\s*\"service_account\"", 25),
+    ("github_token", "GitHub token", r"\b(?:gh[pousr]_[A-Za-z0-9]{36,}|github_pat_[A-Za-z0-9_]{22,})\b", 25),
+    ("openrouter_key", "OpenRouter API key", r"\bsk-or-(?:v1-)?[A-Za-z0-9]{32,}\b", 25),
+    ("openai_key", "OpenAI-style API key", r"\bsk-(?:proj-)?[A-Za-z0-9_\-]{32,}\b", 25),
+    ("slack_token", "Slack token", r"\bxox[abposr]-[A-Za-z0-9\-]{10,}\b", 25),
+    ("private_key", "Private key", r"-----BEGIN (?:[A-Z]+ )?PRIVATE KEY(?: BLOCK)?-----", 30),
+    ("jwt", "JSON Web Token", r"\beyJ[A-Za-z0-9_\-]{8,}\.eyJ[A-Za-z0-9_\-]{8,}\.[A-Za-z0-9_\-]{8,}", 20),
+]
+
+_SIGNATURE_RE = re.compile("|".join(f"(?P<{sid}>{rx})" for sid, _, rx, _ in SIGNATURES))
+_SIGNATURE_INFO = {sid: (label, weight) for sid, label, _, weight in SIGNATURES}
+# Literal prefixes of every signature; far cheaper than the full pattern, so
+# the full regex only runs on the rare lines that contain one of these
+_SIGNATURE_PREFILTER = re.compile(r"AKIA|ASIA|AIza|service_account|gh[pousr]_|github_pat_|sk-|xox|PRIVATE KEY|eyJ")
+
+# Credential-looking assignment: password = "...", api_key: ..., etc.
+_ASSIGNMENT_RE = re.compile(
+    r"(?i)(?:password|passwd|pwd|secret|api[_\-]?key|access[_\-]?key|token|credential)s?\b"
+    r"[\"']?\s*[:=]\s*[\"']?([^\s\"',;]{8,})"
+)
+_ASSIGNMENT_KEYWORDS = ("pass", "pwd", "secret", "key", "token", "credential")
+# Candidate tokens for entropy screening
+_TOKEN_RE = re.compile(r"[A-Za-z0-9+/=_\-]{20,}")
+_HEX_RE = re.compile(r"^[0-9a-fA-F]+$")
+
+# Entropy thresholds (bits per character)
+BASE64_ENTROPY = 4.3
+HEX_ENTROPY = 3.0
+ASSIGNMENT_ENTROPY = 3.0
+ENTROPY_WEIGHT = 10
+ASSIGNMENT_WEIGHT = 15
+
+# Lines longer than this are scanned in windows of this size, overlapping by
+# WINDOW_OVERLAP so a secret across a window edge is still seen whole
+MAX_LINE_CHARS = 8192
+WINDOW_OVERLAP = 512
+
+
+def shannon_entropy(s: str) -> float:
+    """Shannon entropy of a string in bits per character."""
+    if not s:
+        return 0.0
+    counts = {}
+    for ch in s:
+        counts[ch] = counts.get(ch, 0) + 1
+    n = len(s)
+    return -sum(c / n * math.log2(c / n) for c in counts.values())
+
+
+def _redact(value: str) -> str:
+    """Keep just enough of a secret to recognise it in a report."""
+    if len(value) <= 8:
+        return "*" * len(value)
+    return f"{value[:4]}…{value[-2:]}"
+
+
+def _is_high_entropy(token: str) -> bool:
+    if _HEX_RE.match(token):
+        return len(token) >= 32 and shannon_entropy(token) >= HEX_ENTROPY
+    # Require a mix of character classes so plain words and paths do not trigger
+    if not (re.search(r"[A-Z]", token) and re.search(r"[a-z]", token) and re.search(r"[0-9]", token)):
+        return False
+    return shannon_entropy(token) >= BASE64_ENTROPY
+
+
+def scan_line(text: str, line_no: int = 0) -> List[Dict]:
+    """
+    Scan one line for secrets.
+
+    Returns:
+        List of findings, each a dict:
+        - type: str - Signature id, "credential_assignment" or "high_entropy"
+        - label: str - Human-readable type
+        - kind: str - "signature" or "entropy"
+        - line: int - Line number passed in
+        - preview: str - Redacted value
+        - weight: int - Risk score penalty
+    """
+    if len(text) <= MAX_LINE_CHARS:
+        return [finding for finding, _ in _scan_window(text, line_no)]
+    # A match cut by a window edge shows up again, whole, in the neighbouring
+    # window; keep the longest of overlapping matches of the same type
+    candidates = []
+    step = MAX_LINE_CHARS - WINDOW_OVERLAP
+    for offset in range(0, len(text) - WINDOW_OVERLAP, step):
+        for finding, (start, end) in _scan_window(text[offset:offset + MAX_LINE_CHARS], line_no):
+            candidates.append((finding, offset + start, offset + end))
+    kept = []
+    for finding, start, end in sorted(candidates, key=lambda c: c[1] - c[2]):
+        if not any(f["type"] == finding["type"] and start < e and s < end for f, s, e in kept):
+            kept.append((finding, start, end))
+    return [finding for finding, _, _ in sorted(kept, key=lambda k: k[1])]
+
+
+def _scan_window(text: str, line_no: int) -> List[Tuple[Dict, Tuple[int, int]]]:
+    """Findings in a piece of a line, each with the span of the matched value."""
+    findings = []
+    covered = []
+
+    signature_matches = _SIGNATURE_RE.finditer(text) if _SIGNATURE_PREFILTER.search(text) else ()
+    for m in signature_matches:
+        sid = m.lastgroup
+        label, weight = _SIGNATURE_INFO[sid]
+        findings.append(({"type": sid, "label": label, "kind": "signature",
+                          "line": line_no, "preview": _redact(m.group(0)), "weight": weight}, m.span()))
+        covered.append(m.span())
+
+    def _overlaps(span: Tuple[int, int]) -> bool:
+        return any(span[0] < end and start < span[1] for start, end in covered)
+
+    lower = text.lower()
+    has_assignment = ("=" in text or ":" in text) and any(k in lower for k in _ASSIGNMENT_KEYWORDS)
+    for m in (_ASSIGNMENT_RE.finditer(text) if has_assignment else ()):
+        value = m.group(1)
+        if _overlaps(m.span(1)) or shannon_entropy(value) < ASSIGNMENT_ENTROPY:
+            continue
+        findings.append(({"type": "credential_assignment", "label": "Hard-coded credential", "kind": "entropy",
+                          "line": line_no, "preview": _redact(value), "weight": ASSIGNMENT_WEIGHT}, m.span(1)))
+        covered.append(m.span(1))
+
+    for m in _TOKEN_RE.finditer(text):
+        token = m.group(0)
+        if _overlaps(m.span()) or not _is_high_entropy(token):
+            continue
+        findings.append(({"type": "high_entropy", "label": "High-entropy string", "kind": "entropy",
+                          "line": line_no, "preview": _redact(token), "weight": ENTROPY_WEIGHT}, m.span()))
+
+    return findings
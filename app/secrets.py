@@ -7,11 +7,33 @@ OpenRouter key is stored in OPENROUTER_API_KEY.txt to avoid committing secrets.
 See docs/ARCHITECTURE.md for secrets model explanation.
 """
 from pathlib import Path
+from urllib.parse import urlparse
 import os
 
 # Find project root (where app/ directory is located)
 _PROJECT_ROOT = Path(__file__).parent.parent
 
+# Placeholder key used against the local provider stub (app/llm_stub.py)
+STUB_KEY = "stub-key"
+
+
+def _is_local(url: str) -> bool:
+    host = urlparse(url).hostname or ""
+    return host in ("localhost", "::1") or host.startswith("127.")
+
+
+def stub_key(base_url_env: str) -> str | None:
+    """
+    Placeholder key when AEGIS_LLM_STUB is set and no real key file exists.
+
+    Only given out while the provider URL in `base_url_env` points at this host
+    (the stub), so the placeholder is never sent to a real provider.
+    """
+    if os.getenv("AEGIS_LLM_STUB") and _is_local(os.getenv(base_url_env, "")):
+        return STUB_KEY
+    return None
+
+
 def read_airia_key() -> str | None:
     """
     Read Airia API key from AIRIA_API_KEY.txt.
@@ -30,7 +52,7 @@ def read_airia_key() -> str | None:
                 return p.read_text().strip()
             except Exception:
                 continue
-    return None
+    return stub_key("AIRIA_BASE_URL")
 
 def read_openrouter_key() -> str | None:
     """
@@ -51,4 +73,4 @@ def read_openrouter_key() -> str | None:
                 return p.read_text().strip()
             except Exception:
                 continue
-    return None
+    return stub_key("OPENROUTER_BASE_URL")
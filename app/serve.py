@@ -0,0 +1,41 @@
+"""
+Production launcher for the Aegis API.
+
+Runs uvicorn with N worker processes. Several workers only give consistent
+/metrics and /riskcard answers when they share state, so unless
+AEGIS_SHARED_STATE is already set, multi-worker runs use the single-host
+SQLite shared state backend (see app/shared_state.py). For workers on several
+hosts, set AEGIS_SHARED_STATE=redis and AEGIS_REDIS_URL.
+
+Usage:
+    python -m app.serve --workers 4
+    AEGIS_SHARED_STATE=redis AEGIS_REDIS_URL=redis://cache:6379/0 python -m app.serve --workers 8
+"""
+import argparse
+import os
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the Aegis API with one or more worker processes")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("AEGIS_WORKERS", "1")))
+    parser.add_argument("--shared-state", choices=["memory", "sqlite", "redis"],
+                        help="Shared state backend (default: sqlite when --workers > 1)")
+    args = parser.parse_args()
+
+    # Set before the workers import the app: backends are chosen at import time
+    if args.shared_state:
+        os.environ["AEGIS_SHARED_STATE"] = args.shared_state
+    elif args.workers > 1:
+        os.environ.setdefault("AEGIS_SHARED_STATE", "sqlite")
+    if args.workers > 1 and os.environ.get("AEGIS_SHARED_STATE", "memory") == "memory":
+        print("Warning: memory shared state with several workers - /metrics and /riskcard are per worker")
+
+    import uvicorn
+    print(f"Aegis API: {args.workers} worker(s), shared state: {os.environ.get('AEGIS_SHARED_STATE', 'memory')}")
+    uvicorn.run("app.app:app", host=args.host, port=args.port, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,402 @@
+"""
+Shared state for multi-worker deployments of Aegis.
+
+With `uvicorn --workers N` every worker is a separate process, so anything
+kept in module globals (request metrics, cache hit counters, recent cards)
+only describes the worker that happened to serve the request. Components that
+must agree across workers keep that state behind this small interface instead:
+
+- counters: incr(group, field, amount) / counters(group)
+- capped lists: append(key, item, max_len) / items(key)
+- values: get / set(ttl) / delete
+- hashes: hset(key, mapping, ttl) / hgetall / exists (field-wise updates,
+  no read-modify-write)
+
+Values are JSON-serializable Python objects.
+
+Backends:
+- memory (default): per-process, for a single worker
+- sqlite: a WAL-mode SQLite file with memory-mapped I/O - every worker on the
+  host maps the same pages and WAL index, so reads are served from shared
+  memory and writes are serialized by SQLite
+- redis: an external store for workers on several hosts. Uses redis-py when it
+  is installed; app/state_stub.py is a local stand-in server for development
+  and testing
+
+Configuration (environment variables):
+- AEGIS_SHARED_STATE: "memory", "sqlite" or "redis" (default memory)
+- AEGIS_SHARED_STATE_PATH: SQLite file (default aegis_state.db in the project root)
+- AEGIS_REDIS_URL: Redis URL (default redis://127.0.0.1:6379/0)
+"""
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import defaultdict, deque
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+_PROJECT_ROOT = Path(__file__).parent.parent
+
+SHARED_BACKEND = os.getenv("AEGIS_SHARED_STATE", "memory")
+SHARED_STATE_PATH = os.getenv("AEGIS_SHARED_STATE_PATH", str(_PROJECT_ROOT / "aegis_state.db"))
+REDIS_URL = os.getenv("AEGIS_REDIS_URL", "redis://127.0.0.1:6379/0")
+
+
+class SharedState(ABC):
+    """Interface implemented by every shared state backend."""
+
+    backend = "base"
+
+    @abstractmethod
+    def incr(self, group: str, field: str, amount: float = 1) -> float:
+        """Add `amount` to a counter and return the new value."""
+
+    @abstractmethod
+    def counters(self, group: str) -> Dict[str, float]:
+        """All counters in a group."""
+
+    @abstractmethod
+    def append(self, key: str, item: Any, max_len: int):
+        """Append to a list, keeping only the newest `max_len` items."""
+
+    @abstractmethod
+    def items(self, key: str) -> List[Any]:
+        """List contents, oldest first."""
+
+    @abstractmethod
+    def get(self, key: str) -> Any:
+        """Value stored under `key`, or None if missing or expired."""
+
+    @abstractmethod
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        """Store a value; it expires after `ttl` seconds if given."""
+
+    @abstractmethod
+    def delete(self, key: str):
+        """Remove a value or hash."""
+
+    @abstractmethod
+    def hset(self, key: str, mapping: Dict[str, Any], ttl: Optional[float] = None):
+        """Set fields of a hash (other fields are kept); `ttl` resets the hash's expiry."""
+
+    @abstractmethod
+    def hgetall(self, key: str) -> Dict[str, Any]:
+        """All fields of a hash ({} if missing or expired)."""
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        """Whether a hash exists."""
+
+
+class MemorySharedState(SharedState):
+    """Process-local state (single worker)."""
+
+    backend = "memory"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[str, float]] = defaultdict(dict)
+        self._lists: Dict[str, deque] = {}
+        self._values: Dict[str, tuple] = {}
+        self._hashes: Dict[str, tuple] = {}
+
+    def incr(self, group: str, field: str, amount: float = 1) -> float:
+        with self._lock:
+            counters = self._counters[group]
+            counters[field] = counters.get(field, 0) + amount
+            return counters[field]
+
+    def counters(self, group: str) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._counters.get(group, {}))
+
+    def append(self, key: str, item: Any, max_len: int):
+        with self._lock:
+            items = self._lists.get(key)
+            if items is None or items.maxlen != max_len:
+                items = self._lists[key] = deque(items or (), maxlen=max_len)
+            items.append(item)
+
+    def items(self, key: str) -> List[Any]:
+        with self._lock:
+            return list(self._lists.get(key, ()))
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                return None
+            if entry[1] is not None and entry[1] < time.time():
+                del self._values[key]
+                return None
+            return entry[0]
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        with self._lock:
+            self._values[key] = (value, time.time() + ttl if ttl else None)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._values.pop(key, None)
+            self._hashes.pop(key, None)
+
+    def _live_hash(self, key: str) -> Optional[Dict]:
+        entry = self._hashes.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] < time.time():
+            del self._hashes[key]
+            return None
+        return entry[0]
+
+    def hset(self, key: str, mapping: Dict[str, Any], ttl: Optional[float] = None):
+        with self._lock:
+            fields = dict(self._live_hash(key) or {})
+            fields.update(mapping)
+            expires = time.time() + ttl if ttl else (self._hashes.get(key) or (None, None))[1]
+            self._hashes[key] = (fields, expires)
+
+    def hgetall(self, key: str) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._live_hash(key) or {})
+
+    def exists(self, key: str) -> bool:
+        with self._lock:
+            return self._live_hash(key) is not None
+
+
+class SqliteSharedState(SharedState):
+    """State in a memory-mapped, WAL-mode SQLite file shared by all workers on the host."""
+
+    backend = "sqlite"
+
+    def __init__(self, path: str = SHARED_STATE_PATH, mmap_bytes: int = 64 * 1024 * 1024):
+        self.path = path
+        self.mmap_bytes = mmap_bytes
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS counters (grp TEXT, field TEXT, value REAL, PRIMARY KEY (grp, field));
+            CREATE TABLE IF NOT EXISTS lists (id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT, value TEXT);
+            CREATE INDEX IF NOT EXISTS idx_lists_key ON lists (key, id);
+            CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT, expires_at REAL);
+            CREATE TABLE IF NOT EXISTS hashes (key TEXT, field TEXT, value TEXT, expires_at REAL,
+                                               PRIMARY KEY (key, field));
+        """)
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread; autocommit so each statement is its own short transaction
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA mmap_size={int(self.mmap_bytes)}")
+            self._local.conn = conn
+        return conn
+
+    def incr(self, group: str, field: str, amount: float = 1) -> float:
+        row = self._conn().execute(
+            "INSERT INTO counters (grp, field, value) VALUES (?, ?, ?) "
+            "ON CONFLICT (grp, field) DO UPDATE SET value = value + excluded.value RETURNING value",
+            (group, field, amount),
+        ).fetchone()
+        return row[0]
+
+    def counters(self, group: str) -> Dict[str, float]:
+        rows = self._conn().execute("SELECT field, value FROM counters WHERE grp = ?", (group,)).fetchall()
+        return dict(rows)
+
+    def append(self, key: str, item: Any, max_len: int):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("INSERT INTO lists (key, value) VALUES (?, ?)", (key, json.dumps(item, default=str)))
+            # Row ids are shared by all lists: trim below this list's max_len-th newest id
+            conn.execute(
+                "DELETE FROM lists WHERE key = ? AND id < "
+                "(SELECT id FROM lists WHERE key = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                (key, key, max_len - 1),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def items(self, key: str) -> List[Any]:
+        rows = self._conn().execute("SELECT value FROM lists WHERE key = ? ORDER BY id", (key,)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def get(self, key: str) -> Any:
+        row = self._conn().execute(
+            "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at >= ?)", (key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, json.dumps(value, default=str), time.time() + ttl if ttl else None),
+        )
+
+    def delete(self, key: str):
+        conn = self._conn()
+        conn.execute("DELETE FROM kv WHERE key = ?", (key,))
+        conn.execute("DELETE FROM hashes WHERE key = ?", (key,))
+
+    def hset(self, key: str, mapping: Dict[str, Any], ttl: Optional[float] = None):
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Expired hashes start over instead of inheriting stale fields
+            conn.execute("DELETE FROM hashes WHERE key = ? AND expires_at < ?", (key, now))
+            if ttl:
+                expires = now + ttl
+            else:
+                row = conn.execute("SELECT expires_at FROM hashes WHERE key = ? LIMIT 1", (key,)).fetchone()
+                expires = row[0] if row else None
+            conn.executemany(
+                "INSERT OR REPLACE INTO hashes (key, field, value, expires_at) VALUES (?, ?, ?, ?)",
+                [(key, field, json.dumps(value, default=str), expires) for field, value in mapping.items()],
+            )
+            if ttl:
+                conn.execute("UPDATE hashes SET expires_at = ? WHERE key = ?", (expires, key))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def hgetall(self, key: str) -> Dict[str, Any]:
+        rows = self._conn().execute(
+            "SELECT field, value FROM hashes WHERE key = ? AND (expires_at IS NULL OR expires_at >= ?) "
+            "ORDER BY rowid",
+            (key, time.time()),
+        ).fetchall()
+        return {field: json.loads(value) for field, value in rows}
+
+    def exists(self, key: str) -> bool:
+        row = self._conn().execute(
+            "SELECT 1 FROM hashes WHERE key = ? AND (expires_at IS NULL OR expires_at >= ?) LIMIT 1",
+            (key, time.time()),
+        ).fetchone()
+        return row is not None
+
+
+def _text(value) -> str:
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+def _pairs(reply) -> Dict:
+    """HGETALL reply as a dict (redis-py returns a dict, raw RESP a flat list)."""
+    if isinstance(reply, dict):
+        return {_text(k): v for k, v in reply.items()}
+    return {_text(reply[i]): reply[i + 1] for i in range(0, len(reply or []), 2)}
+
+
+class RedisSharedState(SharedState):
+    """
+    State in an external Redis-compatible store.
+
+    Only needs a client with execute_command() (redis-py, or the RESP client in
+    app/state_stub.py), so other stores speaking the Redis protocol plug in too.
+    """
+
+    backend = "redis"
+
+    def __init__(self, client, prefix: str = "aegis:"):
+        self.client = client
+        self.prefix = prefix
+
+    def _cmd(self, *args):
+        return self.client.execute_command(*args)
+
+    def incr(self, group: str, field: str, amount: float = 1) -> float:
+        return float(self._cmd("HINCRBYFLOAT", self.prefix + "counters:" + group, field, amount))
+
+    def counters(self, group: str) -> Dict[str, float]:
+        return {k: float(v) for k, v in _pairs(self._cmd("HGETALL", self.prefix + "counters:" + group)).items()}
+
+    def append(self, key: str, item: Any, max_len: int):
+        key = self.prefix + "list:" + key
+        self._cmd("RPUSH", key, json.dumps(item, default=str))
+        self._cmd("LTRIM", key, -max_len, -1)
+
+    def items(self, key: str) -> List[Any]:
+        return [json.loads(v) for v in self._cmd("LRANGE", self.prefix + "list:" + key, 0, -1) or []]
+
+    def get(self, key: str) -> Any:
+        value = self._cmd("GET", self.prefix + key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        args = ["SET", self.prefix + key, json.dumps(value, default=str)]
+        if ttl:
+            args += ["EX", max(1, math.ceil(ttl))]
+        self._cmd(*args)
+
+    def delete(self, key: str):
+        self._cmd("DEL", self.prefix + key, self.prefix + "hash:" + key)
+
+    def hset(self, key: str, mapping: Dict[str, Any], ttl: Optional[float] = None):
+        key = self.prefix + "hash:" + key
+        args = ["HSET", key]
+        for field, value in mapping.items():
+            args += [field, json.dumps(value, default=str)]
+        self._cmd(*args)
+        if ttl:
+            self._cmd("EXPIRE", key, max(1, math.ceil(ttl)))
+
+    def hgetall(self, key: str) -> Dict[str, Any]:
+        return {k: json.loads(v) for k, v in _pairs(self._cmd("HGETALL", self.prefix + "hash:" + key)).items()}
+
+    def exists(self, key: str) -> bool:
+        return bool(int(self._cmd("EXISTS", self.prefix + "hash:" + key)))
+
+
+def _redis_client(url: str):
+    """redis-py client if installed, else the minimal RESP client from app/state_stub.py."""
+    try:
+        import redis
+        return redis.Redis.from_url(url)
+    except ImportError:
+        from app.state_stub import RespClient
+        print("redis package not installed, using the minimal RESP client from app/state_stub.py")
+        return RespClient.from_url(url)
+
+
+_state = None
+_state_lock = threading.Lock()
+
+
+def get_shared_state() -> SharedState:
+    """Process-wide shared state for the configured backend."""
+    global _state
+    with _state_lock:
+        if _state is None:
+            if SHARED_BACKEND == "sqlite":
+                _state = SqliteSharedState(SHARED_STATE_PATH)
+            elif SHARED_BACKEND == "redis":
+                _state = RedisSharedState(_redis_client(REDIS_URL))
+            else:
+                if SHARED_BACKEND != "memory":
+                    print(f"Unknown AEGIS_SHARED_STATE '{SHARED_BACKEND}', using memory")
+                _state = MemorySharedState()
+        return _state
+
+
+def is_shared() -> bool:
+    """Whether state is shared beyond this process (any backend but memory)."""
+    return get_shared_state().backend != "memory"
+
+
+def count(group: str, field: str, amount: float = 1):
+    """Increment a shared counter; never raises into the caller."""
+    try:
+        get_shared_state().incr(group, field, amount)
+    except Exception as e:
+        print(f"Shared counter update failed: {e}")
@@ -0,0 +1,297 @@
+"""
+Local stand-in for the external shared-state store (Redis).
+
+Speaks enough of the Redis protocol (RESP2) for the redis backend in
+app/shared_state.py - counters, capped lists, values and hashes with expiry -
+so multi-host mode can be developed and tested without a Redis server. State
+lives in the stub process; point every Aegis worker at it with:
+
+    AEGIS_SHARED_STATE=redis
+    AEGIS_REDIS_URL=redis://127.0.0.1:6390/0
+
+Also provides RespClient, a minimal client used when redis-py is not installed.
+
+Usage:
+    python -m app.state_stub --port 6390
+
+Supported commands: PING, GET, SET [EX], DEL, EXISTS, EXPIRE, RPUSH, LTRIM,
+LRANGE, HSET, HGETALL, HINCRBYFLOAT, FLUSHALL.
+"""
+import argparse
+import select
+import socket
+import socketserver
+import threading
+import time
+from typing import Dict, List, Tuple
+from urllib.parse import urlparse
+
+
+class ReplyError(Exception):
+    """Error reply from the server ("-ERR ...")."""
+
+
+def encode_command(*args) -> bytes:
+    """RESP array of bulk strings."""
+    out = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if not isinstance(arg, bytes):
+            arg = str(arg).encode("utf-8")
+        out.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(out)
+
+
+def read_reply(f):
+    """Read one RESP value from a binary file object."""
+    line = f.readline()
+    if not line:
+        raise ConnectionError("connection closed")
+    kind, rest = line[:1], line[1:-2]
+    if kind == b"+":
+        return rest.decode("utf-8")
+    if kind == b"-":
+        raise ReplyError(rest.decode("utf-8"))
+    if kind == b":":
+        return int(rest)
+    if kind == b"$":
+        size = int(rest)
+        if size < 0:
+            return None
+        data = f.read(size + 2)
+        return data[:-2]
+    if kind == b"*":
+        size = int(rest)
+        if size < 0:
+            return None
+        return [read_reply(f) for _ in range(size)]
+    raise ConnectionError(f"bad reply type {kind!r}")
+
+
+class RespClient:
+    """Minimal thread-safe Redis client: execute_command() over one connection."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 6379, db: int = 0, timeout: float = 5.0):
+        self.address = (host, port)
+        self.db = db
+        self.timeout = timeout
+        self._sock = None
+        self._file = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_url(cls, url: str) -> "RespClient":
+        parsed = urlparse(url)
+        db = int(parsed.path.lstrip("/") or 0)
+        return cls(parsed.hostname or "127.0.0.1", parsed.port or 6379, db)
+
+    def _connect(self):
+        self._sock = socket.create_connection(self.address, timeout=self.timeout)
+        self._file = self._sock.makefile("rb")
+        if self.db:
+            self._sock.sendall(encode_command("SELECT", self.db))
+            read_reply(self._file)
+
+    def _stale(self) -> bool:
+        """True if the server closed the idle connection (readable, at EOF)."""
+        try:
+            readable, _, _ = select.select([self._sock], [], [], 0)
+            return bool(readable) and self._sock.recv(1, socket.MSG_PEEK) == b""
+        except (OSError, ValueError):
+            return True
+
+    def execute_command(self, *args):
+        with self._lock:
+            for attempt in (0, 1):
+                try:
+                    if self._sock is not None and self._stale():
+                        self.close()
+                    if self._sock is None:
+                        self._connect()
+                    self._sock.sendall(encode_command(*args))
+                except OSError:  # ConnectionError and socket.timeout included
+                    # Reconnect once (server restart, idle connection dropped); the
+                    # command did not reach the server, so resending is safe
+                    self.close()
+                    if attempt:
+                        raise
+                    continue
+                try:
+                    return read_reply(self._file)
+                except OSError:
+                    # The command is on the wire and may have run: never resend it
+                    # (HINCRBYFLOAT/RPUSH would apply twice)
+                    self.close()
+                    raise
+
+    def close(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = self._file = None
+
+
+class StoreState:
+    """In-memory keyspace with per-key expiry."""
+
+    def __init__(self):
+        self.data: Dict[bytes, object] = {}
+        self.expires: Dict[bytes, float] = {}
+        self.counts = {"commands": 0, "connections": 0}
+        self.lock = threading.Lock()
+
+    def _live(self, key: bytes):
+        expires = self.expires.get(key)
+        if expires is not None and expires < time.time():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return self.data.get(key)
+
+    def execute(self, args: List[bytes]) -> Tuple[str, object]:
+        """Run a command; returns (reply kind, value) for encode_reply()."""
+        name = args[0].upper().decode("utf-8")
+        with self.lock:
+            self.counts["commands"] += 1
+            if name == "PING":
+                return "+", "PONG"
+            if name == "SELECT":
+                return "+", "OK"  # Single keyspace
+            if name == "FLUSHALL":
+                self.data.clear()
+                self.expires.clear()
+                return "+", "OK"
+            if name == "GET":
+                value = self._live(args[1])
+                return "$", value if isinstance(value, bytes) or value is None else None
+            if name == "SET":
+                self.data[args[1]] = args[2]
+                self.expires.pop(args[1], None)
+                if len(args) >= 5 and args[3].upper() == b"EX":
+                    self.expires[args[1]] = time.time() + int(args[4])
+                return "+", "OK"
+            if name == "DEL":
+                removed = 0
+                for key in args[1:]:
+                    if self._live(key) is not None:
+                        removed += 1
+                    self.data.pop(key, None)
+                    self.expires.pop(key, None)
+                return ":", removed
+            if name == "EXISTS":
+                return ":", sum(1 for key in args[1:] if self._live(key) is not None)
+            if name == "EXPIRE":
+                if self._live(args[1]) is None:
+                    return ":", 0
+                self.expires[args[1]] = time.time() + int(args[2])
+                return ":", 1
+            if name == "RPUSH":
+                items = self._live(args[1])
+                if items is None:
+                    items = self.data[args[1]] = []
+                items.extend(args[2:])
+                return ":", len(items)
+            if name in ("LTRIM", "LRANGE"):
+                items = self._live(args[1]) or []
+                start, stop = int(args[2]), int(args[3])
+                n = len(items)
+                start = max(0, start + n if start < 0 else start)
+                stop = stop + n if stop < 0 else min(stop, n - 1)
+                window = items[start:stop + 1] if start <= stop else []
+                if name == "LRANGE":
+                    return "*", window
+                if args[1] in self.data:
+                    self.data[args[1]] = window
+                return "+", "OK"
+            if name == "HSET":
+                fields = self._live(args[1])
+                if fields is None:
+                    fields = self.data[args[1]] = {}
+                added = 0
+                for i in range(2, len(args) - 1, 2):
+                    added += args[i] not in fields
+                    fields[args[i]] = args[i + 1]
+                return ":", added
+            if name == "HGETALL":
+                fields = self._live(args[1]) or {}
+                return "*", [x for pair in fields.items() for x in pair]
+            if name == "HINCRBYFLOAT":
+                fields = self._live(args[1])
+                if fields is None:
+                    fields = self.data[args[1]] = {}
+                value = float(fields.get(args[2], b"0")) + float(args[3])
+                fields[args[2]] = repr(value).encode("utf-8")
+                return "$", fields[args[2]]
+            return "-", f"ERR unknown command '{name}'"
+
+
+def encode_reply(kind: str, value) -> bytes:
+    if kind in ("+", "-"):
+        return f"{kind}{value}\r\n".encode("utf-8")
+    if kind == ":":
+        return b":%d\r\n" % value
+    if kind == "$":
+        return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+    return b"*%d\r\n" % len(value) + b"".join(encode_reply("$", v) for v in value)
+
+
+class StateStubHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        state: StoreState = self.server.state
+        with state.lock:
+            state.counts["connections"] += 1
+        while True:
+            try:
+                args = read_reply(self.rfile)
+            except (ConnectionError, OSError, ValueError):
+                return
+            if not isinstance(args, list) or not args:
+                return
+            try:
+                reply = encode_reply(*state.execute(args))
+            except (IndexError, ValueError) as e:
+                reply = encode_reply("-", f"ERR {e}")
+            self.wfile.write(reply)
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def start_stub(port: int = 0, host: str = "127.0.0.1") -> socketserver.ThreadingTCPServer:
+    """
+    Start the store stand-in on a background thread.
+
+    Args:
+        port: Port to listen on (0 picks a free port; see server.server_address)
+        host: Interface to bind
+
+    Returns:
+        The running server (call shutdown() to stop it)
+    """
+    server = _Server((host, port), StateStubHandler)
+    server.state = StoreState()
+    threading.Thread(target=server.serve_forever, name="aegis-state-stub", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Redis stand-in for Aegis shared state")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    args = parser.parse_args()
+
+    server = start_stub(args.port, args.host)
+    host, port = server.server_address
+    print(f"State stub listening on {host}:{port}")
+    print(f"  AEGIS_SHARED_STATE=redis AEGIS_REDIS_URL=redis://{host}:{port}/0")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Structural (keyed) diff for YAML and JSON config files.
+
+Instead of comparing lines, both versions of the file are parsed and walked
+as nested mappings. The result lists added, removed and changed keys by
+dotted path (e.g. "featureX.percentage") with old and new values, which lets
+risk scoring target specific keys instead of regex-scanning diff text.
+
+Returns None for files that are not YAML/JSON or that fail to parse - callers
+fall back to the line-based diff in that case.
+"""
+import json
+from typing import Any, Dict, List, Optional
+
+# Cap on reported entries per category so huge generated files stay cheap to store
+MAX_ENTRIES = 200
+
+
+def _detect_format(file_path: str) -> Optional[str]:
+    """Return "yaml", "json" or None based on the file extension."""
+    lower = file_path.lower()
+    if lower.endswith((".yaml", ".yml")):
+        return "yaml"
+    if lower.endswith(".json"):
+        return "json"
+    return None
+
+
+def _parse(text: str, fmt: str) -> Any:
+    """Parse YAML/JSON text; empty text parses to an empty mapping."""
+    if not text.strip():
+        return {}
+    if fmt == "yaml":
+        import yaml
+        return yaml.safe_load(text)
+    return json.loads(text)
+
+
+def _walk(old: Any, new: Any, path: str, out: Dict[str, List[Dict]]):
+    """Recursively compare two parsed documents, appending entries to out."""
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key in old:
+            child = f"{path}.{key}" if path else str(key)
+            if key not in new:
+                out["removed"].append({"path": child, "old": old[key]})
+            else:
+                _walk(old[key], new[key], child, out)
+        for key in new:
+            if key not in old:
+                child = f"{path}.{key}" if path else str(key)
+                out["added"].append({"path": child, "new": new[key]})
+        return
+
+    if isinstance(old, list) and isinstance(new, list) and len(old) == len(new):
+        for i, (o, n) in enumerate(zip(old, new)):
+            _walk(o, n, f"{path}[{i}]", out)
+        return
+
+    # Scalars, type changes, and lists of different length are reported whole
+    if old != new or type(old) is not type(new):
+        out["changed"].append({"path": path, "old": old, "new": new})
+
+
+def structural_diff(file_path: str, old_text: str, new_text: str) -> Optional[Dict]:
+    """
+    Compute a keyed diff between two versions of a YAML/JSON file.
+
+    Args:
+        file_path: Path of the file (extension selects the parser)
+        old_text: Original file contents ("" if the file is new)
+        new_text: Proposed file contents
+
+    Returns:
+        Dictionary with keys, or None if the file is not YAML/JSON or fails to parse:
+        - format: str - "yaml" or "json"
+        - added: List[Dict] - {"path", "new"} for keys only in the new version
+        - removed: List[Dict] - {"path", "old"} for keys only in the old version
+        - changed: List[Dict] - {"path", "old", "new"} for keys whose value changed
+        - truncated: bool - True if any category hit MAX_ENTRIES
+    """
+    fmt = _detect_format(file_path)
+    if fmt is None:
+        return None
+    try:
+        old = _parse(old_text, fmt)
+        new = _parse(new_text, fmt)
+    except Exception:
+        return None
+
+    out = {"added": [], "removed": [], "changed": []}
+    _walk(old, new, "", out)
+
+    truncated = any(len(v) > MAX_ENTRIES for v in out.values())
+    result = {"format": fmt}
+    for kind, entries in out.items():
+        result[kind] = entries[:MAX_ENTRIES]
+    result["truncated"] = truncated
+    return result
+
+
+def get_change(sdiff: Optional[Dict], path: str) -> Optional[Dict]:
+    """
+    Look up the entry for a key path in a structural diff.
+
+    Returns:
+        Dict with "kind" ("added"/"removed"/"changed"), "old" and "new", or None
+    """
+    if not sdiff:
+        return None
+    for kind in ("changed", "added", "removed"):
+        for entry in sdiff.get(kind, []):
+            if entry["path"] == path:
+                return {"kind": kind, "old": entry.get("old"), "new": entry.get("new")}
+    return None
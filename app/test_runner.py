@@ -0,0 +1,244 @@
+"""
+Sandbox test execution for Aegis: pytest with the Aegis plugin, optionally
+split across several worker processes.
+
+Tests are divided into shards, one pytest process per shard, all running in
+the same sandbox directory and each under the limits in
+app/sandbox_limits.py. When per-test durations are known (from the baseline
+run, app/baseline_cache.py), tests are assigned longest first to the least
+loaded shard so the shards finish together; tests added since are spread by
+a hash of their node id. Small suites, and suites whose durations are not
+known yet, run in a single process, since each extra pytest process costs its
+own startup. The sandbox scheduler's default concurrency is divided by
+AEGIS_TEST_WORKERS so parallel shards do not oversubscribe the host.
+
+Two test modes:
+- "fail_fast": stop at the first new failure; the failing shard creates a
+  stop file and every other shard stops after its current test. The verdict
+  is "blocked" either way, so the rest of the suite is not worth waiting for
+- "full": run the whole suite to get the complete failure list
+
+The per-test report from app/pytest_plugin.py is also reduced by
+compact_results() to what the risk card and history keep: outcome counts
+plus one [nodeid, outcome, duration, message] row per test.
+
+Configuration (environment variables):
+- AEGIS_TEST_WORKERS: pytest processes per sandbox (default: CPU count, at most 4; 1 = serial)
+- AEGIS_TEST_PARALLEL_MIN_SECONDS: known suite duration below which tests run serially (default 2)
+- AEGIS_TEST_FAIL_FAST: "0" makes "full" the default test mode (default fail_fast)
+"""
+import heapq
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from app.sandbox_limits import run_limited
+
+TEST_MODES = ("fail_fast", "full")
+DEFAULT_TEST_MODE = "fail_fast" if os.getenv("AEGIS_TEST_FAIL_FAST", "1") != "0" else "full"
+TEST_WORKERS = int(os.getenv("AEGIS_TEST_WORKERS", str(min(4, os.cpu_count() or 1))))
+PARALLEL_MIN_SECONDS = float(os.getenv("AEGIS_TEST_PARALLEL_MIN_SECONDS", "2"))
+
+OUTCOMES = ("passed", "failed", "error", "skipped")
+_MESSAGE_CHARS = 200
+
+_PROJECT_ROOT = Path(__file__).parent.parent
+
+
+def resolve_test_mode(test_mode: Optional[str]) -> str:
+    """Validated test mode, DEFAULT_TEST_MODE when not given."""
+    if test_mode is None:
+        return DEFAULT_TEST_MODE
+    if test_mode not in TEST_MODES:
+        raise ValueError(f"test_mode must be one of {', '.join(TEST_MODES)}")
+    return test_mode
+
+
+def compact_results(report: Optional[Dict]) -> Optional[Dict]:
+    """
+    Per-test results in the compact form stored on the risk card.
+
+    Args:
+        report: Per-test report written by app/pytest_plugin.py (or merged shards)
+
+    Returns:
+        None without a report, else dictionary with keys:
+        - passed / failed / error / skipped: int - Test counts per outcome
+        - duration: float - Seconds spent in the tests
+        - stopped_early: bool - Fail-fast ended the run
+        - tests: list - [nodeid, outcome, duration] rows, failures first, then
+          slowest first; failures and errors carry a short message as a 4th item
+    """
+    if report is None:
+        return None
+    tests = report.get("tests", {})
+    counts = {outcome: 0 for outcome in OUTCOMES}
+    rows = []
+    for nodeid, result in tests.items():
+        outcome = result["outcome"]
+        counts[outcome] = counts.get(outcome, 0) + 1
+        row = [nodeid, outcome, round(result["duration"], 3)]
+        if outcome in ("failed", "error") and result.get("message"):
+            row.append((result["message"].strip().splitlines() or [""])[0][:_MESSAGE_CHARS])
+        rows.append(row)
+    rows.sort(key=lambda row: (row[1] not in ("failed", "error"), -row[2], row[0]))
+    return dict(counts, duration=report.get("duration", 0.0), stopped_early=report.get("stopped_early", False),
+                tests=rows)
+
+
+def plan_shards(durations: Optional[Dict[str, float]], workers: int = TEST_WORKERS) -> Dict:
+    """
+    Decide how many shards to run and which tests go where.
+
+    Args:
+        durations: {nodeid: seconds} from a previous run, or None if unknown
+            (unknown durations run in a single shard)
+        workers: Largest number of shards
+
+    Returns:
+        {"count": int, "assign": {nodeid: shard index}}
+    """
+    # Without durations the suite size is unknown: run serially rather than pay
+    # several pytest startups for what may be a handful of tests
+    if not durations or sum(durations.values()) < PARALLEL_MIN_SECONDS:
+        return {"count": 1, "assign": {}}
+    workers = min(max(1, workers), len(durations))
+    if workers == 1:
+        return {"count": 1, "assign": {}}
+    # Longest processing time first onto the least loaded shard
+    loads = [(0.0, index) for index in range(workers)]
+    assign = {}
+    for nodeid in sorted(durations, key=lambda n: (-durations[n], n)):
+        load, index = heapq.heappop(loads)
+        assign[nodeid] = index
+        heapq.heappush(loads, (load + durations[nodeid], index))
+    return {"count": workers, "assign": assign}
+
+
+def _merge(results: List[Dict]) -> Dict:
+    """Combine per-shard run_limited() results and reports into one."""
+    if len(results) == 1:
+        return results[0]
+    reports = [r["report"] for r in results if r["report"] is not None]
+    codes = [r["returncode"] for r in results]
+    ran = [c for c in codes if c != 5]  # 5 = no tests selected in this shard
+    if not ran:
+        returncode = 5
+    elif any(c not in (0, 1) for c in ran):
+        returncode = next(c for c in ran if c not in (0, 1))
+    else:
+        returncode = max(ran)
+    # Output tail from the shards whose own tests failed; shards stopped by another
+    # shard's fail-fast also exit 1 but only say "New failure in another shard"
+    failing = [r for r in results if r["report"] is not None and any(
+        t["outcome"] in ("failed", "error") for t in r["report"]["tests"].values())]
+    failing = failing or [r for r in results if r["returncode"] not in (0, 5)] or results
+    usages = [r["usage"] for r in results]
+    usage = {
+        "wall_seconds": max(u["wall_seconds"] for u in usages),
+        "disk_bytes": max(u["disk_bytes"] for u in usages),
+        "output_bytes": sum(u["output_bytes"] for u in usages),
+        "limit_hit": next((r["limit_hit"] for r in results if r["limit_hit"]), None),
+        "limits": usages[0]["limits"],
+        "enforced_by": usages[0]["enforced_by"],
+    }
+    for key in ("cpu_user_seconds", "cpu_system_seconds", "cpu_seconds", "io_write_bytes"):
+        if all(key in u for u in usages):
+            usage[key] = round(sum(u[key] for u in usages), 3)
+    for key in ("max_rss_mb", "cgroup_peak_mb"):
+        if any(key in u for u in usages):
+            usage[key] = max(u.get(key, 0) for u in usages)
+    report = None
+    if len(reports) == len(results):
+        report = {
+            "tests": {nodeid: result for r in reports for nodeid, result in r["tests"].items()},
+            "exitstatus": returncode,
+            "stopped_early": any(r["stopped_early"] for r in reports),
+            "memory_error": any(r.get("memory_error") for r in reports),
+            "duration": max(r["duration"] for r in reports),
+        }
+    return {
+        "returncode": returncode,
+        "stdout": "\n".join(r["stdout"] for r in failing)[-400:],
+        "stderr": "\n".join(r["stderr"] for r in failing if r["stderr"])[-400:],
+        "limit_hit": usage["limit_hit"],
+        "usage": usage,
+        "report": report,
+    }
+
+
+def run_suite(work: str, order: Optional[Dict[str, int]] = None, known_failures: Optional[List[str]] = None,
+              test_mode: str = "full", durations: Optional[Dict[str, float]] = None,
+              workers: int = TEST_WORKERS, limits: Optional[Dict] = None, log=None) -> Dict:
+    """
+    Run pytest in a sandbox directory with the Aegis plugin.
+
+    Args:
+        work: Sandbox directory
+        order: {nodeid: rank}; lower ranks run first in each shard
+        known_failures: Node ids that do not trigger fail-fast
+        test_mode: "fail_fast" or "full"
+        durations: {nodeid: seconds} used to balance the shards
+        workers: Largest number of pytest processes
+        limits: default_limits() overrides for each process
+        log: Live log the output is streamed to (app/sandbox_logs.py)
+
+    Returns:
+        run_limited() result (usage summed over the shards, plus "workers") and
+        "report": the per-test report, or None if a shard did not write one
+        (pytest missing, plugin failed to load, process killed)
+    """
+    plan = plan_shards(durations, workers)
+    with tempfile.TemporaryDirectory(prefix="aegis-pytest-") as io_dir:
+        base_env = {
+            "AEGIS_FAIL_FAST": "1" if test_mode == "fail_fast" else "0",
+            "AEGIS_STOP_FILE": os.path.join(io_dir, "stop"),
+            "PYTHONPATH": os.pathsep.join(filter(None, [str(_PROJECT_ROOT), os.environ.get("PYTHONPATH")])),
+        }
+        for name, env_var, value in (("order.json", "AEGIS_TEST_ORDER", order),
+                                     ("known.json", "AEGIS_KNOWN_FAILURES", known_failures)):
+            if value:
+                base_env[env_var] = os.path.join(io_dir, name)
+                with open(base_env[env_var], "w") as f:
+                    json.dump(value, f)
+        # Verbose output has a line per test, so a live log shows progress as it happens
+        cmd = ["pytest", "-v" if log is not None else "-q", "-p", "app.pytest_plugin"]
+        if plan["count"] > 1:
+            cmd += ["-p", "no:cacheprovider"]  # Shards share the directory
+
+        results: List[Optional[Dict]] = [None] * plan["count"]
+
+        def run_shard(index: int):
+            env = dict(base_env, AEGIS_TEST_REPORT=os.path.join(io_dir, f"report-{index}.json"))
+            if plan["count"] > 1:
+                env["AEGIS_TEST_SHARD"] = os.path.join(io_dir, f"shard-{index}.json")
+                with open(env["AEGIS_TEST_SHARD"], "w") as f:
+                    json.dump({"index": index, "count": plan["count"], "assign": plan["assign"]}, f)
+            result = run_limited(cmd, cwd=work, limits=limits, env=env, log=log,
+                                 log_source=f"shard-{index}" if plan["count"] > 1 else "")
+            try:
+                with open(env["AEGIS_TEST_REPORT"]) as f:
+                    result["report"] = json.load(f)
+            except (OSError, ValueError):
+                result["report"] = None
+            if result["limit_hit"] is None and result["report"] and result["report"].get("memory_error"):
+                # The address space rlimit makes allocations raise MemoryError in the test
+                result["limit_hit"] = result["usage"]["limit_hit"] = "memory"
+            results[index] = result
+
+        start = time.time()
+        threads = [threading.Thread(target=run_shard, args=(i,), daemon=True) for i in range(1, plan["count"])]
+        for thread in threads:
+            thread.start()
+        run_shard(0)
+        for thread in threads:
+            thread.join()
+        merged = _merge(results)
+        if plan["count"] > 1:
+            merged["usage"]["wall_seconds"] = round(time.time() - start, 3)
+        merged["usage"]["workers"] = plan["count"]
+    return merged
@@ -0,0 +1,274 @@
+"""
+Durable webhook outbox for Aegis.
+
+Webhook events are written to a `webhook_outbox` table in the history database
+and delivered by a background dispatcher, so a slow or failing receiver never
+adds latency to /propose_action and events survive restarts.
+
+The dispatcher:
+- delivers due events concurrently (bounded worker pool)
+- retries failures with jittered exponential backoff, then marks them dead
+- optionally batches several events for the same URL into one POST
+- leases rows while sending, so a crash mid-delivery re-sends them later
+
+Configuration (environment variables):
+- AEGIS_WEBHOOK_WORKERS: concurrent deliveries (default 4)
+- AEGIS_WEBHOOK_MAX_ATTEMPTS: attempts before an event is marked dead (default 8)
+- AEGIS_WEBHOOK_BATCH_SIZE: max events per POST for batching subscriptions (default 20)
+- AEGIS_WEBHOOK_RETENTION_DAYS: how long delivered/dead events are kept (default 7)
+"""
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+from app import http_client
+from app.history import DB_PATH
+
+WORKERS = int(os.getenv("AEGIS_WEBHOOK_WORKERS", "4"))
+MAX_ATTEMPTS = int(os.getenv("AEGIS_WEBHOOK_MAX_ATTEMPTS", "8"))
+BATCH_SIZE = int(os.getenv("AEGIS_WEBHOOK_BATCH_SIZE", "20"))
+RETENTION_DAYS = float(os.getenv("AEGIS_WEBHOOK_RETENTION_DAYS", "7"))
+
+BACKOFF_BASE = 2.0  # seconds, doubled per attempt
+BACKOFF_CAP = 600.0
+LEASE_SECONDS = 60  # a "sending" row is retried after this if its delivery never finished
+POLL_INTERVAL = 1.0
+CLAIM_LIMIT = 200
+
+
+def init_outbox():
+    """Create the outbox table (idempotent)."""
+    conn = sqlite3.connect(DB_PATH)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS webhook_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            url TEXT,
+            event TEXT,
+            payload TEXT,
+            batch INTEGER DEFAULT 0,
+            status TEXT DEFAULT 'pending',
+            attempts INTEGER DEFAULT 0,
+            next_attempt_at REAL,
+            last_error TEXT,
+            created_at REAL,
+            delivered_at REAL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON webhook_outbox (status, next_attempt_at)")
+    conn.commit()
+    conn.close()
+
+
+def enqueue(deliveries: List[Dict]) -> int:
+    """
+    Add events to the outbox and wake the dispatcher.
+
+    Args:
+        deliveries: Dicts with url, event, payload (dict) and batch (bool)
+
+    Returns:
+        Number of events enqueued
+    """
+    if not deliveries:
+        return 0
+    now = time.time()
+    conn = sqlite3.connect(DB_PATH)
+    conn.executemany(
+        "INSERT INTO webhook_outbox (url, event, payload, batch, status, next_attempt_at, created_at) "
+        "VALUES (?, ?, ?, ?, 'pending', ?, ?)",
+        [(d["url"], d["event"], json.dumps(d["payload"]), int(bool(d.get("batch"))), now, now) for d in deliveries],
+    )
+    conn.commit()
+    conn.close()
+    get_dispatcher().wake()
+    return len(deliveries)
+
+
+def _claim_due(limit: int = CLAIM_LIMIT) -> List[tuple]:
+    """Lease due events (pending, or sending with an expired lease) for delivery."""
+    now = time.time()
+    conn = sqlite3.connect(DB_PATH, timeout=10)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        rows = conn.execute(
+            "SELECT id, url, event, payload, batch, attempts FROM webhook_outbox "
+            "WHERE status IN ('pending', 'sending') AND next_attempt_at <= ? ORDER BY id LIMIT ?",
+            (now, limit),
+        ).fetchall()
+        if rows:
+            conn.executemany(
+                "UPDATE webhook_outbox SET status = 'sending', next_attempt_at = ? WHERE id = ?",
+                [(now + LEASE_SECONDS, row[0]) for row in rows],
+            )
+        conn.commit()
+        return rows
+    finally:
+        conn.close()
+
+
+def _mark_delivered(ids: List[int]):
+    conn = sqlite3.connect(DB_PATH, timeout=10)
+    conn.executemany(
+        "UPDATE webhook_outbox SET status = 'delivered', delivered_at = ?, last_error = NULL WHERE id = ?",
+        [(time.time(), i) for i in ids],
+    )
+    conn.commit()
+    conn.close()
+
+
+def _mark_failed(rows: List[tuple], error: str):
+    now = time.time()
+    updates = []
+    for row in rows:
+        attempts = row[5] + 1
+        if attempts >= MAX_ATTEMPTS:
+            updates.append(("dead", attempts, now, error, row[0]))
+        else:
+            delay = random.uniform(0.5, 1.0) * min(BACKOFF_CAP, BACKOFF_BASE * (2 ** (attempts - 1)))
+            updates.append(("pending", attempts, now + delay, error, row[0]))
+    conn = sqlite3.connect(DB_PATH, timeout=10)
+    conn.executemany(
+        "UPDATE webhook_outbox SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+        updates,
+    )
+    conn.commit()
+    conn.close()
+
+
+def _purge_old():
+    cutoff = time.time() - RETENTION_DAYS * 86400
+    conn = sqlite3.connect(DB_PATH, timeout=10)
+    conn.execute("DELETE FROM webhook_outbox WHERE status IN ('delivered', 'dead') AND created_at < ?", (cutoff,))
+    conn.commit()
+    conn.close()
+
+
+def _deliver(url: str, rows: List[tuple]):
+    """POST one event (or a batch of events) to url and record the outcome."""
+    payloads = [json.loads(row[3]) for row in rows]
+    if len(rows) == 1 and not rows[0][4]:
+        body, event = payloads[0], rows[0][2]
+    else:
+        body, event = {"event": "batch", "events": payloads}, "batch"
+    headers = {"X-Aegis-Event": event, "X-Aegis-Delivery": uuid.uuid4().hex}
+    try:
+        response = http_client.post(url, json=body, headers=headers, service=f"webhook:{urlparse(url).netloc}",
+                                    timeout=(3.05, 10), retries=0)
+        response.raise_for_status()
+    except Exception as e:
+        _mark_failed(rows, f"{type(e).__name__}: {str(e)[:200]}")
+        return
+    _mark_delivered([row[0] for row in rows])
+
+
+class OutboxDispatcher:
+    """Background thread that drains the outbox."""
+
+    def __init__(self, workers: int = WORKERS, batch_size: int = BATCH_SIZE):
+        self.batch_size = max(1, batch_size)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="aegis-webhook")
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="aegis-webhook-dispatcher", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def wake(self):
+        self.start()
+        self._wake.set()
+
+    def _run(self):
+        last_purge = 0.0
+        while not self._stop.is_set():
+            try:
+                self.dispatch_once()
+                if time.time() - last_purge > 3600:
+                    _purge_old()
+                    last_purge = time.time()
+            except Exception as e:
+                print(f"Webhook dispatcher error: {e}")
+            self._wake.wait(POLL_INTERVAL)
+            self._wake.clear()
+
+    def dispatch_once(self, wait: bool = False) -> int:
+        """
+        Claim due events and hand them to the worker pool.
+
+        Args:
+            wait: Block until this round's deliveries finish
+
+        Returns:
+            Number of events claimed
+        """
+        rows = _claim_due()
+        futures = []
+        by_url: Dict[str, List[tuple]] = {}
+        for row in rows:
+            if row[4]:
+                by_url.setdefault(row[1], []).append(row)
+            else:
+                futures.append(self._executor.submit(_deliver, row[1], [row]))
+        for url, url_rows in by_url.items():
+            for i in range(0, len(url_rows), self.batch_size):
+                futures.append(self._executor.submit(_deliver, url, url_rows[i:i + self.batch_size]))
+        if wait:
+            for future in futures:
+                future.result()
+        return len(rows)
+
+
+def outbox_stats() -> Dict[str, int]:
+    """Event counts by delivery status, for /metrics."""
+    conn = sqlite3.connect(DB_PATH)
+    rows = conn.execute("SELECT status, COUNT(*) FROM webhook_outbox GROUP BY status").fetchall()
+    conn.close()
+    return dict(rows)
+
+
+def get_events(status: Optional[str] = None, limit: int = 50) -> List[Dict]:
+    """Most recent outbox events, optionally filtered by status (e.g. 'dead')."""
+    conn = sqlite3.connect(DB_PATH)
+    query = "SELECT id, url, event, status, attempts, last_error, created_at, delivered_at FROM webhook_outbox"
+    params = []
+    if status:
+        query += " WHERE status = ?"
+        params.append(status)
+    query += " ORDER BY id DESC LIMIT ?"
+    params.append(limit)
+    rows = conn.execute(query, params).fetchall()
+    conn.close()
+    keys = ("id", "url", "event", "status", "attempts", "last_error", "created_at", "delivered_at")
+    return [dict(zip(keys, row)) for row in rows]
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher() -> OutboxDispatcher:
+    """Process-wide outbox dispatcher (started on first use)."""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = OutboxDispatcher()
+        return _dispatcher
+
+
+init_outbox()
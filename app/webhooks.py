@@ -1,46 +1,104 @@
-"""Webhook integration system for Aegis."""
-import requests
+"""
+Webhook integration system for Aegis.
+
+Events are matched against the configured subscriptions and written to the
+durable outbox (app/webhook_outbox.py); a background dispatcher delivers them,
+so sending a webhook never blocks the request path.
+
+Subscriptions:
+- AEGIS_WEBHOOK_URL: one URL that receives every event
+- AEGIS_WEBHOOKS: JSON list (inline, or a path to a JSON file) of subscriptions:
+    [{"url": "https://...", "statuses": ["blocked"], "events": ["risk_card"],
+      "min_risk_score": 50, "batch": true}]
+  Every filter key is optional. With "batch": true, events waiting for the same
+  URL are delivered together as {"event": "batch", "events": [...]}.
+"""
+import json
 import os
-from typing import Dict, Optional
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+
+@lru_cache(maxsize=1)
+def _configured_subscriptions() -> tuple:
+    subscriptions = []
+    url = os.getenv("AEGIS_WEBHOOK_URL")
+    if url:
+        subscriptions.append({"url": url})
+
+    raw = os.getenv("AEGIS_WEBHOOKS", "").strip()
+    if raw:
+        try:
+            if not raw.startswith("["):
+                with open(raw) as f:
+                    raw = f.read()
+            for sub in json.loads(raw):
+                if isinstance(sub, dict) and sub.get("url"):
+                    subscriptions.append(sub)
+        except Exception as e:
+            print(f"Invalid AEGIS_WEBHOOKS config (ignored): {e}")
+    return tuple(subscriptions)
 
 
-def send_webhook(risk_card: dict, webhook_url: Optional[str] = None) -> bool:
+def get_subscriptions() -> List[Dict]:
+    """Configured webhook subscriptions."""
+    return list(_configured_subscriptions())
+
+
+def matches(subscription: Dict, payload: Dict) -> bool:
+    """Check a payload against a subscription's filters."""
+    statuses = subscription.get("statuses")
+    if statuses and payload["status"] not in statuses:
+        return False
+    events = subscription.get("events")
+    if events and payload["event"] not in events:
+        return False
+    if payload["risk_score"] < subscription.get("min_risk_score", 0):
+        return False
+    return True
+
+
+def build_payload(risk_card: dict, event: str = "risk_card") -> Dict:
+    """Compact webhook payload for a risk card."""
+    checks = risk_card.get("checks", [])
+    return {
+        "event": event,
+        "request_id": risk_card.get("request_id"),
+        "status": risk_card.get("status", "unknown"),
+        "risk_score": risk_card.get("risk_score", 0),
+        "failed_checks": [name for name, ok, msg in checks if not ok],
+        "explanation": risk_card.get("explanation", ""),
+        "timestamp": risk_card.get("ts", 0)
+    }
+
+
+def send_webhook(risk_card: dict, webhook_url: Optional[str] = None, event: str = "risk_card") -> bool:
     """
-    Send webhook notification about a risk card.
-    
+    Queue webhook notifications about a risk card.
+
     Args:
         risk_card: Risk card dictionary to send
-        webhook_url: Optional URL (defaults to AEGIS_WEBHOOK_URL env var)
-        
+        webhook_url: Optional URL (defaults to the configured subscriptions)
+        event: Event type ("risk_card", or "explanation_ready" for deferred explanations)
+
     Returns:
-        True if webhook sent successfully, False otherwise
-        
+        True if at least one delivery was queued, False otherwise
+
     Side effects:
-        Makes HTTP POST request to webhook URL
+        Inserts rows into the webhook outbox; delivery happens in the background
     """
-    if webhook_url is None:
-        webhook_url = os.getenv("AEGIS_WEBHOOK_URL")
-    
-    if not webhook_url:
+    subscriptions = [{"url": webhook_url}] if webhook_url else get_subscriptions()
+    if not subscriptions:
         return False
-    
+
     try:
-        status = risk_card.get("status", "unknown")
-        risk_score = risk_card.get("risk_score", 0)
-        checks = risk_card.get("checks", [])
-        failed = [name for name, ok, msg in checks if not ok]
-        
-        payload = {
-            "status": status,
-            "risk_score": risk_score,
-            "failed_checks": failed,
-            "explanation": risk_card.get("explanation", ""),
-            "timestamp": risk_card.get("ts", 0)
-        }
-        
-        response = requests.post(webhook_url, json=payload, timeout=5)
-        response.raise_for_status()
-        return True
-    except Exception:
+        payload = build_payload(risk_card, event)
+        deliveries = [
+            {"url": sub["url"], "event": event, "payload": payload, "batch": sub.get("batch", False)}
+            for sub in subscriptions if matches(sub, payload)
+        ]
+        from app.webhook_outbox import enqueue
+        return enqueue(deliveries) > 0
+    except Exception as e:
+        print(f"Webhook enqueue failed: {e}")
         return False
-
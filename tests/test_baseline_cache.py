@@ -0,0 +1,35 @@
+from app.baseline_cache import compare
+
+
+def _tests(**outcomes):
+    return {f"tests/test_x.py::{name}": {"outcome": outcome, "duration": 0.1} for name, outcome in outcomes.items()}
+
+
+def test_compare_classifies_failures_against_the_baseline():
+    baseline = _tests(ok="passed", broken="failed", flaky_setup="error", fixed="failed")
+    candidate = _tests(ok="failed", broken="failed", flaky_setup="error", fixed="passed")
+    result = compare(baseline, candidate)
+    assert result["new_failures"] == ["tests/test_x.py::ok"]
+    assert sorted(result["preexisting_failures"]) == ["tests/test_x.py::broken", "tests/test_x.py::flaky_setup"]
+    assert result["fixed"] == ["tests/test_x.py::fixed"]
+    assert result["not_run"] == 0
+
+
+def test_compare_new_tests_and_tests_not_run():
+    baseline = _tests(a="passed", b="passed", c="failed")
+    candidate = _tests(a="passed", added="error")  # Fail-fast stopped before b and c
+    result = compare(baseline, candidate)
+    assert result["new_failures"] == ["tests/test_x.py::added"]
+    assert result["preexisting_failures"] == []
+    assert result["fixed"] == []
+    assert result["not_run"] == 2
+
+
+def test_compare_skipped_baseline_failure_is_not_fixed():
+    result = compare(_tests(a="failed"), _tests(a="skipped"))
+    assert result == {"new_failures": [], "preexisting_failures": [], "fixed": [], "not_run": 0}
+
+
+def test_compare_empty_baseline_makes_every_failure_new():
+    result = compare({}, _tests(a="failed", b="passed"))
+    assert result["new_failures"] == ["tests/test_x.py::a"]
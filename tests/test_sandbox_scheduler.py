@@ -0,0 +1,167 @@
+import threading
+import time
+
+import pytest
+
+from app.sandbox_scheduler import SandboxBusy, SandboxCancelled, SandboxScheduler
+
+
+def _wait_for(predicate, timeout=2.0):
+    deadline = time.time() + timeout
+    while not predicate():
+        assert time.time() < deadline, "condition not reached"
+        time.sleep(0.005)
+
+
+def _acquire_in_thread(scheduler, client, results, on_cancel=None):
+    """Start acquire() on a thread; its outcome lands in results[client]."""
+    def run():
+        try:
+            scheduler.acquire(client, on_cancel)
+            results.setdefault(client, []).append("granted")
+        except (SandboxBusy, SandboxCancelled) as e:
+            results.setdefault(client, []).append(e)
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_admits_up_to_max_concurrent_then_queues():
+    scheduler = SandboxScheduler(max_concurrent=2, max_queue=1, queue_timeout=5)
+    assert scheduler.acquire("a") == 0.0
+    assert scheduler.acquire("b") == 0.0
+    results = {}
+    thread = _acquire_in_thread(scheduler, "c", results)
+    _wait_for(lambda: scheduler.stats()["queued"] == 1)
+    scheduler.release("a")
+    thread.join(2)
+    assert results == {"c": ["granted"]}
+    stats = scheduler.stats()
+    assert (stats["running"], stats["queued"], stats["admitted"], stats["waited"]) == (2, 0, 3, 1)
+
+
+def test_full_queue_rejects_with_503_and_retry_after():
+    scheduler = SandboxScheduler(max_concurrent=1, max_queue=0, queue_timeout=5)
+    scheduler.acquire("a")
+    with pytest.raises(SandboxBusy) as exc:
+        scheduler.acquire("b")
+    assert exc.value.status_code == 503
+    assert exc.value.retry_after >= 1
+    assert scheduler.stats()["rejected_full"] == 1
+
+
+def test_retry_after_grows_with_the_queue():
+    scheduler = SandboxScheduler(max_concurrent=1, max_queue=4, queue_timeout=5)
+    scheduler.acquire("a")
+    empty = scheduler._retry_after()
+    results = {}
+    for client in ("b", "c", "d"):
+        _acquire_in_thread(scheduler, client, results)
+    _wait_for(lambda: scheduler.stats()["queued"] == 3)
+    assert scheduler._retry_after() > empty
+    for client in ("a", "b", "c", "d"):
+        scheduler.release(client)  # Each release grants the next waiter in arrival order
+    assert scheduler.stats()["running"] == 0
+
+
+def test_client_quota_rejects_with_429():
+    scheduler = SandboxScheduler(max_concurrent=4, max_queue=4, queue_timeout=5, client_quota=1)
+    scheduler.acquire("a")
+    with pytest.raises(SandboxBusy) as exc:
+        scheduler.acquire("a")
+    assert exc.value.status_code == 429
+    assert scheduler.acquire("b") == 0.0  # Other clients are unaffected
+
+
+def test_queue_timeout_leaves_the_queue():
+    scheduler = SandboxScheduler(max_concurrent=1, max_queue=2, queue_timeout=0.05)
+    scheduler.acquire("a")
+    with pytest.raises(SandboxBusy) as exc:
+        scheduler.acquire("b")
+    assert exc.value.status_code == 503
+    stats = scheduler.stats()
+    assert (stats["queued"], stats["timed_out"], stats["running"]) == (0, 1, 1)
+    assert "b" not in stats["clients"]
+
+
+def test_cancel_while_queued_withdraws_without_taking_a_slot():
+    scheduler = SandboxScheduler(max_concurrent=1, max_queue=2, queue_timeout=5)
+    scheduler.acquire("a")
+    callbacks, results = [], {}
+    thread = _acquire_in_thread(scheduler, "b", results, on_cancel=callbacks.append)
+    _wait_for(lambda: callbacks)
+    callbacks[0]()
+    thread.join(2)
+    assert isinstance(results["b"][0], SandboxCancelled)
+    stats = scheduler.stats()
+    assert (stats["queued"], stats["running"], stats["cancelled"]) == (0, 1, 1)
+    scheduler.release("a")
+    assert scheduler.stats()["running"] == 0
+
+
+def test_already_cancelled_request_never_waits():
+    scheduler = SandboxScheduler(max_concurrent=1, max_queue=2, queue_timeout=5)
+    scheduler.acquire("a")
+    start = time.time()
+    with pytest.raises(SandboxCancelled):
+        scheduler.acquire("b", on_cancel=lambda callback: callback())
+    assert time.time() - start < 1
+    assert scheduler.stats()["queued"] == 0
+
+
+def test_cancel_after_grant_keeps_the_slot():
+    scheduler = SandboxScheduler(max_concurrent=1, max_queue=2, queue_timeout=5)
+    scheduler.acquire("a")
+    callbacks, results = [], {}
+    thread = _acquire_in_thread(scheduler, "b", results, on_cancel=callbacks.append)
+    _wait_for(lambda: callbacks)
+    scheduler.release("a")
+    thread.join(2)
+    callbacks[0]()  # Too late: the slot was granted and must still be released normally
+    assert results == {"b": ["granted"]}
+    stats = scheduler.stats()
+    assert (stats["running"], stats["queued"], stats["cancelled"]) == (1, 0, 0)
+    scheduler.release("b")
+    assert scheduler.stats()["running"] == 0
+
+
+def test_cancel_after_timeout_does_not_touch_the_queue():
+    scheduler = SandboxScheduler(max_concurrent=1, max_queue=2, queue_timeout=0.05)
+    scheduler.acquire("a")
+    callbacks = []
+    with pytest.raises(SandboxBusy):
+        scheduler.acquire("b", on_cancel=callbacks.append)
+    callbacks[0]()
+    stats = scheduler.stats()
+    assert (stats["queued"], stats["cancelled"], stats["timed_out"]) == (0, 0, 1)
+
+
+def test_free_slots_go_round_robin_between_clients():
+    scheduler = SandboxScheduler(max_concurrent=1, max_queue=4, queue_timeout=5)
+    scheduler.acquire("holder")
+    order, lock = [], threading.Lock()
+
+    def run(client):
+        scheduler.acquire(client)
+        with lock:
+            order.append(client)
+
+    threads = []
+    for client in ("a", "a", "b"):  # "a" queues twice before "b" arrives
+        threads.append(threading.Thread(target=run, args=(client,), daemon=True))
+        threads[-1].start()
+        _wait_for(lambda n=len(threads): scheduler.stats()["queued"] == n)
+    previous = "holder"
+    for expected in range(1, 4):
+        scheduler.release(previous)
+        _wait_for(lambda n=expected: len(order) == n)
+        previous = order[-1]
+    scheduler.release(previous)
+    assert order == ["a", "b", "a"]
+
+
+def test_release_records_run_time_for_retry_after():
+    scheduler = SandboxScheduler(max_concurrent=1, max_queue=1, queue_timeout=5)
+    with scheduler.slot("a"):
+        pass
+    assert scheduler.stats()["avg_run_seconds"] < 5.0  # Moved towards the (near zero) measured run
@@ -0,0 +1,74 @@
+from app.test_runner import PARALLEL_MIN_SECONDS, _merge, plan_shards
+
+
+def test_plan_shards_runs_unknown_or_small_suites_serially():
+    assert plan_shards(None, 4) == {"count": 1, "assign": {}}
+    assert plan_shards({}, 4) == {"count": 1, "assign": {}}
+    assert plan_shards({"a": PARALLEL_MIN_SECONDS / 4, "b": PARALLEL_MIN_SECONDS / 4}, 4)["count"] == 1
+    assert plan_shards({"a": PARALLEL_MIN_SECONDS, "b": PARALLEL_MIN_SECONDS}, 1)["count"] == 1
+
+
+def test_plan_shards_never_has_more_shards_than_tests():
+    plan = plan_shards({"a": PARALLEL_MIN_SECONDS, "b": PARALLEL_MIN_SECONDS}, 4)
+    assert plan["count"] == 2
+    assert sorted(plan["assign"].values()) == [0, 1]
+
+
+def test_plan_shards_balances_longest_first():
+    unit = PARALLEL_MIN_SECONDS
+    durations = {"a": 4 * unit, "b": 3 * unit, "c": 2 * unit, "d": 2 * unit, "e": unit}
+    plan = plan_shards(durations, 2)
+    loads = [0.0, 0.0]
+    for nodeid, index in plan["assign"].items():
+        loads[index] += durations[nodeid]
+    assert plan["count"] == 2
+    assert set(plan["assign"]) == set(durations)
+    assert loads == [6 * unit, 6 * unit]
+
+
+def _shard(returncode, tests=None, stdout="", stopped_early=False, limit_hit=None, cpu=1.0, wall=1.0):
+    report = None if tests is None else {
+        "tests": {nodeid: {"outcome": outcome, "duration": 0.1} for nodeid, outcome in tests.items()},
+        "exitstatus": returncode, "stopped_early": stopped_early, "duration": wall}
+    return {
+        "returncode": returncode, "stdout": stdout, "stderr": "", "limit_hit": limit_hit, "report": report,
+        "usage": {"wall_seconds": wall, "disk_bytes": 10, "output_bytes": 100, "limit_hit": limit_hit,
+                  "limits": {}, "enforced_by": "rlimit", "cpu_seconds": cpu, "max_rss_mb": 50 * cpu},
+    }
+
+
+def test_merge_single_shard_is_returned_as_is():
+    shard = _shard(0, {"t::a": "passed"})
+    assert _merge([shard]) is shard
+
+
+def test_merge_combines_reports_and_usage():
+    merged = _merge([_shard(0, {"t::a": "passed"}, cpu=1.0, wall=2.0),
+                     _shard(1, {"t::b": "failed"}, cpu=2.0, wall=3.0),
+                     _shard(5, {}, cpu=0.5, wall=0.5)])
+    assert merged["returncode"] == 1
+    assert set(merged["report"]["tests"]) == {"t::a", "t::b"}
+    assert merged["report"]["duration"] == 3.0
+    assert merged["usage"]["cpu_seconds"] == 3.5
+    assert merged["usage"]["max_rss_mb"] == 100.0
+    assert merged["usage"]["wall_seconds"] == 3.0
+    assert merged["usage"]["output_bytes"] == 300
+
+
+def test_merge_no_tests_anywhere_is_exit_5():
+    assert _merge([_shard(5, {}), _shard(5, {})])["returncode"] == 5
+
+
+def test_merge_prefers_abnormal_exit_and_limit_hit():
+    merged = _merge([_shard(1, {"t::a": "failed"}), _shard(-9, None, limit_hit="memory")])
+    assert merged["returncode"] == -9
+    assert merged["limit_hit"] == "memory"
+    assert merged["report"] is None  # A shard without a report makes the merged report incomplete
+
+
+def test_merge_output_tail_comes_from_the_shard_that_failed():
+    stopped = _shard(1, {"t::a": "passed"}, stdout="New failure in another shard", stopped_early=True)
+    failed = _shard(1, {"t::b": "failed"}, stdout="assert 1 == 2", stopped_early=True)
+    merged = _merge([stopped, failed])
+    assert merged["stdout"] == "assert 1 == 2"
+    assert merged["report"]["stopped_early"] is True
@@ -0,0 +1,150 @@
+"""
+Backend client for the Aegis Streamlit UI.
+
+Streamlit reruns the whole script on every widget interaction, so anything
+fetched at the top level is fetched again on every click. This module keeps
+those round trips off the interaction path:
+- One pooled requests.Session per backend URL (keep-alive, no reconnects)
+- Health is polled on a background thread; reruns only read the last result
+- Read-only GETs are cached with st.cache_data and short TTLs
+- History is fetched in the summary projection (no diffs or test output)
+"""
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+
+HEALTH_INTERVAL = 5.0  # seconds between background health checks
+HEALTH_TIMEOUT = 3.0
+
+
+@st.cache_resource
+def get_session(api: str) -> requests.Session:
+    """Pooled session for a backend URL (shared by all reruns and browser sessions)."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=10)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class HealthMonitor:
+    """Polls /health in the background and keeps the latest result."""
+
+    def __init__(self, api: str, interval: float = HEALTH_INTERVAL):
+        self.api = api
+        self.interval = interval
+        self.up = False
+        self.error: Optional[str] = None
+        self.checked_at = 0.0
+        self._checked = threading.Event()
+        threading.Thread(target=self._run, name="aegis-ui-health", daemon=True).start()
+
+    def _run(self):
+        while True:
+            try:
+                response = get_session(self.api).get(f"{self.api}/health", timeout=HEALTH_TIMEOUT)
+                self.up = response.status_code == 200 and response.json().get("ok", False)
+                self.error = None if self.up else f"Backend returned HTTP {response.status_code}"
+            except Exception as e:
+                self.up = False
+                self.error = f"Backend connection error: {str(e)}"
+            self.checked_at = time.time()
+            self._checked.set()
+            time.sleep(self.interval)
+
+    def status(self, wait: float = 0.5) -> Tuple[bool, Optional[str]]:
+        """
+        Latest health result.
+
+        Args:
+            wait: On the very first call, how long to wait for the first check
+
+        Returns:
+            (backend_up, error message or None)
+        """
+        self._checked.wait(wait)
+        return self.up, self.error
+
+
+@st.cache_resource
+def get_health_monitor(api: str) -> HealthMonitor:
+    """One background health monitor per backend URL."""
+    return HealthMonitor(api)
+
+
+def backend_health(api: str) -> Tuple[bool, Optional[str]]:
+    """Backend health without blocking the rerun (see HealthMonitor)."""
+    return get_health_monitor(api).status()
+
+
+@st.cache_data(ttl=5, show_spinner=False)
+def fetch_recent_history(api: str, limit: int = 5) -> List[Dict]:
+    """Most recent risk card summaries (cached for a few seconds)."""
+    response = get_session(api).get(f"{api}/riskcard/history", params={"limit": limit, "view": "summary"}, timeout=5)
+    response.raise_for_status()
+    return response.json().get("history", [])
+
+
+@st.cache_data(ttl=10, show_spinner=False)
+def fetch_history_page(api: str, limit: int, offset: int, filters: Tuple[Tuple[str, object], ...] = ()) -> Dict:
+    """
+    One page of history summaries plus the total match count.
+
+    Args:
+        api: Backend URL
+        limit / offset: Page window
+        filters: (name, value) pairs for /riskcard/history (status, min_score, max_score, file, since, until)
+
+    Returns:
+        {"history": [...], "total": int, "limit": int, "offset": int}
+    """
+    params = {"limit": limit, "offset": offset, "view": "summary"}
+    params.update({k: v for k, v in filters if v not in (None, "")})
+    response = get_session(api).get(f"{api}/riskcard/history", params=params, timeout=10)
+    response.raise_for_status()
+    return response.json()
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+def fetch_history_stats(api: str, filters: Tuple[Tuple[str, object], ...] = ()) -> Dict:
+    """Server-side aggregates for the history explorer charts."""
+    params = {k: v for k, v in filters if v not in (None, "")}
+    response = get_session(api).get(f"{api}/riskcard/history/stats", params=params, timeout=10)
+    response.raise_for_status()
+    return response.json()
+
+
+@st.cache_data(ttl=60, max_entries=50, show_spinner=False)
+def fetch_card(api: str, request_id: str) -> Dict:
+    """Full risk card (diff, test output), fetched only when a history row is opened."""
+    response = get_session(api).get(f"{api}/riskcard/{request_id}", timeout=10)
+    response.raise_for_status()
+    return response.json()
+
+
+def propose_action(api: str, payload: Dict, timeout: float = 120) -> Dict:
+    """Submit an action for assessment (never cached). The "card" view skips the duplicated dry-run diff/stdout."""
+    response = get_session(api).post(f"{api}/propose_action", params={"view": "card"}, json=payload, timeout=timeout)
+    response.raise_for_status()
+    invalidate_history()
+    return response.json()
+
+
+def approve(api: str, request_id: str, approved_by: str = "user") -> Dict:
+    """Approve a blocked risk card."""
+    response = get_session(api).post(f"{api}/riskcard/{request_id}/approve",
+                                     json={"request_id": request_id, "approved_by": approved_by}, timeout=10)
+    response.raise_for_status()
+    invalidate_history()
+    return response.json()
+
+
+def invalidate_history():
+    """Drop cached history after a write so the next rerun shows it."""
+    fetch_recent_history.clear()
+    fetch_history_page.clear()
+    fetch_history_stats.clear()
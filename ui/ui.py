@@ -1,5 +1,7 @@
 import streamlit as st
 import requests
+from api_client import (approve, backend_health, fetch_card, fetch_history_page, fetch_history_stats,
+                        fetch_recent_history, propose_action)
 import json
 import html as html_module
 from datetime import datetime
@@ -260,21 +262,16 @@ st.markdown("""
 # Backend URL configuration in sidebar
 api = st.sidebar.text_input("Backend URL", value="http://127.0.0.1:8000", key="backend_url")
 
-# Health check
-backend_up = False
-try:
-    response = requests.get(f"{api}/health", timeout=3)
-    if response.status_code == 200:
-        backend_up = response.json().get("ok", False)
-except Exception as e:
-    backend_up = False
-    st.session_state.error = f"Backend connection error: {str(e)}"
+# Health check (polled in the background - reruns only read the last result)
+backend_up, health_error = backend_health(api)
+if health_error:
+    st.session_state.error = health_error
 
 status_color = "🟢" if backend_up else "🔴"
 st.sidebar.markdown(f"{status_color} Backend: {'Live' if backend_up else 'Down'}")
 
 # Tabs for Main and Samples
-tab1, tab2 = st.tabs(["🛡️ Main", "📦 Samples"])
+tab1, tab_history, tab2 = st.tabs(["🛡️ Main", "📜 History", "📦 Samples"])
 
 # Error display
 if st.session_state.error:
@@ -385,20 +382,14 @@ with tab1:
             
             try:
                 with st.spinner("🔄 Analyzing risk..."):
-                    response = requests.post(
-                        f"{api}/propose_action",
-                        json={
-                            "intent": intent,
-                            "file_path": file_path,
-                            "new_contents": new_contents,
-                            "prompt": prompt,
-                            "est_tokens": 800,
-                            "use_modal": use_modal
-                        },
-                        timeout=120
-                    )
-                    response.raise_for_status()
-                    st.session_state.result = response.json()
+                    st.session_state.result = propose_action(api, {
+                        "intent": intent,
+                        "file_path": file_path,
+                        "new_contents": new_contents,
+                        "prompt": prompt,
+                        "est_tokens": 800,
+                        "use_modal": use_modal
+                    })
                     st.session_state.error = None
                     st.rerun()
             except requests.exceptions.Timeout:
@@ -564,12 +555,7 @@ with tab1:
                 st.markdown("---")
                 if st.button("✅ Approve Action (Override)", type="secondary", use_container_width=True, key="approve_btn"):
                     try:
-                        approve_response = requests.post(
-                            f"{api}/riskcard/{request_id}/approve",
-                            json={"request_id": request_id, "approved_by": "user"},
-                            timeout=10
-                        )
-                        approve_response.raise_for_status()
+                        approve(api, request_id, "user")
                         st.success("Action approved!")
                         st.rerun()
                     except Exception as e:
@@ -602,14 +588,12 @@ with tab1:
             
             # Show history if available
             try:
-                history_response = requests.get(f"{api}/riskcard/history", timeout=5)
-                if history_response.status_code == 200:
-                    history = history_response.json().get("history", [])
-                    if history:
-                        with st.expander("📜 Recent History", expanded=False):
-                            for item in history[:5]:
-                                status_icon = "✅" if item.get("status") == "allow" else "⛔"
-                                st.markdown(f"{status_icon} **{item.get('request_id', 'N/A')}** - Risk: {item.get('risk_score', 0)}/100")
+                history = fetch_recent_history(api, 5)
+                if history:
+                    with st.expander("📜 Recent History", expanded=False):
+                        for item in history[:5]:
+                            status_icon = "✅" if item.get("status") == "allow" else "⛔"
+                            st.markdown(f"{status_icon} **{item.get('request_id', 'N/A')}** - Risk: {item.get('risk_score', 0)}/100")
             except Exception:
                 pass
         
@@ -750,6 +734,86 @@ def test_rollout_not_100_instantly():
     
     st.markdown('</div>', unsafe_allow_html=True)
 
+# History explorer - only the visible page is loaded; diffs are fetched when a row is opened
+with tab_history:
+    st.markdown('<div class="card">', unsafe_allow_html=True)
+    st.subheader("📜 History Explorer")
+    
+    f1, f2, f3, f4 = st.columns([1, 1, 1, 1])
+    with f1:
+        status_filter = st.multiselect("Status", ["allow", "blocked"], key="hist_status")
+    with f2:
+        score_range = st.slider("Risk score", 0, 100, (0, 100), key="hist_score")
+    with f3:
+        file_filter = st.text_input("File path starts with", key="hist_file")
+    with f4:
+        date_range = st.date_input("Date range", value=(), key="hist_dates")
+    
+    since = until = None
+    if isinstance(date_range, (list, tuple)) and len(date_range) == 2:
+        since = datetime.combine(date_range[0], datetime.min.time()).timestamp()
+        until = datetime.combine(date_range[1], datetime.max.time()).timestamp()
+    filters = (
+        ("status", ",".join(status_filter)),
+        ("min_score", score_range[0] if score_range[0] > 0 else None),
+        ("max_score", score_range[1] if score_range[1] < 100 else None),
+        ("file", file_filter.strip()),
+        ("since", since),
+        ("until", until),
+    )
+    
+    p1, p2 = st.columns([1, 3])
+    with p1:
+        page_size = st.selectbox("Rows per page", [25, 50, 100], key="hist_page_size")
+    
+    try:
+        stats = fetch_history_stats(api, filters)
+        total = stats.get("total", 0)
+        pages = max(1, (total + page_size - 1) // page_size)
+        with p2:
+            page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, key="hist_page")
+        page_data = fetch_history_page(api, page_size, (page - 1) * page_size, filters)
+        
+        m1, m2, m3 = st.columns(3)
+        m1.metric("Matching cards", total)
+        m2.metric("Blocked", stats.get("by_status", {}).get("blocked", 0))
+        m3.metric("Avg risk score", stats.get("avg_score") or 0)
+        
+        if stats.get("by_day"):
+            with st.expander("📈 Charts", expanded=False):
+                st.caption("Cards per day by status")
+                st.bar_chart({
+                    status: [counts.get(status, 0) for counts in stats["by_day"].values()]
+                    for status in ("allow", "blocked")
+                })
+                st.caption("Cards by risk level")
+                st.bar_chart({level: [stats["by_level"].get(level, 0)] for level in ("LOW", "MEDIUM", "HIGH", "CRITICAL")})
+        
+        rows = page_data.get("history", [])
+        if not rows:
+            st.info("No risk cards match these filters.")
+        for item in rows:
+            status_icon = "✅" if item.get("status") == "allow" else "⛔"
+            when = datetime.fromtimestamp(item.get("timestamp") or 0).strftime("%Y-%m-%d %H:%M")
+            label = f"{status_icon} {when} · {item.get('file_path') or '?'} · {item.get('intent') or ''} · Risk {item.get('risk_score', 0)}/100"
+            with st.expander(label, expanded=False):
+                if item.get("failed_checks"):
+                    st.markdown(f"**Failed checks:** {', '.join(item['failed_checks'])}")
+                st.caption(f"Request ID: {item.get('request_id')}")
+                # Full card (diff, test output) only when asked for
+                if st.toggle("Load details", key=f"hist_detail_{item.get('request_id')}"):
+                    card = fetch_card(api, item["request_id"])
+                    if card.get("explanation"):
+                        st.markdown(f"**Explanation:** {card['explanation']}")
+                    if card.get("diff"):
+                        st.code(card["diff"], language="diff")
+                    if card.get("stdout"):
+                        st.code("\n".join(card["stdout"].split("\n")[-40:]))
+    except Exception as e:
+        st.warning(f"History unavailable: {str(e)}")
+    
+    st.markdown('</div>', unsafe_allow_html=True)
+
 # Footer (outside tabs)
 st.markdown(
     '<div class="footer">Aegis · Nihal Josyula · CMU Nova 2025</div>',